@@ -1,35 +1,130 @@
 """AI Agent implementations using OpenRouter."""
+import asyncio
+import base64
+import hashlib
 import json
-from typing import Optional
-from openai import AsyncOpenAI
+import math
+from typing import TYPE_CHECKING, Any, AsyncIterator, List, Optional, Tuple
+from pydantic import ValidationError
 
 from .config import (
     OPENROUTER_API_KEY,
     OPENROUTER_BASE_URL,
-    PLANNER_MODEL,
     BUILDER_MODEL,
     VISION_MODEL,
+    BUILDER_MODE,
+    IMAGE_CACHE_PERCEPTUAL,
+    BUILDER_FALLBACK_MODEL,
+    VISION_FALLBACK_MODEL,
+    LLM_REQUEST_TIMEOUT,
+    ENHANCE_PROTOCOL,
+    SPEC_AUTO_FIX,
+    FANOUT_TARGET_NODES,
+    FANOUT_MAX_BRANCHES,
+    FANOUT_CONCURRENCY,
 )
 from .prompts import (
     PLANNER_SYSTEM_PROMPT,
     BUILDER_SYSTEM_PROMPT,
     VISION_SYSTEM_PROMPT,
     ENHANCE_SYSTEM_PROMPT,
+    ENHANCE_PATCH_SYSTEM_PROMPT,
+    FANOUT_OUTLINE_SYSTEM_PROMPT,
+    FANOUT_BRANCH_SYSTEM_PROMPT,
+    ENHANCE_MAP_TEMPLATE,
+    ENHANCE_REQUEST_TEMPLATE,
 )
-from .models import PlannerSpec
+from .messages import EXTRA_HEADERS, build_messages
+from .models import PlannerSpec, NodeSpec, EdgeSpec, SpecOperation, SpecPatch, SpecDelta
+from .patches import apply_patch, surviving_operations
+from .diff import diff_specs, summarize_delta
+from .mermaid import compile_mermaid
+from .graph import repair_spec
+from .streaming import SpecStreamParser
+from .json_extract import extract_json, validate_clean
+from .spec_encoding import encode_for_enhance
+from .cache import get_cache, make_cache_key, PROMPT_VERSIONS
+from .semantic_cache import get_semantic_index
+from .singleflight import SingleFlight
+from .images import NormalizedImage, prepare_image, same_picture
+from .executor import executor
+from .model_router import model_router, request_features
+from .scheduler import scheduler, OverloadedError
+from .fanout import outline_branches, branch_node_targets, merge_fanout
+from .metrics import stage, record_usage, llm_calls
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-# Initialize AsyncOpenAI client with OpenRouter endpoint
-# Using async client for proper non-blocking API calls in FastAPI
-client = AsyncOpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url=OPENROUTER_BASE_URL,
-)
+
+PLANNER_TEMPERATURE = 0.7
+ENHANCE_TEMPERATURE = 0.7
+ENHANCE_PATCH_MAX_TOKENS = 1500
+VISION_TEMPERATURE = 0.5
+
+
+# AsyncOpenAI client with OpenRouter endpoint, created on first use.
+# The OpenAI SDK is the slowest import in the app, so cold starts that only
+# serve health checks, layouts or cached responses never pay for it.
+_client: Optional["AsyncOpenAI"] = None
+
+
+def get_client() -> "AsyncOpenAI":
+    """The shared async client (non-blocking API calls in FastAPI)."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(
+            api_key=OPENROUTER_API_KEY,
+            base_url=OPENROUTER_BASE_URL,
+            timeout=LLM_REQUEST_TIMEOUT,
+        )
+    return _client
+
+# Concurrent identical calls (same prompt, same image, same spec) share one completion
+flights = SingleFlight()
+
+
+def _semantic_namespace(model: str) -> str:
+    return f"{model}|{PROMPT_VERSIONS['planner']}|{PLANNER_TEMPERATURE}"
+
+
+def _semantic_lookup(model: str, user_prompt: str, image_description: Optional[str]) -> Optional[PlannerSpec]:
+    """Serve a near-duplicate text-only prompt from the semantic index."""
+    index = get_semantic_index()
+    if index is None or image_description:
+        return None
+    match = index.lookup(user_prompt, _semantic_namespace(model))
+    if match is None:
+        return None
+    return PlannerSpec.model_validate_json(match[0])
+
+
+async def _semantic_store(model: str, user_prompt: str, image_description: Optional[str], spec_json: str) -> None:
+    index = get_semantic_index()
+    if index is not None and not image_description:
+        await index.aadd(user_prompt, _semantic_namespace(model), spec_json)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _planner_cache_key(model: str, user_prompt: str, image_description: Optional[str]) -> str:
+    # Keyed on the model routing picks, so one tier's maps are never served for another's
+    return make_cache_key(
+        "planner",
+        model,
+        PLANNER_TEMPERATURE,
+        user_prompt,
+        image_description=image_description,
+    )
 
 
 async def run_planner_agent(
     user_prompt: str,
-    image_description: Optional[str] = None
+    image_description: Optional[str] = None,
+    use_cache: bool = True
 ) -> PlannerSpec:
     """
     Run the Planner Agent to generate a mind map specification.
@@ -37,61 +132,386 @@ async def run_planner_agent(
     Args:
         user_prompt: The user's input prompt
         image_description: Optional description from vision analysis
+        use_cache: Serve identical earlier requests from the response cache
         
     Returns:
         PlannerSpec object with the structured mind map
     """
+    features = request_features("planner", user_prompt, image_description)
+    decision = model_router.choose(features)
+    model = decision.served_model
+    cache = get_cache()
+    cache_key = _planner_cache_key(model, user_prompt, image_description)
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return PlannerSpec.model_validate_json(cached)
+        similar = _semantic_lookup(model, user_prompt, image_description)
+        if similar is not None:
+            return similar
+    
     # Combine user prompt with image description if available
     full_prompt = user_prompt
     if image_description:
         full_prompt = f"{user_prompt}\n\nImage Analysis:\n{image_description}"
     
-    response = await client.chat.completions.create(
-        model=PLANNER_MODEL,
-        messages=[
-            {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
-            {"role": "user", "content": full_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=2000,
-        extra_headers={
-            "HTTP-Referer": "https://anymaps.app",
-            "X-Title": "AnyMaps"
-        }
+    async def call(model: str) -> Tuple[PlannerSpec, bool]:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=build_messages(model, PLANNER_SYSTEM_PROMPT, full_prompt),
+            temperature=PLANNER_TEMPERATURE,
+            max_tokens=2000,
+            extra_headers=EXTRA_HEADERS
+        )
+        record_usage(model, response.usage, "planner")
+    
+        # Parse the JSON response
+        planner_spec, partial = parse_planner_output(response.choices[0].message.content)
+        return _well_formed(planner_spec), partial
+    
+    async def complete() -> PlannerSpec:
+        planner_spec, partial = await model_router.run(features, call, decision)
+        # A map recovered from a truncated response is served but not cached
+        if not partial:
+            spec_json = planner_spec.model_dump_json()
+            await cache.aset(cache_key, spec_json)
+            await _semantic_store(model, user_prompt, image_description, spec_json)
+        return planner_spec
+    
+    return await flights.do(("planner", cache_key), complete)
+
+
+async def run_fanout_planner_agent(
+    user_prompt: str,
+    image_description: Optional[str] = None,
+    target_nodes: Optional[int] = None,
+    use_cache: bool = True
+) -> PlannerSpec:
+    """
+    Generate a large map in two stages: an outline call for the central topic
+    and primary branches, then one planner call per branch, run concurrently
+    (up to FANOUT_CONCURRENCY at once).
+    
+    Wall-clock time is roughly the outline call plus the slowest branch. A
+    branch whose expansion fails is kept as a leaf rather than failing the map.
+    
+    Args:
+        user_prompt: The user's input prompt
+        image_description: Optional description from vision analysis
+        target_nodes: Approximate total node count (defaults to FANOUT_TARGET_NODES)
+        use_cache: Serve identical earlier requests from the response cache
+        
+    Returns:
+        The merged PlannerSpec, with globally unique node IDs
+    """
+    target_nodes = target_nodes or FANOUT_TARGET_NODES
+    outline_features = request_features("fanout_outline", user_prompt, image_description, target_nodes=target_nodes)
+    outline_decision = model_router.choose(outline_features)
+    cache = get_cache()
+    cache_key = make_cache_key(
+        "planner_fanout",
+        outline_decision.served_model,
+        PLANNER_TEMPERATURE,
+        user_prompt,
+        image_description=image_description,
+        target_nodes=target_nodes,
     )
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return PlannerSpec.model_validate_json(cached)
+    
+    full_prompt = user_prompt
+    if image_description:
+        full_prompt = f"{user_prompt}\n\nImage Analysis:\n{image_description}"
+    
+    # ~sqrt(n) branches keeps each branch's share within one completion
+    branch_count = min(FANOUT_MAX_BRANCHES, max(3, round(math.sqrt(target_nodes))))
+    
+    async def outline_call(model: str) -> dict:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=build_messages(
+                model, FANOUT_OUTLINE_SYSTEM_PROMPT, f"{full_prompt}\n\nPrimary branches wanted: {branch_count}"
+            ),
+            temperature=PLANNER_TEMPERATURE,
+            max_tokens=1500,
+            extra_headers=EXTRA_HEADERS
+        )
+        record_usage(model, response.usage, "fanout_outline")
     
-    # Parse the JSON response
-    content = response.choices[0].message.content
-    
-    # Clean up potential markdown fences
-    if "```" in content:
-        # Extract content between markdown fences
-        parts = content.split("```")
-        for part in parts:
-            part = part.strip()
-            # Remove language specifier if present
-            if part.startswith("json"):
-                part = part[4:].strip()
-            if part.startswith("{"):
-                content = part
-                break
-    
-    content = content.strip()
-    
-    # Try to extract JSON from the content if it starts with text
-    if not content.startswith("{"):
-        # Find the first { and last }
-        start_idx = content.find("{")
-        end_idx = content.rfind("}")
-        if start_idx != -1 and end_idx != -1:
-            content = content[start_idx:end_idx + 1]
+        outline = extract_json(response.choices[0].message.content, "outline").value
+        if not outline_branches(outline, branch_count):
+            raise ValueError("Outline contained no valid branches")
+        return outline
     
+    async def expand(branch: NodeSpec, siblings: List[str], per_branch: int, central_topic: str) -> Optional[dict]:
+        brief = (
+            f"Map topic: {central_topic}\n"
+            f"User request: {full_prompt}\n\n"
+            f"Branch to expand: {branch.label}"
+            + (f" - {branch.description}" if branch.description else "")
+            + f"\nSibling branches (covered elsewhere): {', '.join(siblings) or 'none'}"
+            + f"\nTarget node count: {per_branch}"
+        )
+    
+        async def call(model: str) -> dict:
+            response = await get_client().chat.completions.create(
+                model=model,
+                messages=build_messages(model, FANOUT_BRANCH_SYSTEM_PROMPT, brief),
+                temperature=PLANNER_TEMPERATURE,
+                max_tokens=2000,
+                extra_headers=EXTRA_HEADERS
+            )
+            record_usage(model, response.usage, "fanout_branch")
+    
+            expansion = extract_json(response.choices[0].message.content, "branch expansion").value
+            if not expansion.get("nodes"):
+                raise ValueError(f"Expansion of '{branch.label}' contained no nodes")
+            return expansion
+    
+        features = request_features("fanout_branch", brief, target_nodes=per_branch)
+        async with semaphore:
+            try:
+                return await model_router.run(features, call)
+            except OverloadedError:
+                raise
+            except Exception:
+                return None
+    
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    
+    async def complete() -> PlannerSpec:
+        outline = await model_router.run(outline_features, outline_call, outline_decision)
+        branches = outline_branches(outline, branch_count)
+        per_branch = branch_node_targets(target_nodes, len(branches))
+        central_topic = str(outline.get("central_topic") or user_prompt)
+        
+        tasks = [
+            asyncio.ensure_future(expand(
+                branch,
+                [other.label for other in branches if other is not branch],
+                per_branch,
+                central_topic
+            ))
+            for branch in branches
+        ]
+        try:
+            expansions = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        planner_spec = merge_fanout(outline, branches, expansions)
+        # Maps with a failed branch are served but not cached
+        if all(expansion is not None for expansion in expansions):
+            await cache.aset(cache_key, planner_spec.model_dump_json())
+        return planner_spec
+    
+    return await flights.do(("planner_fanout", cache_key), complete)
+
+
+@stage("planner")
+async def plan_map(
+    user_prompt: str,
+    image_description: Optional[str] = None,
+    generation_mode: Optional[str] = None,
+    target_nodes: Optional[int] = None,
+    use_cache: bool = True
+) -> PlannerSpec:
+    """Run the planner in the requested generation mode ('single' or 'fanout')."""
+    if generation_mode == "fanout":
+        return await run_fanout_planner_agent(
+            user_prompt=user_prompt,
+            image_description=image_description,
+            target_nodes=target_nodes,
+            use_cache=use_cache
+        )
+    if generation_mode not in (None, "single"):
+        raise ValueError(f"Unsupported generation mode: {generation_mode}")
+    return await run_planner_agent(
+        user_prompt=user_prompt,
+        image_description=image_description,
+        use_cache=use_cache
+    )
+
+
+def _spec_from_dict(data: dict) -> Tuple[PlannerSpec, bool]:
+    """
+    Validate a decoded spec, keeping every valid node and edge if some are malformed.
+    
+    Returns:
+        (PlannerSpec, whether anything had to be dropped)
+    """
+    try:
+        return PlannerSpec(**data), False
+    except (ValidationError, TypeError):
+        pass
+    
+    nodes = []
+    for raw in data.get("nodes") or []:
+        try:
+            nodes.append(NodeSpec(**raw))
+        except (ValidationError, TypeError):
+            continue
+    if not nodes:
+        raise ValueError("Model response contained no valid nodes")
+    
+    node_ids = {node.id for node in nodes}
+    edges = []
+    for raw in data.get("edges") or []:
+        try:
+            edge = EdgeSpec(**raw)
+        except (ValidationError, TypeError):
+            continue
+        # Edges whose endpoint was lost are dropped with it
+        if edge.source in node_ids and edge.target in node_ids:
+            edges.append(edge)
+    
+    central_topic = data.get("central_topic") if isinstance(data.get("central_topic"), str) else nodes[0].label
+    title = data.get("title") if isinstance(data.get("title"), str) else central_topic
+    summary = data.get("summary") if isinstance(data.get("summary"), str) else None
+    return PlannerSpec(title=title, central_topic=central_topic, nodes=nodes, edges=edges, summary=summary), True
+
+
+@stage("validate")
+def _well_formed(spec: PlannerSpec) -> PlannerSpec:
+    """Apply the structural auto-fix to a generated spec (when SPEC_AUTO_FIX is on)."""
+    if not SPEC_AUTO_FIX:
+        return spec
+    return repair_spec(spec)[0]
+
+
+@stage("parse")
+def parse_planner_output(content: str, what: str = "AI response") -> Tuple[PlannerSpec, bool]:
+    """
+    Parse raw planner/enhance output into a PlannerSpec, repairing it if needed.
+    
+    Returns:
+        (PlannerSpec, whether the response was cut short or partly invalid)
+    """
+    planner_spec = validate_clean(PlannerSpec, content)
+    if planner_spec is not None:
+        return planner_spec, False
+    
+    extracted = extract_json(content, what)
+    planner_spec, salvaged = _spec_from_dict(extracted.value)
+    return planner_spec, extracted.truncated or salvaged
+
+
+@stage("parse")
+def parse_patch_output(content: str) -> Tuple[SpecPatch, bool]:
+    """
+    Parse raw enhance-patch output, keeping every valid operation.
+    
+    Returns:
+        (SpecPatch, whether the response was cut short or partly invalid)
+    """
+    patch = validate_clean(SpecPatch, content)
+    if patch is not None:
+        return patch, False
+    
+    extracted = extract_json(content, "enhance patch")
+    data = extracted.value
     try:
-        spec_dict = json.loads(content)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse AI response as JSON: {e}. Raw content: {content[:500]}")
+        return SpecPatch(**data), extracted.truncated
+    except (ValidationError, TypeError):
+        pass
+    
+    operations = []
+    for raw in data.get("operations") or []:
+        try:
+            operations.append(SpecOperation(**raw))
+        except (ValidationError, TypeError):
+            continue
+    title = data.get("title") if isinstance(data.get("title"), str) else None
+    summary = data.get("summary") if isinstance(data.get("summary"), str) else None
+    return SpecPatch(operations=operations, title=title, summary=summary), True
+
+
+async def stream_planner_agent(
+    user_prompt: str,
+    image_description: Optional[str] = None,
+    use_cache: bool = True
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run the Planner Agent with a streamed completion.
+    
+    Nodes and edges are yielded as soon as their JSON objects are complete,
+    followed by the fully validated spec once the completion ends.
+    
+    Args:
+        user_prompt: The user's input prompt
+        image_description: Optional description from vision analysis
+        use_cache: Replay identical earlier requests from the response cache
+        
+    Yields:
+        ('node', NodeSpec), ('edge', EdgeSpec), then ('plan', PlannerSpec)
+    """
+    features = request_features("planner", user_prompt, image_description)
+    decision = model_router.choose(features)
+    model = decision.served_model
+    cache = get_cache()
+    cache_key = _planner_cache_key(model, user_prompt, image_description)
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        planner_spec = (
+            PlannerSpec.model_validate_json(cached) if cached is not None
+            else _semantic_lookup(model, user_prompt, image_description)
+        )
+        if planner_spec is not None:
+            for node in planner_spec.nodes:
+                yield "node", node
+            for edge in planner_spec.edges:
+                yield "edge", edge
+            yield "plan", planner_spec
+            return
     
-    return PlannerSpec(**spec_dict)
+    full_prompt = user_prompt
+    if image_description:
+        full_prompt = f"{user_prompt}\n\nImage Analysis:\n{image_description}"
+    
+    # Streams are served by the routed model without failover; shadow runs only sample non-streamed calls
+    model_router.route(features, decision)
+    parser = SpecStreamParser()
+    with stage("planner"):
+        # The whole stream holds one planner slot
+        async with scheduler.slot(model):
+            stream = await get_client().chat.completions.create(
+                model=model,
+                messages=build_messages(model, PLANNER_SYSTEM_PROMPT, full_prompt),
+                temperature=PLANNER_TEMPERATURE,
+                max_tokens=2000,
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_headers=EXTRA_HEADERS
+            )
+    
+            async for chunk in stream:
+                # The final chunk carries usage and no choices
+                record_usage(model, getattr(chunk, "usage", None), "planner")
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                for kind, payload in parser.feed(delta):
+                    try:
+                        item = NodeSpec(**payload) if kind == "node" else EdgeSpec(**payload)
+                    except ValidationError:
+                        # Leave malformed items to the final validation pass
+                        continue
+                    yield kind, item
+            llm_calls.inc(model, "ok")
+    
+    planner_spec, partial = parse_planner_output(parser.buffer)
+    planner_spec = _well_formed(planner_spec)
+    if not partial:
+        spec_json = planner_spec.model_dump_json()
+        await cache.aset(cache_key, spec_json)
+        await _semantic_store(model, user_prompt, image_description, spec_json)
+    yield "plan", planner_spec
 
 
 async def run_builder_agent(planner_spec: PlannerSpec) -> str:
@@ -106,75 +526,191 @@ async def run_builder_agent(planner_spec: PlannerSpec) -> str:
     """
     spec_json = planner_spec.model_dump_json(indent=2)
     
-    response = await client.chat.completions.create(
-        model=BUILDER_MODEL,
-        messages=[
-            {"role": "system", "content": BUILDER_SYSTEM_PROMPT},
-            {"role": "user", "content": f"Convert this specification to Mermaid syntax:\n\n{spec_json}"}
-        ],
-        temperature=0.3,
-        max_tokens=2000,
-        extra_headers={
-            "HTTP-Referer": "https://anymaps.app",
-            "X-Title": "AnyMaps"
-        }
-    )
+    async def call(model: str) -> str:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=build_messages(
+                model, BUILDER_SYSTEM_PROMPT, f"Convert this specification to Mermaid syntax:\n\n{spec_json}"
+            ),
+            temperature=0.3,
+            max_tokens=2000,
+            extra_headers=EXTRA_HEADERS
+        )
+        record_usage(model, response.usage, "builder")
+    
+        mermaid_syntax = response.choices[0].message.content.strip()
+    
+        # Clean up potential markdown fences
+        if mermaid_syntax.startswith("```"):
+            mermaid_syntax = mermaid_syntax.split("```")[1]
+            if mermaid_syntax.startswith("mermaid"):
+                mermaid_syntax = mermaid_syntax[7:]
+        mermaid_syntax = mermaid_syntax.strip()
+    
+        if not mermaid_syntax.startswith("mindmap"):
+            raise ValueError("Builder response is not Mermaid mindmap syntax")
     
-    mermaid_syntax = response.choices[0].message.content.strip()
+        return mermaid_syntax
     
-    # Clean up potential markdown fences
-    if mermaid_syntax.startswith("```"):
-        mermaid_syntax = mermaid_syntax.split("```")[1]
-        if mermaid_syntax.startswith("mermaid"):
-            mermaid_syntax = mermaid_syntax[7:]
-    mermaid_syntax = mermaid_syntax.strip()
+    async def complete() -> str:
+        return await executor.run(BUILDER_MODEL, BUILDER_FALLBACK_MODEL, call)
     
-    return mermaid_syntax
+    return await flights.do(("builder", _content_hash(spec_json)), complete)
 
 
-async def analyze_image(image_base64: str) -> str:
+@stage("builder")
+async def build_mermaid(
+    planner_spec: PlannerSpec,
+    builder_mode: Optional[str] = None,
+    diagram_type: str = "mindmap"
+) -> str:
+    """
+    Build Mermaid syntax for a PlannerSpec.
+    
+    The local compiler is the default; the LLM Builder agent is opt-in and
+    only produces mindmap syntax.
+    
+    Args:
+        planner_spec: The structured mind map specification
+        builder_mode: 'local' or 'llm' (defaults to BUILDER_MODE)
+        diagram_type: 'mindmap' or 'flowchart' (local mode only)
+        
+    Returns:
+        Mermaid.js syntax string
+    """
+    mode = builder_mode or BUILDER_MODE
+    if mode == "llm":
+        return await run_builder_agent(planner_spec)
+    if mode != "local":
+        raise ValueError(f"Unsupported builder mode: {mode}")
+    return compile_mermaid(planner_spec, diagram_type)
+
+
+def _perceptual_hit(entry: Optional[str], image: NormalizedImage) -> Optional[str]:
+    """The description in a perceptual cache entry, if its thumbnail matches `image`."""
+    if entry is None:
+        return None
+    try:
+        stored = json.loads(entry)
+        pixels = base64.b64decode(stored["pixels"])
+        description = stored["description"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    return description if same_picture(image.pixels, pixels) else None
+
+
+@stage("vision")
+async def analyze_image(image_base64: str, use_cache: bool = True) -> str:
     """
     Analyze an image using vision model to extract concepts.
     
+    The payload is decoded, format-sniffed and downscaled off the event loop
+    before upload, and descriptions are cached by content hash (and, when
+    IMAGE_CACHE_PERCEPTUAL is on, by perceptual hash, confirmed against a
+    stored thumbnail before reuse).
+    
     Args:
-        image_base64: Base64 encoded image data
+        image_base64: Base64 encoded image data (optionally a data URI)
+        use_cache: Reuse the description of an identical earlier image
         
     Returns:
         Description of the image content for mind map generation
     """
-    # Determine image type (assume PNG if not specified)
-    if image_base64.startswith("data:"):
-        image_url = image_base64
-    else:
-        image_url = f"data:image/png;base64,{image_base64}"
-    
-    response = await client.chat.completions.create(
-        model=VISION_MODEL,
-        messages=[
-            {"role": "system", "content": VISION_SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Analyze this image for mind map creation:"},
-                    {"type": "image_url", "image_url": {"url": image_url}}
-                ]
-            }
-        ],
-        temperature=0.5,
-        max_tokens=1000,
-        extra_headers={
-            "HTTP-Referer": "https://anymaps.app",
-            "X-Title": "AnyMaps"
-        }
+    image = await prepare_image(image_base64)
+    image_url = image.data_uri
+    
+    cache = get_cache()
+    content_key = make_cache_key("vision", VISION_MODEL, VISION_TEMPERATURE, "", image=image.content_hash)
+    perceptual_key = None
+    # Flat or near-uniform images all hash to zeros, so they only match exactly
+    if IMAGE_CACHE_PERCEPTUAL and image.perceptual_hash.strip("0f"):
+        perceptual_key = make_cache_key(
+            "vision",
+            VISION_MODEL,
+            VISION_TEMPERATURE,
+            "",
+            phash=image.perceptual_hash,
+            aspect=round(image.width / max(image.height, 1), 1),
+        )
+    if use_cache:
+        cached = await cache.aget(content_key)
+        if cached is None and perceptual_key:
+            cached = _perceptual_hit(await cache.aget(perceptual_key), image)
+        if cached is not None:
+            return cached
+    
+    async def call(model: str) -> str:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=build_messages(model, VISION_SYSTEM_PROMPT, [
+                {"type": "text", "text": "Analyze this image for mind map creation:"},
+                {"type": "image_url", "image_url": {"url": image_url}}
+            ]),
+            temperature=VISION_TEMPERATURE,
+            max_tokens=1000,
+            extra_headers=EXTRA_HEADERS
+        )
+        record_usage(model, response.usage, "vision")
+    
+        description = (response.choices[0].message.content or "").strip()
+        if not description:
+            raise ValueError("Vision model returned an empty description")
+        return description
+    
+    async def complete() -> str:
+        description = await executor.run(VISION_MODEL, VISION_FALLBACK_MODEL, call)
+        await cache.aset(content_key, description)
+        if perceptual_key:
+            await cache.aset(perceptual_key, json.dumps({
+                "pixels": base64.b64encode(image.pixels).decode("ascii"),
+                "description": description
+            }))
+        return description
+    
+    return await flights.do(("vision", image.content_hash), complete)
+
+
+async def run_full_pipeline(
+    user_prompt: str,
+    image_base64: Optional[str] = None,
+    builder_mode: Optional[str] = None,
+    diagram_type: str = "mindmap",
+    use_cache: bool = True,
+    generation_mode: Optional[str] = None,
+    target_nodes: Optional[int] = None
+) -> Tuple[PlannerSpec, str]:
+    """
+    Vision (if an image is given) → Planner (single call or fan-out) → Builder.
+    
+    Returns:
+        (PlannerSpec, Mermaid syntax)
+    """
+    image_description = None
+    if image_base64:
+        image_description = await analyze_image(image_base64, use_cache=use_cache)
+    
+    planner_spec = await plan_map(
+        user_prompt=user_prompt,
+        image_description=image_description,
+        generation_mode=generation_mode,
+        target_nodes=target_nodes,
+        use_cache=use_cache
+    )
+    
+    mermaid_syntax = await build_mermaid(
+        planner_spec,
+        builder_mode=builder_mode,
+        diagram_type=diagram_type
     )
     
-    return response.choices[0].message.content.strip()
+    return planner_spec, mermaid_syntax
 
 
 async def run_enhance_agent(
     current_spec: PlannerSpec,
     enhance_prompt: str,
-    enhance_mode: str = "expand"
+    enhance_mode: str = "expand",
+    use_cache: bool = True
 ) -> PlannerSpec:
     """
     Run the Enhance Agent to expand/refine an existing mind map.
@@ -183,84 +719,161 @@ async def run_enhance_agent(
         current_spec: The current mind map specification
         enhance_prompt: User's request for what to add/change
         enhance_mode: Mode - 'expand', 'refine', or 'focus'
+        use_cache: Serve identical earlier requests from the response cache
         
     Returns:
         Updated PlannerSpec with enhancements applied
     """
-    # Format the system prompt with current spec info
-    current_spec_json = current_spec.model_dump_json(indent=2)
-    
-    system_prompt = ENHANCE_SYSTEM_PROMPT.format(
-        current_spec_json=current_spec_json,
+    features = request_features("enhance", enhance_prompt, current_spec=current_spec, enhance_mode=enhance_mode)
+    decision = model_router.choose(features)
+    cache = get_cache()
+    cache_key = make_cache_key(
+        "enhance",
+        decision.served_model,
+        ENHANCE_TEMPERATURE,
+        enhance_prompt,
         enhance_mode=enhance_mode,
-        enhance_prompt=enhance_prompt
+        current_spec=current_spec.model_dump_json(),
     )
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return PlannerSpec.model_validate_json(cached)
+    
+    # A compact (possibly focus-trimmed) view of the spec, after the static system prompt
+    encoded = encode_for_enhance(current_spec, enhance_mode, enhance_prompt)
+    map_context = ENHANCE_MAP_TEMPLATE.format(current_spec_json=encoded.text, spec_notes=encoded.notes)
+    request = ENHANCE_REQUEST_TEMPLATE.format(enhance_mode=enhance_mode, enhance_prompt=enhance_prompt)
+    
+    async def call(model: str) -> Tuple[PlannerSpec, bool]:
+        response = await get_client().chat.completions.create(
+            model=model,  # Same model as planner
+            messages=build_messages(model, ENHANCE_SYSTEM_PROMPT, request, cached_context=map_context),
+            temperature=ENHANCE_TEMPERATURE,
+            max_tokens=3000,  # Higher limit for larger maps
+            extra_headers=EXTRA_HEADERS
+        )
+        record_usage(model, response.usage, "enhance")
+    
+        # Parse the JSON response and map it back onto the real IDs / hidden branches
+        enhanced_spec, partial = parse_planner_output(response.choices[0].message.content, "enhanced spec")
+        return _well_formed(encoded.decode_spec(current_spec, enhanced_spec)), partial
+    
+    enhanced_spec, partial = await model_router.run(features, call, decision)
+    if not partial:
+        await cache.aset(cache_key, enhanced_spec.model_dump_json())
+    return enhanced_spec
+
+
+async def run_enhance_patch_agent(
+    current_spec: PlannerSpec,
+    enhance_prompt: str,
+    enhance_mode: str = "expand",
+    use_cache: bool = True
+) -> Tuple[PlannerSpec, List[SpecOperation]]:
+    """
+    Run the Enhance Agent in patch mode.
     
-    response = await client.chat.completions.create(
-        model=PLANNER_MODEL,  # Use same model as planner
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Please enhance the mind map: {enhance_prompt}"}
-        ],
-        temperature=0.7,
-        max_tokens=3000,  # Higher limit for larger maps
-        extra_headers={
-            "HTTP-Referer": "https://anymaps.app",
-            "X-Title": "AnyMaps"
-        }
+    The model returns only the edit operations, which are validated and
+    applied to current_spec here, so output size scales with the change
+    rather than with the map.
+    
+    Args:
+        current_spec: The current mind map specification
+        enhance_prompt: User's request for what to add/change
+        enhance_mode: Mode - 'expand', 'refine', 'focus' or 'simplify'
+        use_cache: Serve identical earlier requests from the response cache
+        
+    Returns:
+        (updated PlannerSpec, applied operations still in effect after the auto-fix)
+    """
+    features = request_features("enhance_patch", enhance_prompt, current_spec=current_spec, enhance_mode=enhance_mode)
+    decision = model_router.choose(features)
+    cache = get_cache()
+    cache_key = make_cache_key(
+        "enhance_patch",
+        decision.served_model,
+        ENHANCE_TEMPERATURE,
+        enhance_prompt,
+        enhance_mode=enhance_mode,
+        current_spec=current_spec.model_dump_json(),
     )
+    patch = None
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            patch = SpecPatch.model_validate_json(cached)
     
-    # Parse the JSON response
-    content = response.choices[0].message.content
-    
-    # Clean up potential markdown fences
-    if "```" in content:
-        parts = content.split("```")
-        for part in parts:
-            part = part.strip()
-            if part.startswith("json"):
-                part = part[4:].strip()
-            if part.startswith("{"):
-                content = part
-                break
-    
-    content = content.strip()
-    
-    # Extract JSON if wrapped in text
-    if not content.startswith("{"):
-        start_idx = content.find("{")
-        end_idx = content.rfind("}")
-        if start_idx != -1 and end_idx != -1:
-            content = content[start_idx:end_idx + 1]
+    if patch is None:
+        encoded = encode_for_enhance(current_spec, enhance_mode, enhance_prompt)
+        map_context = ENHANCE_MAP_TEMPLATE.format(current_spec_json=encoded.text, spec_notes=encoded.notes)
+        request = ENHANCE_REQUEST_TEMPLATE.format(enhance_mode=enhance_mode, enhance_prompt=enhance_prompt)
     
-    try:
-        spec_dict = json.loads(content)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse enhanced spec as JSON: {e}. Raw: {content[:500]}")
+        async def call(model: str) -> Tuple[SpecPatch, bool]:
+            response = await get_client().chat.completions.create(
+                model=model,  # Same model as planner
+                messages=build_messages(model, ENHANCE_PATCH_SYSTEM_PROMPT, request, cached_context=map_context),
+                temperature=ENHANCE_TEMPERATURE,
+                max_tokens=ENHANCE_PATCH_MAX_TOKENS,
+                extra_headers=EXTRA_HEADERS
+            )
+            record_usage(model, response.usage, "enhance_patch")
+    
+            patch, partial = parse_patch_output(response.choices[0].message.content)
+            return encoded.decode_patch(patch), partial
     
-    return PlannerSpec(**spec_dict)
+        patch, partial = await model_router.run(features, call, decision)
+        if not partial:
+            await cache.aset(cache_key, patch.model_dump_json())
+    
+    enhanced_spec, applied, rejected = apply_patch(current_spec, patch)
+    if patch.operations and not applied:
+        raise ValueError(f"Enhance patch had no valid operations: {'; '.join(rejected[:5])}")
+    
+    # The auto-fix may undo some operations; report only those still in effect
+    enhanced_spec = _well_formed(enhanced_spec)
+    return enhanced_spec, surviving_operations(applied, enhanced_spec)
 
 
-def calculate_changes(original: PlannerSpec, enhanced: PlannerSpec) -> str:
-    """Calculate a summary of changes between original and enhanced specs."""
-    original_node_ids = {n.id for n in original.nodes}
-    enhanced_node_ids = {n.id for n in enhanced.nodes}
+@stage("enhance")
+async def run_enhance_pipeline(
+    current_spec: PlannerSpec,
+    enhance_prompt: str,
+    enhance_mode: str = "expand",
+    enhance_protocol: Optional[str] = None,
+    use_cache: bool = True
+) -> Tuple[PlannerSpec, str, Optional[List[SpecOperation]], SpecDelta]:
+    """
+    Enhance a map with the requested protocol (defaults to ENHANCE_PROTOCOL).
     
-    added_nodes = len(enhanced_node_ids - original_node_ids)
-    removed_nodes = len(original_node_ids - enhanced_node_ids)
+    Returns:
+        (updated PlannerSpec, changes summary, applied operations or None for the full protocol,
+        structural delta from current_spec)
+    """
+    protocol = enhance_protocol or ENHANCE_PROTOCOL
+    
+    if protocol == "patch":
+        # Model returns edit operations; the summary describes the returned spec,
+        # including anything the structural auto-fix changed after them
+        enhanced_spec, operations = await run_enhance_patch_agent(
+            current_spec=current_spec,
+            enhance_prompt=enhance_prompt,
+            enhance_mode=enhance_mode,
+            use_cache=use_cache
+        )
+        delta = diff_specs(current_spec, enhanced_spec)
+        return enhanced_spec, summarize_delta(delta), operations, delta
     
-    original_edge_count = len(original.edges)
-    enhanced_edge_count = len(enhanced.edges)
-    edge_diff = enhanced_edge_count - original_edge_count
+    if protocol != "full":
+        raise ValueError(f"Unsupported enhance protocol: {protocol}")
     
-    parts = []
-    if added_nodes > 0:
-        parts.append(f"Added {added_nodes} node{'s' if added_nodes != 1 else ''}")
-    if removed_nodes > 0:
-        parts.append(f"Removed {removed_nodes} node{'s' if removed_nodes != 1 else ''}")
-    if edge_diff > 0:
-        parts.append(f"Added {edge_diff} connection{'s' if edge_diff != 1 else ''}")
-    elif edge_diff < 0:
-        parts.append(f"Removed {abs(edge_diff)} connection{'s' if abs(edge_diff) != 1 else ''}")
+    enhanced_spec = await run_enhance_agent(
+        current_spec=current_spec,
+        enhance_prompt=enhance_prompt,
+        enhance_mode=enhance_mode,
+        use_cache=use_cache
+    )
     
-    return ", ".join(parts) if parts else "No structural changes"
+    # Calculate what changed
+    delta = diff_specs(current_spec, enhanced_spec)
+    return enhanced_spec, summarize_delta(delta), None, delta
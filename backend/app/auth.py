@@ -0,0 +1,143 @@
+"""Caller identity from Supabase access tokens, for routes that act on a user's own data."""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from .config import SUPABASE_URL, SUPABASE_SERVICE_KEY, SUPABASE_JWT_SECRET, SUPABASE_JWT_AUDIENCE
+
+
+# Clock skew tolerated on token expiry
+LEEWAY_SECONDS = 30
+# Tokens confirmed by the Auth server are trusted for this long (or until they expire)
+REMOTE_CACHE_SECONDS = 60
+REMOTE_CACHE_SIZE = 1024
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+class AuthError(Exception):
+    """A missing, malformed, expired or forged access token."""
+
+
+# ============================================
+# Token Verification
+# ============================================
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _check_claims(claims: Dict[str, Any], now: float) -> str:
+    """The user ID (`sub`) of valid claims."""
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)) or exp + LEEWAY_SECONDS < now:
+        raise AuthError("Token has expired")
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    if SUPABASE_JWT_AUDIENCE and SUPABASE_JWT_AUDIENCE not in audiences:
+        raise AuthError("Token is not for this audience")
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject:
+        raise AuthError("Token has no subject")
+    return subject
+
+
+def verify_token(token: str, secret: str = SUPABASE_JWT_SECRET, now: Optional[float] = None) -> str:
+    """
+    Verify an HS256 Supabase access token against the project's JWT secret.
+
+    Returns:
+        The user ID the token was issued to
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        signed = f"{header_b64}.{payload_b64}".encode("ascii")
+        header = json.loads(_b64decode(header_b64))
+        signature = _b64decode(signature_b64)
+        claims = json.loads(_b64decode(payload_b64))
+    except (ValueError, TypeError):
+        raise AuthError("Malformed token")
+    if not isinstance(header, dict) or header.get("alg") != "HS256" or not isinstance(claims, dict):
+        raise AuthError("Unsupported token")
+    expected = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise AuthError("Invalid token signature")
+    return _check_claims(claims, time.time() if now is None else now)
+
+
+_supabase = None
+# sha256(token) → (user ID, trusted until)
+_remote: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_remote_lock = threading.Lock()
+
+
+def _verify_remote(token: str) -> str:
+    """Ask the Supabase Auth server who `token` belongs to (projects using asymmetric signing keys)."""
+    global _supabase
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    now = time.time()
+    with _remote_lock:
+        cached = _remote.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    try:
+        response = _supabase.auth.get_user(token)
+    except Exception:
+        raise AuthError("Invalid token")
+    user = getattr(response, "user", None)
+    if user is None or not getattr(user, "id", None):
+        raise AuthError("Invalid token")
+    try:
+        claims = json.loads(_b64decode(token.split(".")[1]))
+        expires = float(claims.get("exp", now))
+    except (ValueError, TypeError, IndexError, AttributeError):
+        expires = now
+    with _remote_lock:
+        _remote[key] = (user.id, min(now + REMOTE_CACHE_SECONDS, expires))
+        while len(_remote) > REMOTE_CACHE_SIZE:
+            _remote.popitem(last=False)
+    return user.id
+
+
+def auth_configured() -> bool:
+    return bool(SUPABASE_JWT_SECRET or (SUPABASE_URL and SUPABASE_SERVICE_KEY))
+
+
+# ============================================
+# Dependencies
+# ============================================
+
+async def optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[str]:
+    """
+    The caller's user ID from `Authorization: Bearer <Supabase access token>`,
+    or None without one. A token that is present but invalid is rejected (401).
+    """
+    if credentials is None:
+        return None
+    if not auth_configured():
+        raise HTTPException(status_code=503, detail="User authentication is not configured on this server")
+    try:
+        if SUPABASE_JWT_SECRET:
+            return verify_token(credentials.credentials)
+        return await asyncio.get_running_loop().run_in_executor(None, _verify_remote, credentials.credentials)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+async def current_user(user_id: Optional[str] = Depends(optional_user)) -> str:
+    """The caller's user ID; requests without a valid access token are rejected (401)."""
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Sign in required", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
@@ -0,0 +1,96 @@
+"""Batch map generation with bounded concurrency, streamed as NDJSON."""
+import asyncio
+import hashlib
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from .agents import run_full_pipeline
+from .cache import normalize_prompt
+from .config import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, REQUEST_DEADLINE_SECONDS
+from .models import GenerateBatchRequest, BatchItem, BatchItemResult, BatchSummary
+from .scheduler import current_priority, current_deadline, PRIORITY_BATCH
+
+
+def _item_key(item: BatchItem) -> Tuple[str, str]:
+    """Identity used to de-duplicate items within one batch."""
+    image_hash = hashlib.sha256(item.image_base64.encode("utf-8")).hexdigest() if item.image_base64 else ""
+    return normalize_prompt(item.user_prompt), image_hash
+
+
+async def run_batch(request: GenerateBatchRequest, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Run the plan → build pipeline for every item, yielding one NDJSON line per
+    item as it completes (in completion order), then a summary line.
+
+    Identical items (same normalized prompt and image) run once and their
+    result is repeated for each duplicate. A failing item produces an error
+    line without affecting the rest of the batch.
+    """
+    started = time.monotonic()
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # First index of each distinct item → indices of its duplicates
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for index, item in enumerate(request.items):
+        groups.setdefault(_item_key(item), []).append(index)
+
+    async def run_one(index: int) -> Tuple[int, BatchItemResult]:
+        item = request.items[index]
+        async with semaphore:
+            # Runs in its own task, so these only affect this item's model calls
+            current_priority.set(PRIORITY_BATCH)
+            current_deadline.set(time.monotonic() + REQUEST_DEADLINE_SECONDS)
+            try:
+                planner_spec, mermaid_syntax = await run_full_pipeline(
+                    user_prompt=item.user_prompt,
+                    image_base64=item.image_base64,
+                    builder_mode=request.builder_mode,
+                    diagram_type=request.diagram_type,
+                    use_cache=use_cache
+                )
+                result = BatchItemResult(
+                    index=index,
+                    id=item.id,
+                    success=True,
+                    planner_spec=planner_spec,
+                    mermaid_syntax=mermaid_syntax
+                )
+            except Exception as e:
+                result = BatchItemResult(index=index, id=item.id, success=False, error=str(e))
+        return index, result
+
+    tasks = [asyncio.ensure_future(run_one(indices[0])) for indices in groups.values()]
+    duplicates = {indices[0]: indices[1:] for indices in groups.values()}
+    succeeded = failed = 0
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            lines = [result]
+            for duplicate in duplicates[index]:
+                lines.append(result.model_copy(update={
+                    "index": duplicate,
+                    "id": request.items[duplicate].id,
+                    "duplicate_of": index,
+                }))
+            for line in lines:
+                if line.success:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield line.model_dump_json(exclude_none=True) + "\n"
+    finally:
+        # Client went away or the stream was closed early: stop outstanding work
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    summary = BatchSummary(
+        total=len(request.items),
+        unique=len(groups),
+        succeeded=succeeded,
+        failed=failed,
+        elapsed_seconds=round(time.monotonic() - started, 3),
+    )
+    yield summary.model_dump_json() + "\n"
@@ -0,0 +1,301 @@
+"""Response cache for agent calls with in-memory LRU and SQLite backends."""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .config import CACHE_BACKEND, CACHE_MAX_SIZE, CACHE_TTL_SECONDS, CACHE_SQLITE_PATH
+from .prompts import (
+    PLANNER_SYSTEM_PROMPT,
+    ENHANCE_SYSTEM_PROMPT,
+    ENHANCE_PATCH_SYSTEM_PROMPT,
+    VISION_SYSTEM_PROMPT,
+    FANOUT_OUTLINE_SYSTEM_PROMPT,
+    FANOUT_BRANCH_SYSTEM_PROMPT,
+    ENHANCE_MAP_TEMPLATE,
+    ENHANCE_REQUEST_TEMPLATE,
+)
+
+
+# Request header that skips cache lookups (fresh results are still stored)
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+# SQLite cache: writes per process between size checks (and expired-row purges)
+EVICT_CHECK_INTERVAL = 32
+
+
+def prompt_version(system_prompt: str) -> str:
+    """Short hash of a system prompt, so prompt edits invalidate old entries."""
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_VERSIONS = {
+    "planner": prompt_version(PLANNER_SYSTEM_PROMPT),
+    "enhance": prompt_version(ENHANCE_SYSTEM_PROMPT + ENHANCE_MAP_TEMPLATE + ENHANCE_REQUEST_TEMPLATE),
+    "enhance_patch": prompt_version(ENHANCE_PATCH_SYSTEM_PROMPT + ENHANCE_MAP_TEMPLATE + ENHANCE_REQUEST_TEMPLATE),
+    "vision": prompt_version(VISION_SYSTEM_PROMPT),
+    "planner_fanout": prompt_version(FANOUT_OUTLINE_SYSTEM_PROMPT + FANOUT_BRANCH_SYSTEM_PROMPT),
+}
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    """Case-fold and collapse whitespace so trivially different prompts share a key."""
+    return " ".join((prompt or "").split()).casefold()
+
+
+def make_cache_key(
+    kind: str,
+    model: str,
+    temperature: float,
+    prompt: str,
+    **extra: Any
+) -> str:
+    """
+    Build a cache key for an agent call.
+
+    Args:
+        kind: Agent kind ('planner', 'enhance', ...); selects the prompt version
+        model: Model name the call is routed to
+        temperature: Sampling temperature
+        prompt: User prompt (normalized before hashing)
+        **extra: Any other inputs that change the output (image analysis, current spec)
+
+    Returns:
+        Hex digest identifying the call
+    """
+    payload = {
+        "kind": kind,
+        "version": PROMPT_VERSIONS.get(kind, ""),
+        "model": model,
+        "temperature": temperature,
+        "prompt": normalize_prompt(prompt),
+        "extra": extra,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================
+# Backends
+# ============================================
+
+class CacheBackend:
+    """Base class for cache backends storing string values."""
+
+    name = "base"
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for async callers; backends that block on I/O run it off the event loop."""
+        return self.get(key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """set() for async callers; backends that block on I/O run it off the event loop."""
+        self.set(key, value)
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "size": self.size(),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size, ttl_seconds)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self.sets += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache shared by every worker process pointing at the same file.
+
+    Entries are evicted by TTL on read and by least-recent access once the
+    table grows past max_size. The size is only checked every
+    EVICT_CHECK_INTERVAL writes of this process (expired rows are purged
+    then too), so the table can briefly run that many rows per process over
+    max_size. Counters are per process. Async callers use aget()/aset(),
+    which run the queries on the default thread pool.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_size: int, ttl_seconds: float):
+        super().__init__(max_size, ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+        self._sets_since_check = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now),
+            )
+            self.sets += 1
+            self._sets_since_check += 1
+            if self._sets_since_check >= EVICT_CHECK_INTERVAL:
+                self._sets_since_check = 0
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows, then the least recently used ones past max_size (caller holds the lock)."""
+        self.evictions += self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_size
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class NullCache(CacheBackend):
+    """Backend used when caching is disabled."""
+
+    name = "none"
+
+    def get(self, key: str) -> Optional[str]:
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+
+_cache: Optional[CacheBackend] = None
+
+
+def get_cache() -> CacheBackend:
+    """Return the process-wide cache configured by CACHE_BACKEND."""
+    global _cache
+    if _cache is None:
+        if CACHE_BACKEND == "memory":
+            _cache = MemoryCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
+        elif CACHE_BACKEND == "sqlite":
+            _cache = SQLiteCache(CACHE_SQLITE_PATH, CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
+        else:
+            _cache = NullCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
+    return _cache
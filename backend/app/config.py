@@ -1,10 +1,18 @@
 """Application configuration loaded from environment variables."""
 import os
 import sys
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Runtime
+# Serverless runtimes (Vercel sets VERCEL=1) skip the startup banner, and their filesystem is
+# read-only except for the temp directory (per instance, wiped on cold start)
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+# Directory for the default SQLite files (job queue, map store, SQLite response cache)
+STATE_DIR = os.getenv("STATE_DIR") or (os.path.join(tempfile.gettempdir(), "anymaps") if SERVERLESS else ".cache")
+
 # OpenRouter Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
@@ -12,12 +20,183 @@ OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/ap
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
+# Verifies the caller's access token on /api/maps (project settings, "JWT Secret").
+# Without it tokens are checked with the Supabase Auth server, which needs the URL and key above
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
 
 # Model Configuration
 PLANNER_MODEL = os.getenv("PLANNER_MODEL", "anthropic/claude-3.5-sonnet")
 BUILDER_MODEL = os.getenv("BUILDER_MODEL", "anthropic/claude-3.5-sonnet")
 VISION_MODEL = os.getenv("VISION_MODEL", "anthropic/claude-3.5-sonnet")
 
+# Fallback models used for hedged requests and failover (empty disables hedging)
+PLANNER_FALLBACK_MODEL = os.getenv("PLANNER_FALLBACK_MODEL", "")
+BUILDER_FALLBACK_MODEL = os.getenv("BUILDER_FALLBACK_MODEL", "")
+VISION_FALLBACK_MODEL = os.getenv("VISION_FALLBACK_MODEL", "")
+
+# Adaptive Model Routing (planner and enhance calls)
+# Models from cheapest to strongest; fewer than two keeps PLANNER_MODEL for every request
+PLANNER_MODEL_TIERS = [
+    model.strip() for model in os.getenv("PLANNER_MODEL_TIERS", "").split(",") if model.strip()
+]
+# 'off', 'shadow' (serve PLANNER_MODEL, re-run a sample on the routed tier and log both) or 'on'
+ROUTER_MODE = os.getenv("ROUTER_MODE", "off")
+# Complexity-score (0-1) boundaries between tiers, ascending; empty spreads them over 0.1-0.25
+ROUTER_THRESHOLDS = [float(value) for value in os.getenv("ROUTER_THRESHOLDS", "").split(",") if value.strip()]
+# Weight of the latest call in each model's latency and error-rate averages
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+# A tier failing more often than this is skipped for the next one up
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.25"))
+# A tier averaging slower than this yields to a faster stronger tier (0 ignores latency)
+ROUTER_LATENCY_BUDGET_SECONDS = float(os.getenv("ROUTER_LATENCY_BUDGET_SECONDS", "20"))
+# A tier's error rate halves every this many seconds without calls, and its latency average
+# is ignored once older than this, so a tier routed around is tried again (0 disables)
+ROUTER_HEALTH_HALF_LIFE_SECONDS = float(os.getenv("ROUTER_HEALTH_HALF_LIFE_SECONDS", "60"))
+# Share of upgraded requests served on their complexity tier anyway, to refresh its averages
+ROUTER_PROBE_RATE = float(os.getenv("ROUTER_PROBE_RATE", "0.05"))
+# Shadow mode: share of requests re-run on the routed tier, and the JSON-lines log of the comparisons
+ROUTER_SHADOW_SAMPLE_RATE = float(os.getenv("ROUTER_SHADOW_SAMPLE_RATE", "0.1"))
+ROUTER_SHADOW_LOG_PATH = os.getenv("ROUTER_SHADOW_LOG_PATH", "")
+
+# Prompt Prefix Caching
+# Mark the static system prompt (and an enhanced map) as cacheable for providers that
+# only cache explicitly marked prefixes; others (OpenAI, DeepSeek, ...) cache automatically
+PROMPT_CACHE_HINTS = os.getenv("PROMPT_CACHE_HINTS", "true").lower() in ("1", "true", "yes")
+PROMPT_CACHE_HINT_PROVIDERS = [
+    provider.strip() for provider in os.getenv("PROMPT_CACHE_HINT_PROVIDERS", "anthropic,google").split(",")
+    if provider.strip()
+]
+
+# Request Executor Configuration
+# Hard deadline per model call; stays under Vercel's 60s maxDuration
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "50"))
+# Hedge once a call runs past this percentile of the model's recent latencies
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Hedge delay used until a model has HEDGE_MIN_SAMPLES latency samples
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "15"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Maximum hedges per primary call (0.1 = at most ~10% extra upstream calls)
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+
+# Admission Control
+# Concurrent upstream calls per model; further calls queue by priority
+PLANNER_CONCURRENCY = int(os.getenv("PLANNER_CONCURRENCY", "8"))
+BUILDER_CONCURRENCY = int(os.getenv("BUILDER_CONCURRENCY", "8"))
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+# Used for models without their own setting (e.g. fallbacks)
+DEFAULT_MODEL_CONCURRENCY = int(os.getenv("DEFAULT_MODEL_CONCURRENCY", "4"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "64"))
+# Requests whose queue wait would overrun this are rejected with 503 + Retry-After
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "55"))
+# Per-client token bucket (0 disables rate limiting)
+CLIENT_RATE_PER_MINUTE = float(os.getenv("CLIENT_RATE_PER_MINUTE", "30"))
+CLIENT_BURST = float(os.getenv("CLIENT_BURST", "10"))
+
+# Batch Generation
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Background Jobs
+# Durable queue shared by the API and the worker pool (python -m app.worker)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH") or os.path.join(STATE_DIR, "jobs.sqlite3")
+# Serverless instances have no worker and only a private /tmp, so the job API
+# refuses submissions there unless a shared JOBS_DB_PATH (or JOBS_ENABLED) says otherwise
+JOBS_ENABLED = os.getenv(
+    "JOBS_ENABLED", "false" if SERVERLESS and not os.getenv("JOBS_DB_PATH") else "true"
+).lower() in ("1", "true", "yes")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs each worker process runs at once (model calls are I/O bound)
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+# A running job whose worker stops renewing its lease is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5"))
+
+# Fan-out Generation (large maps: outline call, then one planner call per branch)
+FANOUT_TARGET_NODES = int(os.getenv("FANOUT_TARGET_NODES", "100"))
+FANOUT_MAX_BRANCHES = int(os.getenv("FANOUT_MAX_BRANCHES", "10"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+
+# Builder Configuration
+# 'local' compiles Mermaid in-process; 'llm' keeps the original Builder agent round trip
+BUILDER_MODE = os.getenv("BUILDER_MODE", "local")
+
+# Spec Validation
+# Repair model output (duplicate IDs, dangling edges, cycles, orphans, level skips) before it is served
+SPEC_AUTO_FIX = os.getenv("SPEC_AUTO_FIX", "true").lower() in ("1", "true", "yes")
+
+# Metrics
+# Request/stage timing histograms and the Server-Timing header (/api/metrics is always served)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Server-side Layout
+# Layouts kept in memory, keyed by the hash of the tree they were computed from
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "256"))
+
+# Map Storage
+# MAP_STORE_BACKEND: 'sqlite' (local stand-in for the hosted database)
+MAP_STORE_BACKEND = os.getenv("MAP_STORE_BACKEND", "sqlite")
+MAP_STORE_PATH = os.getenv("MAP_STORE_PATH") or os.path.join(STATE_DIR, "maps.sqlite3")
+# A full copy of the spec every N versions; loading any version replays at most N - 1 deltas
+MAP_CHECKPOINT_INTERVAL = int(os.getenv("MAP_CHECKPOINT_INTERVAL", "16"))
+MAP_PAGE_SIZE = int(os.getenv("MAP_PAGE_SIZE", "24"))
+MAP_MAX_PAGE_SIZE = int(os.getenv("MAP_MAX_PAGE_SIZE", "100"))
+
+# Map Thumbnails
+# Gallery previews rendered on save and cached by spec content address
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "480"))
+THUMBNAIL_HEIGHT = int(os.getenv("THUMBNAIL_HEIGHT", "300"))
+# Formats rendered when a map is saved ('svg', 'png'); others are rendered on first request
+THUMBNAIL_FORMATS = [
+    fmt.strip().lower() for fmt in os.getenv("THUMBNAIL_FORMATS", "svg").split(",") if fmt.strip()
+]
+# Render processes (0 = render on a thread in the API process; the default on serverless)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS") or (0 if SERVERLESS else 2))
+
+# Cold Start
+# OpenAPI schema written by `python -m app.openapi_schema`; /openapi.json serves it
+# instead of rebuilding it from the routes while it matches the source
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "openapi.json"
+)
+
+# Enhance Configuration
+# 'patch' asks the model for edit operations; 'full' asks for the complete updated spec
+ENHANCE_PROTOCOL = os.getenv("ENHANCE_PROTOCOL", "patch")
+# Replace node IDs with short aliases in enhance prompts (mapped back on parse)
+SPEC_ID_ALIASES = os.getenv("SPEC_ID_ALIASES", "true").lower() in ("1", "true", "yes")
+# Maps whose compact spec exceeds this many (estimated) tokens are sent to 'focus'
+# enhancements as the focused branch plus a summary of the others (0 = always whole map)
+ENHANCE_SPEC_TOKEN_BUDGET = int(os.getenv("ENHANCE_SPEC_TOKEN_BUDGET", "1500"))
+
+# Image Pre-processing (vision input)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1568"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", "1048576"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Opt-in: also reuse vision descriptions for visually identical images (resized/re-encoded
+# copies); a perceptual-hash match is confirmed against a 64x64 thumbnail first
+IMAGE_CACHE_PERCEPTUAL = os.getenv("IMAGE_CACHE_PERCEPTUAL", "false").lower() in ("1", "true", "yes")
+
+# Response Cache Configuration
+# CACHE_BACKEND: 'memory' (per-process LRU), 'sqlite' (shared across workers) or 'none'
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH") or os.path.join(STATE_DIR, "responses.sqlite3")
+
+# Semantic (near-duplicate) Planner Cache
+# Opt-in: a near-duplicate prompt can still ask for a different map than the one served
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "5000"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "")
+
 # Server Configuration
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
@@ -34,8 +213,13 @@ CORS_ORIGINS = [
 # ============================================
 # Startup Validation
 # ============================================
-def validate_config():
-    """Validate required configuration on startup."""
+def validate_config(verbose: bool = True):
+    """
+    Validate required configuration on startup.
+
+    Args:
+        verbose: Also print the active models and cache backend when valid
+    """
     errors = []
     
     if not OPENROUTER_API_KEY:
@@ -43,6 +227,36 @@ def validate_config():
     elif not OPENROUTER_API_KEY.startswith("sk-or-"):
         errors.append("OPENROUTER_API_KEY appears invalid (should start with 'sk-or-')")
     
+    if BUILDER_MODE not in ("local", "llm"):
+        errors.append(f"BUILDER_MODE must be 'local' or 'llm' (got '{BUILDER_MODE}')")
+    
+    if ENHANCE_PROTOCOL not in ("patch", "full"):
+        errors.append(f"ENHANCE_PROTOCOL must be 'patch' or 'full' (got '{ENHANCE_PROTOCOL}')")
+    
+    if CACHE_BACKEND not in ("memory", "sqlite", "none"):
+        errors.append(f"CACHE_BACKEND must be 'memory', 'sqlite' or 'none' (got '{CACHE_BACKEND}')")
+    
+    if ROUTER_MODE not in ("off", "shadow", "on"):
+        errors.append(f"ROUTER_MODE must be 'off', 'shadow' or 'on' (got '{ROUTER_MODE}')")
+    
+    if ROUTER_THRESHOLDS and len(ROUTER_THRESHOLDS) != max(0, len(PLANNER_MODEL_TIERS) - 1):
+        errors.append(
+            f"ROUTER_THRESHOLDS needs one value fewer than PLANNER_MODEL_TIERS "
+            f"(got {len(ROUTER_THRESHOLDS)} for {len(PLANNER_MODEL_TIERS)} tiers)"
+        )
+    elif ROUTER_THRESHOLDS != sorted(ROUTER_THRESHOLDS):
+        errors.append("ROUTER_THRESHOLDS must be in ascending order")
+    
+    if MAP_STORE_BACKEND not in ("sqlite",):
+        errors.append(f"MAP_STORE_BACKEND must be 'sqlite' (got '{MAP_STORE_BACKEND}')")
+    
+    if MAP_CHECKPOINT_INTERVAL < 1:
+        errors.append(f"MAP_CHECKPOINT_INTERVAL must be at least 1 (got {MAP_CHECKPOINT_INTERVAL})")
+    
+    unknown_formats = [fmt for fmt in THUMBNAIL_FORMATS if fmt not in ("svg", "png")]
+    if unknown_formats:
+        errors.append(f"THUMBNAIL_FORMATS may only contain 'svg' and 'png' (got {', '.join(unknown_formats)})")
+    
     if errors:
         print("\n❌ Configuration Errors:")
         for error in errors:
@@ -50,8 +264,13 @@ def validate_config():
         print("\nPlease check your .env file and try again.\n")
         sys.exit(1)
     
+    if not verbose:
+        return
+    
     print("✅ Configuration validated successfully")
     print(f"   - Planner Model: {PLANNER_MODEL}")
+    print(f"   - Builder Mode: {BUILDER_MODE}")
     print(f"   - Builder Model: {BUILDER_MODEL}")
     print(f"   - Vision Model: {VISION_MODEL}")
+    print(f"   - Response Cache: {CACHE_BACKEND}")
 
@@ -0,0 +1,160 @@
+"""Linear-time structural diff between two PlannerSpecs."""
+from operator import attrgetter
+from typing import Dict, List, Tuple
+
+from .models import PlannerSpec, NodeSpec, EdgeSpec, NodeChange, EdgeRef, SpecDelta
+
+
+# Every node field except the ID, in declaration order
+NODE_FIELDS = tuple(name for name in NodeSpec.model_fields if name != "id")
+# Top-level spec fields reported in SpecDelta.metadata
+SPEC_FIELDS = ("title", "central_topic", "summary")
+
+_node_fingerprint = attrgetter(*NODE_FIELDS)
+_edge_fingerprint = attrgetter("label", "style")
+
+
+def _index_nodes(spec: PlannerSpec) -> Dict[str, NodeSpec]:
+    """ID → node, first occurrence wins (as in SpecGraph)."""
+    nodes: Dict[str, NodeSpec] = {}
+    for node in spec.nodes:
+        nodes.setdefault(node.id, node)
+    return nodes
+
+
+def _index_edges(spec: PlannerSpec) -> Dict[Tuple[str, str], EdgeSpec]:
+    edges: Dict[Tuple[str, str], EdgeSpec] = {}
+    for edge in spec.edges:
+        edges.setdefault((edge.source, edge.target), edge)
+    return edges
+
+
+def diff_specs(original: PlannerSpec, updated: PlannerSpec) -> SpecDelta:
+    """
+    Compute what changed from `original` to `updated`.
+
+    Nodes are matched by ID and compared by a fingerprint of their content
+    fields; only nodes whose fingerprints differ are compared field by field.
+    Edges are matched by (source, target), so a rewired edge shows up as one
+    removal plus one addition. Lists keep the order of the spec they come from.
+
+    Args:
+        original: The spec before the change
+        updated: The spec after the change
+
+    Returns:
+        SpecDelta describing the change; empty lists when nothing changed
+    """
+    old_nodes = _index_nodes(original)
+    new_nodes = _index_nodes(updated)
+
+    added_nodes: List[NodeSpec] = []
+    modified_nodes: List[NodeChange] = []
+    unchanged = 0
+    for node_id, node in new_nodes.items():
+        before = old_nodes.get(node_id)
+        if before is None:
+            added_nodes.append(node)
+            continue
+        old_values = _node_fingerprint(before)
+        new_values = _node_fingerprint(node)
+        if old_values == new_values:
+            unchanged += 1
+            continue
+        changes, previous = {}, {}
+        for field, old_value, new_value in zip(NODE_FIELDS, old_values, new_values):
+            if old_value != new_value:
+                changes[field] = new_value
+                previous[field] = old_value
+        modified_nodes.append(NodeChange(id=node_id, changes=changes, previous=previous))
+    removed_nodes = [node_id for node_id in old_nodes if node_id not in new_nodes]
+
+    old_edges = _index_edges(original)
+    new_edges = _index_edges(updated)
+    added_edges: List[EdgeSpec] = []
+    modified_edges: List[EdgeSpec] = []
+    for key, edge in new_edges.items():
+        before = old_edges.get(key)
+        if before is None:
+            added_edges.append(edge)
+        elif _edge_fingerprint(before) != _edge_fingerprint(edge):
+            modified_edges.append(edge)
+    removed_edges = [
+        EdgeRef(source=source, target=target) for source, target in old_edges
+        if (source, target) not in new_edges
+    ]
+
+    metadata = {
+        field: getattr(updated, field) for field in SPEC_FIELDS
+        if getattr(original, field) != getattr(updated, field)
+    }
+
+    return SpecDelta(
+        added_nodes=added_nodes,
+        removed_nodes=removed_nodes,
+        modified_nodes=modified_nodes,
+        added_edges=added_edges,
+        removed_edges=removed_edges,
+        modified_edges=modified_edges,
+        metadata=metadata,
+        unchanged_nodes=unchanged,
+    )
+
+
+def _plural(count: int, word: str) -> str:
+    return f"{count} {word}{'s' if count != 1 else ''}"
+
+
+def summarize_delta(delta: SpecDelta) -> str:
+    """Describe a delta as a short summary, e.g. "Added 3 nodes, Updated 1 node"."""
+    parts = []
+    if delta.added_nodes:
+        parts.append(f"Added {_plural(len(delta.added_nodes), 'node')}")
+    if delta.modified_nodes:
+        parts.append(f"Updated {_plural(len(delta.modified_nodes), 'node')}")
+    if delta.removed_nodes:
+        parts.append(f"Removed {_plural(len(delta.removed_nodes), 'node')}")
+    if delta.added_edges:
+        parts.append(f"Added {_plural(len(delta.added_edges), 'connection')}")
+    if delta.modified_edges:
+        parts.append(f"Updated {_plural(len(delta.modified_edges), 'connection')}")
+    if delta.removed_edges:
+        parts.append(f"Removed {_plural(len(delta.removed_edges), 'connection')}")
+
+    return ", ".join(parts) if parts else "No structural changes"
+
+
+def apply_delta(spec: PlannerSpec, delta: SpecDelta) -> PlannerSpec:
+    """
+    Replay a delta from diff_specs() on the spec it was computed against.
+
+    Surviving nodes and edges keep their order with additions appended, so the
+    result equals the diffed spec whenever that spec only appended new items
+    (callers that need an exact copy should compare content hashes).
+
+    Args:
+        spec: The `original` passed to diff_specs()
+        delta: The delta to apply
+
+    Returns:
+        The reconstructed `updated` spec
+    """
+    removed_nodes = set(delta.removed_nodes)
+    changes = {change.id: change.changes for change in delta.modified_nodes}
+    nodes = []
+    for node_id, node in _index_nodes(spec).items():
+        if node_id in removed_nodes:
+            continue
+        update = changes.get(node_id)
+        nodes.append(node.model_copy(update=update) if update else node)
+    nodes.extend(delta.added_nodes)
+
+    removed_edges = {(edge.source, edge.target) for edge in delta.removed_edges}
+    modified_edges = {(edge.source, edge.target): edge for edge in delta.modified_edges}
+    edges = [
+        modified_edges.get(key, edge) for key, edge in _index_edges(spec).items()
+        if key not in removed_edges
+    ]
+    edges.extend(delta.added_edges)
+
+    return spec.model_copy(update={**delta.metadata, "nodes": nodes, "edges": edges})
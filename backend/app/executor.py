@@ -0,0 +1,319 @@
+"""Latency-aware request executor: per-model percentiles, hedging and failover."""
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from .config import (
+    HEDGE_PERCENTILE,
+    HEDGE_MAX_RATE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    LLM_REQUEST_TIMEOUT,
+    ROUTER_EWMA_ALPHA,
+    ROUTER_HEALTH_HALF_LIFE_SECONDS,
+)
+from .scheduler import scheduler
+from .metrics import llm_calls, llm_retries
+
+
+T = TypeVar("T")
+
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one model, plus
+    exponentially weighted averages of latency and error rate that follow
+    recent behaviour (weight ROUTER_EWMA_ALPHA per call) for the model router.
+
+    The averages only move when the model is called, so a model the router
+    stops sending traffic to would keep its last verdict forever. Reads go
+    through error_rate() and latency() instead, which let the verdict fade
+    with time since the last call (half-life ROUTER_HEALTH_HALF_LIFE_SECONDS).
+    """
+
+    def __init__(
+        self,
+        window: int = LATENCY_WINDOW,
+        alpha: float = ROUTER_EWMA_ALPHA,
+        half_life: float = ROUTER_HEALTH_HALF_LIFE_SECONDS
+    ):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.alpha = alpha
+        self.half_life = half_life
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.updated_at: Optional[float] = None
+
+    def _observe_latency(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        if self.ewma_latency is None:
+            self.ewma_latency = seconds
+        else:
+            self.ewma_latency += self.alpha * (seconds - self.ewma_latency)
+
+    def record(self, seconds: float, now: Optional[float] = None) -> None:
+        self._observe_latency(seconds)
+        self.ewma_error_rate = self.error_rate(now)
+        self.ewma_error_rate -= self.alpha * self.ewma_error_rate
+        self.updated_at = time.monotonic() if now is None else now
+
+    def record_cut_short(self, seconds: float, timed_out: bool, now: Optional[float] = None) -> None:
+        """
+        A call cancelled after `seconds`, by the deadline or by a faster hedge.
+
+        It took at least that long, so the time goes into the window and the
+        latency average (leaving it out would keep only the fast calls and
+        pull the hedge delay down). A timeout also counts as an error.
+        """
+        self._observe_latency(seconds)
+        if timed_out:
+            self.record_error(now)
+        else:
+            self.updated_at = time.monotonic() if now is None else now
+
+    def record_error(self, now: Optional[float] = None) -> None:
+        self.errors += 1
+        self.ewma_error_rate = self.error_rate(now)
+        self.ewma_error_rate += self.alpha * (1.0 - self.ewma_error_rate)
+        self.updated_at = time.monotonic() if now is None else now
+
+    def _idle(self, now: Optional[float]) -> float:
+        if self.updated_at is None:
+            return 0.0
+        return max(0.0, (time.monotonic() if now is None else now) - self.updated_at)
+
+    def error_rate(self, now: Optional[float] = None) -> float:
+        """The error-rate average, halved for every half-life since the last call."""
+        if self.half_life <= 0:
+            return self.ewma_error_rate
+        return self.ewma_error_rate * 0.5 ** (self._idle(now) / self.half_life)
+
+    def latency(self, now: Optional[float] = None) -> Optional[float]:
+        """The latency average, or None once no call has refreshed it for a half-life."""
+        if self.half_life > 0 and self._idle(now) > self.half_life:
+            return None
+        return self.ewma_latency
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None with no samples."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[rank]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "samples": len(self.samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "ewma_latency": self.latency(),
+            "ewma_error_rate": round(self.error_rate(), 4),
+        }
+
+
+class HedgeBudget:
+    """
+    Token bucket capping hedges to a fraction of primary calls.
+
+    Each primary call earns `rate` tokens (up to `burst`); a hedge spends one.
+    """
+
+    def __init__(self, rate: float, burst: float = 5.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.rate)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RequestExecutor:
+    """
+    Run model calls with a deadline, hedging slow calls to a fallback model.
+
+    When a call has not finished by its model's rolling p95 (HEDGE_PERCENTILE),
+    the same request is fired at the fallback model and whichever returns a
+    valid result first wins; the other task is cancelled. A primary that fails
+    outright fails over to the fallback, also when the hedge budget
+    (HEDGE_MAX_RATE) kept it from being hedged. Calls cut short by the
+    deadline or by a winning hedge are still recorded in their model's tracker.
+    """
+
+    def __init__(self):
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.budget = HedgeBudget(HEDGE_MAX_RATE)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.timeouts = 0
+        # Why _run() cancelled a call task, read by _timed() as it unwinds
+        self._cancel_reasons: "weakref.WeakKeyDictionary[asyncio.Future, str]" = weakref.WeakKeyDictionary()
+
+    def tracker(self, model: str) -> LatencyTracker:
+        tracker = self.trackers.get(model)
+        if tracker is None:
+            tracker = self.trackers[model] = LatencyTracker()
+        return tracker
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait on the primary before hedging."""
+        tracker = self.tracker(model)
+        if len(tracker.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return tracker.percentile(HEDGE_PERCENTILE)
+
+    async def _timed(
+        self,
+        model: str,
+        call: Callable[[str], Awaitable[T]],
+        started: Optional[asyncio.Event] = None
+    ) -> T:
+        # Queue time is excluded so hedging reacts to upstream latency only:
+        # neither the tracker nor the hedge timer (via `started`) sees it
+        async with scheduler.slot(model):
+            if started is not None:
+                started.set()
+            tracker = self.tracker(model)
+            tracker.calls += 1
+            start = time.perf_counter()
+            try:
+                result = await call(model)
+            except asyncio.CancelledError:
+                reason = self._cancel_reasons.pop(asyncio.current_task(), None)
+                if reason is not None:
+                    tracker.record_cut_short(time.perf_counter() - start, timed_out=reason == "timeout")
+                    llm_calls.inc(model, reason)
+                raise
+            except Exception:
+                tracker.record_error()
+                llm_calls.inc(model, "error")
+                raise
+            tracker.record(time.perf_counter() - start)
+            llm_calls.inc(model, "ok")
+            return result
+
+    async def run(
+        self,
+        model: str,
+        fallback_model: Optional[str],
+        call: Callable[[str], Awaitable[T]],
+        timeout: float = LLM_REQUEST_TIMEOUT
+    ) -> T:
+        """
+        Execute call(model), hedging to call(fallback_model) when it is slow.
+
+        Args:
+            model: Primary model name
+            fallback_model: Model to hedge/fail over to (None or same model disables it)
+            call: Performs the completion *and* validates its output, so an
+                unparseable response counts as a failure rather than a win
+            timeout: Overall deadline in seconds
+
+        Returns:
+            The first valid result
+        """
+        return await self._run(model, fallback_model, call, timeout)
+
+    def _cancel(self, task: "asyncio.Future", reason: Optional[str]) -> None:
+        if reason is not None:
+            self._cancel_reasons[task] = reason
+        task.cancel()
+
+    async def _run(
+        self,
+        model: str,
+        fallback_model: Optional[str],
+        call: Callable[[str], Awaitable[T]],
+        timeout: float
+    ) -> T:
+        deadline = time.monotonic() + timeout
+        self.budget.earn()
+        can_hedge = bool(fallback_model) and fallback_model != model
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._timed(model, call, started))
+        tasks = {primary}
+        hedge = None
+        hedged = False
+        # Why tasks still running on the way out are cancelled: 'timeout', 'cancelled'
+        # (lost to the other task) or None (the caller itself was cancelled)
+        reason: Optional[str] = None
+        try:
+            if can_hedge:
+                # Start the hedge clock once the primary holds its slot; a call
+                # that is merely queued behind a saturated lane is not slow
+                slotted = asyncio.ensure_future(started.wait())
+                try:
+                    await asyncio.wait(
+                        {primary, slotted},
+                        timeout=max(0.0, deadline - time.monotonic()),
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    slotted.cancel()
+                if started.is_set() and not primary.done():
+                    delay = min(self.hedge_delay(model), max(0.0, deadline - time.monotonic()))
+                    done, _ = await asyncio.wait(tasks, timeout=delay)
+                    # Without budget the primary runs alone, but still fails over below
+                    if not done and time.monotonic() < deadline and self.budget.try_spend():
+                        self.hedges += 1
+                        llm_retries.inc(fallback_model, "hedge")
+                        hedged = True
+                        hedge = asyncio.ensure_future(self._timed(fallback_model, call))
+                        tasks.add(hedge)
+
+            first_error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - time.monotonic()
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    reason = "timeout"
+                    self.timeouts += 1
+                    raise TimeoutError(f"Model call to {model} exceeded {timeout:g}s deadline")
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge and hedged:
+                            self.hedge_wins += 1
+                        reason = "cancelled"
+                        return task.result()
+                    first_error = first_error or task.exception()
+                    # Primary failed outright: fail over if no hedge is running yet
+                    if task is primary and hedge is None and can_hedge:
+                        self.failovers += 1
+                        llm_retries.inc(fallback_model, "failover")
+                        hedge = asyncio.ensure_future(self._timed(fallback_model, call))
+                        tasks.add(hedge)
+            raise first_error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    self._cancel(task, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": {model: tracker.stats() for model, tracker in self.trackers.items()},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "timeouts": self.timeouts,
+        }
+
+
+executor = RequestExecutor()
@@ -0,0 +1,148 @@
+"""Merging of fan-out generation results (outline + per-branch expansions) into one PlannerSpec."""
+import math
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from pydantic import ValidationError
+
+from .models import PlannerSpec, NodeSpec, EdgeSpec
+
+
+# The branch node as the branch expansion prompt refers to it
+BRANCH_REF = "branch"
+
+_SLUG_RE = re.compile(r"[^a-z0-9_]+")
+
+
+def _slug(value: Any) -> str:
+    return _SLUG_RE.sub("_", str(value or "").casefold()).strip("_")
+
+
+def _unique_id(base: str, taken: Set[str]) -> str:
+    base = base or "node"
+    candidate = base
+    suffix = 2
+    while candidate in taken:
+        candidate = f"{base}_{suffix}"
+        suffix += 1
+    taken.add(candidate)
+    return candidate
+
+
+def _node(raw: Any, **update: Any) -> Optional[NodeSpec]:
+    if not isinstance(raw, dict):
+        return None
+    try:
+        return NodeSpec(**{**raw, **update})
+    except (ValidationError, TypeError):
+        return None
+
+
+def branch_node_targets(target_nodes: int, branch_count: int) -> int:
+    """Nodes to ask each branch expansion for so the whole map lands near target_nodes."""
+    if branch_count <= 0:
+        return 0
+    return max(2, math.ceil((target_nodes - 1 - branch_count) / branch_count))
+
+
+def outline_branches(outline: Dict[str, Any], max_branches: int) -> List[NodeSpec]:
+    """Valid primary branches from an outline response (at most max_branches)."""
+    branches = []
+    for raw in outline.get("branches") or []:
+        node = _node(raw, type="primary")
+        if node is not None:
+            branches.append(node)
+        if len(branches) >= max_branches:
+            break
+    return branches
+
+
+def merge_fanout(
+    outline: Dict[str, Any],
+    branches: List[NodeSpec],
+    expansions: List[Optional[Dict[str, Any]]]
+) -> PlannerSpec:
+    """
+    Assemble the outline and each branch's expansion into one spec.
+
+    Node IDs are made globally unique by prefixing expansion IDs with their
+    branch's ID. Only edges that keep each branch a tree are kept: endpoints
+    must exist in the same expansion, every node gets one parent and no edge
+    may close a cycle. Nodes left without a parent hang off their branch. A
+    branch whose expansion failed (None) is kept as a leaf.
+
+    Args:
+        outline: Decoded outline response (title, central_topic, central, summary)
+        branches: Primary branches, as returned by outline_branches()
+        expansions: Decoded branch responses, aligned with `branches`
+
+    Returns:
+        The merged PlannerSpec
+    """
+    taken: Set[str] = set()
+    title = outline.get("title") if isinstance(outline.get("title"), str) else None
+    central_topic = outline.get("central_topic") if isinstance(outline.get("central_topic"), str) else None
+    central_raw = outline.get("central") if isinstance(outline.get("central"), dict) else {}
+    central_topic = central_topic or central_raw.get("label") or title or "Mind Map"
+
+    central = _node(central_raw, type="central") or NodeSpec(id="central", label=central_topic, type="central")
+    central = central.model_copy(update={"id": _unique_id(_slug(central.id) or "central", taken)})
+    nodes: List[NodeSpec] = [central]
+    edges: List[EdgeSpec] = []
+
+    for branch, expansion in zip(branches, expansions):
+        branch = branch.model_copy(update={"id": _unique_id(_slug(branch.id) or _slug(branch.label), taken)})
+        nodes.append(branch)
+        edges.append(EdgeSpec(source=central.id, target=branch.id))
+        if not isinstance(expansion, dict):
+            continue
+
+        # Expansion-local ID → global ID
+        local_ids: Dict[str, str] = {BRANCH_REF: branch.id}
+        added: List[str] = []
+        for raw in expansion.get("nodes") or []:
+            node = _node(raw, type="secondary")
+            if node is None or node.id in local_ids:
+                continue
+            global_id = _unique_id(f"{branch.id}__{_slug(node.id) or 'node'}", taken)
+            local_ids[node.id] = global_id
+            added.append(global_id)
+            nodes.append(node.model_copy(update={"id": global_id}))
+
+        parents: Dict[str, str] = {}
+        for raw in expansion.get("edges") or []:
+            if not isinstance(raw, dict):
+                continue
+            # Endpoints must be ID strings (a list or object is not even hashable)
+            if not isinstance(raw.get("source"), str) or not isinstance(raw.get("target"), str):
+                continue
+            source = local_ids.get(raw["source"])
+            target = local_ids.get(raw["target"])
+            if source is None or target is None or target == branch.id or source == target or target in parents:
+                continue
+            # Walking up from the source must not reach the target
+            ancestor = source
+            while ancestor in parents and ancestor != target:
+                ancestor = parents[ancestor]
+            if ancestor == target:
+                continue
+            try:
+                edge = EdgeSpec(**{**raw, "source": source, "target": target})
+            except (ValidationError, TypeError):
+                edge = EdgeSpec(source=source, target=target)
+            parents[target] = source
+            edges.append(edge)
+
+        for node_id in added:
+            if node_id not in parents:
+                parents[node_id] = branch.id
+                edges.append(EdgeSpec(source=branch.id, target=node_id))
+
+    summary = outline.get("summary") if isinstance(outline.get("summary"), str) else None
+    return PlannerSpec(
+        title=title or central_topic,
+        central_topic=central_topic,
+        nodes=nodes,
+        edges=edges,
+        summary=summary,
+    )
@@ -0,0 +1,302 @@
+"""Indexed graph view of a PlannerSpec with linear-time validation and repair."""
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from .models import PlannerSpec, NodeSpec, EdgeSpec, GraphIssue
+
+
+def _normalize_label(label: Optional[str]) -> str:
+    return " ".join((label or "").split()).lower()
+
+
+class SpecGraph:
+    """
+    Adjacency index over a spec, built in two passes over the edges.
+
+    Duplicate node IDs (first occurrence wins), edges to unknown nodes,
+    self-loops and repeated (source, target) pairs are set aside while
+    indexing, so `edges` only holds usable edges.
+
+    The hierarchy is made of solid edges. A dashed or dotted edge into a node
+    that already has a solid parent is a cross-link (e.g. "influences") and
+    goes to `links`: it is drawn, but never parents a node, and cycle and
+    level checks ignore it. Dashed or dotted edges into a node with no solid
+    parent still place that node in the tree. `forward` and `backward` index
+    the hierarchy (`tree_edges`) only. Every query below is O(n + m).
+    """
+
+    def __init__(self, spec: PlannerSpec):
+        self.spec = spec
+        self.nodes: List[NodeSpec] = []
+        self.nodes_by_id: Dict[str, NodeSpec] = {}
+        self.duplicate_ids: List[str] = []
+        for node in spec.nodes:
+            if node.id in self.nodes_by_id:
+                self.duplicate_ids.append(node.id)
+            else:
+                self.nodes_by_id[node.id] = node
+                self.nodes.append(node)
+
+        self.edges: List[EdgeSpec] = []
+        self.tree_edges: List[EdgeSpec] = []
+        self.links: List[EdgeSpec] = []
+        self.dangling_edges: List[EdgeSpec] = []
+        self.self_loops: List[EdgeSpec] = []
+        self.duplicate_edges: List[EdgeSpec] = []
+        self.forward: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes_by_id}
+        self.backward: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes_by_id}
+        seen: Set[Tuple[str, str]] = set()
+        for edge in spec.edges:
+            key = (edge.source, edge.target)
+            if edge.source not in self.nodes_by_id or edge.target not in self.nodes_by_id:
+                self.dangling_edges.append(edge)
+            elif edge.source == edge.target:
+                self.self_loops.append(edge)
+            elif key in seen:
+                self.duplicate_edges.append(edge)
+            else:
+                seen.add(key)
+                self.edges.append(edge)
+
+        has_solid_parent = {edge.target for edge in self.edges if edge.style == "solid"}
+        for edge in self.edges:
+            if edge.style != "solid" and edge.target in has_solid_parent:
+                self.links.append(edge)
+            else:
+                self.tree_edges.append(edge)
+                self.forward[edge.source].append(edge.target)
+                self.backward[edge.target].append(edge.source)
+
+        self.root_id = self._find_root()
+        self._depth: Optional[Dict[str, int]] = None
+
+    def _find_root(self) -> Optional[str]:
+        """
+        Preference order: a node typed 'central', a node whose label matches the
+        central topic, the first node with no incoming edges, the first node.
+        """
+        if not self.nodes:
+            return None
+        for node in self.nodes:
+            if node.type == "central":
+                return node.id
+        topic = _normalize_label(self.spec.central_topic)
+        for node in self.nodes:
+            if _normalize_label(node.label) == topic:
+                return node.id
+        targets = {edge.target for edge in self.tree_edges}
+        for node in self.nodes:
+            if node.id not in targets:
+                return node.id
+        return self.nodes[0].id
+
+    @property
+    def depth(self) -> Dict[str, int]:
+        """BFS distance from the root along tree-edge direction (unreachable nodes are absent)."""
+        if self._depth is None:
+            depth: Dict[str, int] = {}
+            if self.root_id is not None:
+                depth[self.root_id] = 0
+                queue = deque([self.root_id])
+                while queue:
+                    current = queue.popleft()
+                    for child in self.forward[current]:
+                        if child not in depth:
+                            depth[child] = depth[current] + 1
+                            queue.append(child)
+            self._depth = depth
+        return self._depth
+
+    def orphans(self) -> List[str]:
+        """Nodes the root cannot reach by following tree edges."""
+        depth = self.depth
+        return [node.id for node in self.nodes if node.id not in depth]
+
+    def cycle_edges(self) -> List[Tuple[str, str]]:
+        """
+        Tree edges found as back edges by an iterative DFS (from the root
+        first, then from every unvisited node); removing them leaves the
+        hierarchy acyclic. Cross-links may point anywhere.
+        """
+        state: Dict[str, int] = {}  # 1 = on the DFS stack, 2 = finished
+        back: List[Tuple[str, str]] = []
+        starts = ([self.root_id] if self.root_id is not None else []) + [node.id for node in self.nodes]
+        for start in starts:
+            if start in state:
+                continue
+            state[start] = 1
+            stack = [(start, iter(self.forward[start]))]
+            while stack:
+                node_id, children = stack[-1]
+                for child in children:
+                    child_state = state.get(child)
+                    if child_state is None:
+                        state[child] = 1
+                        stack.append((child, iter(self.forward[child])))
+                        break
+                    if child_state == 1:
+                        back.append((node_id, child))
+                else:
+                    state[node_id] = 2
+                    stack.pop()
+        return back
+
+    def hierarchy_jumps(self, back_edges: Optional[List[Tuple[str, str]]] = None) -> List[Tuple[str, str]]:
+        """
+        Tree edges that skip a level: u → v where v also hangs off a deeper parent.
+
+        Levels are longest-path distances from the root over the acyclic part
+        of the graph (Kahn's algorithm), so an edge is a jump exactly when
+        level(v) > level(u) + 1.
+        """
+        if self.root_id is None:
+            return []
+        if back_edges is None:
+            back_edges = self.cycle_edges()
+        skip = set(back_edges)
+        reachable = self.depth
+        indegree = {node_id: 0 for node_id in reachable}
+        for edge in self.tree_edges:
+            if edge.source in reachable and (edge.source, edge.target) not in skip:
+                indegree[edge.target] += 1
+
+        level = {self.root_id: 0}
+        queue = deque([self.root_id])
+        while queue:
+            current = queue.popleft()
+            for child in self.forward[current]:
+                if (current, child) in skip:
+                    continue
+                level[child] = max(level.get(child, 0), level[current] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+
+        return [
+            (edge.source, edge.target) for edge in self.tree_edges
+            if edge.source in level and edge.target in level
+            and (edge.source, edge.target) not in skip
+            and level[edge.target] > level[edge.source] + 1
+        ]
+
+    def issues(self) -> List[GraphIssue]:
+        """Every structural problem in the spec."""
+        issues: List[GraphIssue] = []
+        for node_id in self.duplicate_ids:
+            issues.append(GraphIssue(kind="duplicate_id", node_id=node_id, message=f"Node ID '{node_id}' is used more than once"))
+        for edge in self.dangling_edges:
+            issues.append(GraphIssue(
+                kind="dangling_edge", source=edge.source, target=edge.target,
+                message=f"Edge {edge.source} → {edge.target} references a node that does not exist"
+            ))
+        for edge in self.self_loops:
+            issues.append(GraphIssue(kind="self_loop", source=edge.source, target=edge.target, message=f"Node '{edge.source}' links to itself"))
+        for edge in self.duplicate_edges:
+            issues.append(GraphIssue(
+                kind="duplicate_edge", source=edge.source, target=edge.target,
+                message=f"Edge {edge.source} → {edge.target} appears more than once"
+            ))
+        back_edges = self.cycle_edges()
+        for source, target in back_edges:
+            issues.append(GraphIssue(kind="cycle", source=source, target=target, message=f"Edge {source} → {target} closes a cycle"))
+        for node_id in self.orphans():
+            issues.append(GraphIssue(kind="orphan", node_id=node_id, message=f"Node '{node_id}' is not reachable from the central node"))
+        for source, target in self.hierarchy_jumps(back_edges):
+            issues.append(GraphIssue(
+                kind="hierarchy_jump", source=source, target=target,
+                message=f"Edge {source} → {target} skips a level ('{target}' already has a deeper parent)"
+            ))
+        return issues
+
+
+def _plural(count: int, noun: str) -> str:
+    return f"{count} {noun}{'s' if count != 1 else ''}"
+
+
+def repair_spec(spec: PlannerSpec) -> Tuple[PlannerSpec, List[str]]:
+    """
+    Fix a spec's structure so it is a single rooted DAG with no level skips.
+
+    In order:
+        - duplicate nodes, dangling edges, self-loops and repeated edges are dropped
+        - nodes wired backwards to the tree have that edge reversed, as the
+          Mermaid tree builder would read it; fully disconnected nodes are
+          attached to the root
+        - edges closing a cycle are dropped
+        - hierarchy-jumping edges are dropped (their target keeps its deeper parent)
+
+    Only the hierarchy is repaired: dashed and dotted cross-links between
+    nodes that already have a solid parent are kept as they are.
+
+    Returns:
+        (repaired spec, human-readable list of fixes; empty if nothing changed)
+    """
+    graph = SpecGraph(spec)
+    fixes: List[str] = []
+    if graph.duplicate_ids:
+        fixes.append(f"Removed {_plural(len(graph.duplicate_ids), 'duplicate node')}")
+    if graph.dangling_edges:
+        fixes.append(f"Removed {_plural(len(graph.dangling_edges), 'edge')} to unknown nodes")
+    if graph.self_loops or graph.duplicate_edges:
+        fixes.append(f"Removed {_plural(len(graph.self_loops) + len(graph.duplicate_edges), 'self-loop or repeated edge')}")
+    root_id = graph.root_id
+    if root_id is None:
+        return spec.model_copy(update={"nodes": graph.nodes, "edges": []}), fixes
+
+    # Edge list with slots, so reversals keep their position and removals leave None
+    edges: List[Optional[EdgeSpec]] = list(graph.edges)
+    slot: Dict[Tuple[str, str], int] = {(edge.source, edge.target): i for i, edge in enumerate(edges)}
+
+    # Attach everything to the tree: follow edges, reversing ones that point into it
+    reached = {root_id}
+    reversed_count = attached = 0
+
+    def sweep(start: str) -> None:
+        nonlocal reversed_count
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for child in graph.forward[current]:
+                if child not in reached:
+                    reached.add(child)
+                    queue.append(child)
+            for parent in graph.backward[current]:
+                if parent not in reached:
+                    i = slot.pop((parent, current))
+                    if (current, parent) not in slot:
+                        edges[i] = edges[i].model_copy(update={"source": current, "target": parent})
+                        slot[(current, parent)] = i
+                    else:
+                        edges[i] = None
+                    reversed_count += 1
+                    reached.add(parent)
+                    queue.append(parent)
+
+    sweep(root_id)
+    for node in graph.nodes:
+        if node.id not in reached:
+            reached.add(node.id)
+            slot[(root_id, node.id)] = len(edges)
+            edges.append(EdgeSpec(source=root_id, target=node.id))
+            attached += 1
+            sweep(node.id)
+    if reversed_count:
+        fixes.append(f"Reversed {_plural(reversed_count, 'backwards edge')}")
+    if attached:
+        fixes.append(f"Attached {_plural(attached, 'orphan node')} to the root")
+
+    interim = spec.model_copy(update={"nodes": graph.nodes, "edges": [edge for edge in edges if edge is not None]})
+    graph = SpecGraph(interim)
+    back_edges = graph.cycle_edges()
+    jumps = graph.hierarchy_jumps(back_edges)
+    if back_edges:
+        fixes.append(f"Removed {_plural(len(back_edges), 'edge')} closing a cycle")
+    if jumps:
+        fixes.append(f"Removed {_plural(len(jumps), 'hierarchy-jumping edge')}")
+    if not back_edges and not jumps:
+        return (interim if fixes else spec), fixes
+
+    drop = set(back_edges) | set(jumps)
+    return interim.model_copy(update={
+        "edges": [edge for edge in interim.edges if (edge.source, edge.target) not in drop]
+    }), fixes
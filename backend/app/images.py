@@ -0,0 +1,198 @@
+"""Image pre-processing for the vision agent: decode, sniff, downscale and hash."""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from .config import IMAGE_MAX_DIMENSION, IMAGE_MAX_BYTES, IMAGE_JPEG_QUALITY, IMAGE_WORKERS
+
+# Pillow is imported on the first image request, not on every cold start
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+# Magic-byte signatures for formats the vision models accept
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# Hard cap on decoded payload size, checked before any decoding work
+MAX_PAYLOAD_BYTES = 20 * 1024 * 1024
+
+# Grayscale thumbnail confirming a perceptual-hash match: side length, and the
+# largest per-pixel difference still treated as the same picture. Re-encoded
+# or resized copies stay under ~20; one changed word on a slide goes over 30.
+PIXEL_CHECK_SIZE = 64
+PIXEL_CHECK_TOLERANCE = 24
+
+# Pillow releases the GIL while decoding/resampling, so threads give real parallelism
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+class NormalizedImage:
+    """A vision-ready image plus the hashes used to cache its description."""
+
+    __slots__ = ("data", "mime", "width", "height", "content_hash", "perceptual_hash", "pixels")
+
+    def __init__(
+        self,
+        data: bytes,
+        mime: str,
+        width: int,
+        height: int,
+        content_hash: str,
+        perceptual_hash: str,
+        pixels: bytes = b""
+    ):
+        self.data = data
+        self.mime = mime
+        self.width = width
+        self.height = height
+        self.content_hash = content_hash
+        self.perceptual_hash = perceptual_hash
+        self.pixels = pixels
+
+    @property
+    def data_uri(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def sniff_mime(data: bytes) -> Optional[str]:
+    """Identify the real image format from its leading bytes."""
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decode_payload(image_base64: str) -> bytes:
+    """
+    Decode a base64 image, with or without a data URI prefix.
+
+    The declared data URI type is ignored; the format is sniffed later.
+    """
+    payload = image_base64.strip()
+    if payload.startswith("data:"):
+        _, _, payload = payload.partition(",")
+    # Rough pre-check so oversized uploads are rejected before decoding
+    if len(payload) * 3 // 4 > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"Image exceeds {MAX_PAYLOAD_BYTES // (1024 * 1024)} MB limit")
+    try:
+        return base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Image is not valid base64: {e}")
+
+
+def perceptual_hash(image: "Image.Image") -> str:
+    """64-bit difference hash (dHash); re-encoded or resized copies usually match."""
+    from PIL import Image
+
+    small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return f"{bits:016x}"
+
+
+def pixel_thumbnail(image: "Image.Image") -> bytes:
+    """Box-downscaled grayscale pixels (PIXEL_CHECK_SIZE square), for same_picture()."""
+    from PIL import Image
+
+    return image.convert("L").resize((PIXEL_CHECK_SIZE, PIXEL_CHECK_SIZE), Image.Resampling.BOX).tobytes()
+
+
+def same_picture(pixels: bytes, other: bytes, tolerance: int = PIXEL_CHECK_TOLERANCE) -> bool:
+    """
+    Second check behind a perceptual-hash match.
+
+    A 64-bit dHash collides for slides built on one template; comparing the
+    larger thumbnails pixel by pixel tells those apart.
+    """
+    if not pixels or len(pixels) != len(other):
+        return False
+    return max(abs(a - b) for a, b in zip(pixels, other)) <= tolerance
+
+
+def _encode(image: "Image.Image", has_alpha: bool, quality: int) -> Tuple[bytes, str]:
+    buffer = io.BytesIO()
+    if has_alpha:
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def normalize_image(raw: bytes) -> NormalizedImage:
+    """
+    Bound an image's resolution and size for the vision model.
+
+    Images already within IMAGE_MAX_DIMENSION and IMAGE_MAX_BYTES are passed
+    through untouched; others are EXIF-rotated, downscaled and re-encoded
+    (JPEG, or PNG when there is transparency) with decreasing quality until
+    they fit. CPU-bound; call via prepare_image() from async code.
+    """
+    from PIL import Image, ImageOps
+
+    mime = sniff_mime(raw)
+    if mime is None:
+        raise ValueError("Unsupported image format (expected PNG, JPEG, GIF or WebP)")
+
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Could not decode image: {e}")
+
+    # Animated GIF/WebP: the first frame is what the model would look at anyway
+    image.seek(0)
+    image = ImageOps.exif_transpose(image)
+    phash = perceptual_hash(image)
+    pixels = pixel_thumbnail(image)
+
+    width, height = image.size
+    if max(width, height) <= IMAGE_MAX_DIMENSION and len(raw) <= IMAGE_MAX_BYTES:
+        data = raw
+    else:
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.Resampling.LANCZOS)
+        width, height = image.size
+        quality = IMAGE_JPEG_QUALITY
+        data, mime = _encode(image, has_alpha, quality)
+        while len(data) > IMAGE_MAX_BYTES and quality > 40 and not has_alpha:
+            quality -= 15
+            data, mime = _encode(image, has_alpha, quality)
+
+    return NormalizedImage(
+        data=data,
+        mime=mime,
+        width=width,
+        height=height,
+        content_hash=hashlib.sha256(data).hexdigest(),
+        perceptual_hash=phash,
+        pixels=pixels,
+    )
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    return _pool
+
+
+async def prepare_image(image_base64: str) -> NormalizedImage:
+    """Decode and normalize an uploaded image off the event loop."""
+    loop = asyncio.get_running_loop()
+    raw = await loop.run_in_executor(_get_pool(), decode_payload, image_base64)
+    return await loop.run_in_executor(_get_pool(), normalize_image, raw)
@@ -0,0 +1,382 @@
+"""Durable background jobs: a SQLite-backed queue shared by the API and the worker pool."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from .config import (
+    JOBS_DB_PATH,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF_SECONDS,
+    JOB_LEASE_SECONDS,
+    JOB_RESULT_TTL_SECONDS,
+)
+from .models import (
+    GeneratePlanRequest,
+    GeneratePlanResponse,
+    GenerateFullRequest,
+    GenerateFullResponse,
+    EnhanceMapRequest,
+    EnhanceMapResponse,
+    JobResponse,
+)
+
+
+# Job kind → request body it accepts (the same body as the synchronous endpoint)
+JOB_REQUEST_MODELS: Dict[str, Type[BaseModel]] = {
+    "plan": GeneratePlanRequest,
+    "full": GenerateFullRequest,
+    "enhance": EnhanceMapRequest,
+}
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+
+def input_hash(kind: str, payload: BaseModel) -> str:
+    """Identity of a job's input, used to de-duplicate submissions."""
+    canonical = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def job_response(job: Dict[str, Any], deduplicated: bool = False, include_result: bool = True) -> JobResponse:
+    """Build the API view of a job row."""
+    result = None
+    if include_result and job["result"] is not None:
+        result = json.loads(job["result"])
+    return JobResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        attempts=job["attempts"],
+        max_attempts=job["max_attempts"],
+        deduplicated=deduplicated,
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        expires_at=job["expires_at"],
+        error=job["error"],
+        result=result,
+    )
+
+
+def job_response_json(job: Dict[str, Any]) -> str:
+    """
+    job_response() serialized, with the stored result spliced in as-is.
+
+    The result column already holds the endpoint's JSON body, so it is not
+    decoded and validated again just to be encoded back for the client.
+    """
+    body = job_response(job, include_result=False).model_dump_json(exclude={"result"})
+    result = job["result"] if job["result"] is not None else "null"
+    return f'{body[:-1]},"result":{result}}}'
+
+
+# ============================================
+# Queue Storage
+# ============================================
+
+class JobStore:
+    """
+    Job table in a SQLite file that every API and worker process opens.
+
+    Workers claim a job by leasing it for JOB_LEASE_SECONDS and renew the lease
+    while it runs, so a job whose worker dies is picked up again once the lease
+    lapses. Finished jobs are kept for JOB_RESULT_TTL_SECONDS.
+    """
+
+    def __init__(
+        self,
+        path: str = JOBS_DB_PATH,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        result_ttl_seconds: float = JOB_RESULT_TTL_SECONDS,
+        retry_backoff_seconds: float = JOB_RETRY_BACKOFF_SECONDS
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, input_hash TEXT NOT NULL, "
+            "payload TEXT NOT NULL, use_cache INTEGER NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "result TEXT, error TEXT, worker TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, available_at REAL NOT NULL, "
+            "lease_until REAL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_input ON jobs(input_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs(expires_at)")
+
+    def _fetch(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def submit(
+        self,
+        kind: str,
+        payload: BaseModel,
+        use_cache: bool = True,
+        max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job, or return the live job for the same input.
+
+        A queued, running or unexpired succeeded job with the same kind and
+        payload is reused; failed jobs are not. Cache-bypassing submissions
+        always create a new job.
+
+        Returns:
+            (job row, whether an existing job was reused)
+        """
+        if kind not in JOB_REQUEST_MODELS:
+            raise ValueError(f"Unsupported job kind: {kind}")
+        digest = input_hash(kind, payload)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if use_cache:
+                    row = self._conn.execute(
+                        "SELECT * FROM jobs WHERE input_hash = ? AND status != 'failed' "
+                        "AND (expires_at IS NULL OR expires_at > ?) "
+                        "ORDER BY created_at DESC LIMIT 1",
+                        (digest, now),
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute("COMMIT")
+                        return dict(row), True
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, input_hash, payload, use_cache, status, max_attempts, "
+                    "created_at, updated_at, available_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (job_id, kind, digest, payload.model_dump_json(), int(use_cache), max(1, max_attempts),
+                     now, now, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._fetch(job_id), False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job row, or None if unknown or its result has expired."""
+        with self._lock:
+            job = self._fetch(job_id)
+        if job is None or (job["expires_at"] is not None and job["expires_at"] <= time.time()):
+            return None
+        return job
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next runnable job to `worker`.
+
+        Jobs whose lease lapsed (their worker died or hung) are reclaimed first;
+        if they have used up their attempts they are failed instead.
+
+        Returns:
+            The claimed job row with its attempt counted, or None if the queue is empty
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Abandoned jobs with no attempts left
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker stopped while running the job', "
+                    "worker = NULL, lease_until = NULL, updated_at = ?, expires_at = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                    (now, now + self.result_ttl_seconds, now),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND lease_until < ? "
+                    "ORDER BY lease_until LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    row = self._conn.execute(
+                        "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                        "ORDER BY available_at LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                    "lease_until = ?, updated_at = ? WHERE id = ?",
+                    (worker, now + self.lease_seconds, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._fetch(row["id"])
+
+    def _update_owned(self, job_id: str, worker: str, assignments: str, params: tuple) -> bool:
+        """Update a job only while `worker` still holds its lease."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND worker = ? AND status = 'running'",
+                params + (job_id, worker),
+            )
+            return cursor.rowcount > 0
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extend the lease; False if the job was reclaimed by another worker."""
+        now = time.time()
+        return self._update_owned(job_id, worker, "lease_until = ?, updated_at = ?", (now + self.lease_seconds, now))
+
+    def complete(self, job_id: str, worker: str, result: str) -> bool:
+        """Store a job's result (the response body as JSON)."""
+        now = time.time()
+        return self._update_owned(
+            job_id, worker,
+            "status = 'succeeded', result = ?, error = NULL, worker = NULL, lease_until = NULL, "
+            "updated_at = ?, expires_at = ?",
+            (result, now, now + self.result_ttl_seconds),
+        )
+
+    def fail(self, job_id: str, worker: str, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt.
+
+        The job is re-queued with exponential backoff while it has attempts
+        left (and `retry` is set), otherwise it is marked failed.
+        """
+        now = time.time()
+        with self._lock:
+            job = self._fetch(job_id)
+        if job is None:
+            return False
+        if retry and job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff_seconds * 2 ** (job["attempts"] - 1)
+            return self._update_owned(
+                job_id, worker,
+                "status = 'queued', error = ?, worker = NULL, lease_until = NULL, "
+                "updated_at = ?, available_at = ?",
+                (error, now, now + delay),
+            )
+        return self._update_owned(
+            job_id, worker,
+            "status = 'failed', error = ?, worker = NULL, lease_until = NULL, updated_at = ?, expires_at = ?",
+            (error, now, now + self.result_ttl_seconds),
+        )
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """Hand a job back to the queue without counting the attempt (worker shutting down)."""
+        now = time.time()
+        return self._update_owned(
+            job_id, worker,
+            "status = 'queued', attempts = attempts - 1, worker = NULL, lease_until = NULL, "
+            "updated_at = ?, available_at = ?",
+            (now, now),
+        )
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs past their result TTL."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE expires_at IS NULL OR expires_at > ? GROUP BY status",
+                (now,),
+            ).fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+
+_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Return this process's connection to the job queue."""
+    global _store
+    if _store is None:
+        _store = JobStore()
+    return _store
+
+
+def existing_job_store() -> Optional[JobStore]:
+    """The job queue if this process has opened it or its database already exists; never creates one."""
+    if _store is None and not os.path.exists(JOBS_DB_PATH):
+        return None
+    return get_job_store()
+
+
+# ============================================
+# Job Execution
+# ============================================
+
+async def execute_job(kind: str, payload_json: str, use_cache: bool = True) -> str:
+    """
+    Run one job through the agent pipeline.
+
+    Returns:
+        The synchronous endpoint's success response, serialized as JSON
+    """
+    # Imported here so the API process only pays for the queue, not the agent stack
+    from .agents import analyze_image, plan_map, run_full_pipeline, run_enhance_pipeline
+
+    request = JOB_REQUEST_MODELS[kind].model_validate_json(payload_json)
+
+    if kind == "plan":
+        image_description = None
+        if request.image_base64:
+            image_description = await analyze_image(request.image_base64, use_cache=use_cache)
+        planner_spec = await plan_map(
+            user_prompt=request.user_prompt,
+            image_description=image_description,
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes,
+            use_cache=use_cache
+        )
+        return GeneratePlanResponse(success=True, planner_spec=planner_spec).model_dump_json()
+
+    if kind == "full":
+        planner_spec, mermaid_syntax = await run_full_pipeline(
+            user_prompt=request.user_prompt,
+            image_base64=request.image_base64,
+            builder_mode=request.builder_mode,
+            diagram_type=request.diagram_type,
+            use_cache=use_cache,
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes
+        )
+        return GenerateFullResponse(
+            success=True,
+            planner_spec=planner_spec,
+            mermaid_syntax=mermaid_syntax
+        ).model_dump_json()
+
+    enhanced_spec, changes_summary, operations, delta = await run_enhance_pipeline(
+        current_spec=request.current_spec,
+        enhance_prompt=request.enhance_prompt,
+        enhance_mode=request.enhance_mode,
+        enhance_protocol=request.enhance_protocol,
+        use_cache=use_cache
+    )
+    return EnhanceMapResponse(
+        success=True,
+        planner_spec=enhanced_spec,
+        changes_summary=changes_summary,
+        operations=operations,
+        delta=delta
+    ).model_dump_json()
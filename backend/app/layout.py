@@ -0,0 +1,235 @@
+"""Server-side tidy-tree layout of a PlannerSpec (mirrors the frontend's ELK mrtree, direction RIGHT)."""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import LAYOUT_CACHE_SIZE
+from .graph import SpecGraph
+from .mermaid import build_tree
+from .models import PlannerSpec
+
+
+# Node dimensions and spacing used by frontend/src/lib/layout.ts
+NODE_WIDTH = 280
+NODE_HEIGHT = 120
+CENTRAL_NODE_WIDTH = 350
+CENTRAL_NODE_HEIGHT = 200
+NODE_SPACING = 80  # Between siblings (vertical)
+LAYER_SPACING = 100  # Between depth levels (horizontal)
+
+# (x, y, width, height) of a node's top-left corner, as React Flow expects
+Box = Tuple[float, float, int, int]
+
+
+class TreeLayout:
+    """Node boxes for one spec plus the hash of the tree they were computed from."""
+
+    __slots__ = ("topology_hash", "boxes", "width", "height")
+
+    def __init__(self, topology_hash: str, boxes: Dict[str, Box], width: float, height: float):
+        self.topology_hash = topology_hash
+        self.boxes = boxes
+        self.width = width
+        self.height = height
+
+
+# ============================================
+# Tree Flattening
+# ============================================
+
+def _flatten(spec: PlannerSpec) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, str]:
+    """
+    Lay the spanning tree out in BFS order, so every level and every sibling
+    group is a contiguous slice.
+
+    Returns:
+        (ids, parent index per node (-1 for the root), depth per node,
+        whether each node is central, topology hash)
+    """
+    graph = SpecGraph(spec)
+    root_id, children, nodes_by_id = build_tree(spec, graph)
+    if root_id is None:
+        empty = np.zeros(0, dtype=np.int64)
+        return [], empty, empty, empty.astype(bool), hashlib.sha256(b"").hexdigest()
+
+    ids = [root_id]
+    parents = [-1]
+    depths = [0]
+    index = 0
+    while index < len(ids):
+        for child in children[ids[index]]:
+            ids.append(child)
+            parents.append(index)
+            depths.append(depths[index] + 1)
+        index += 1
+    central = [nodes_by_id[node_id].type == "central" for node_id in ids]
+
+    # Everything the layout depends on: IDs, tree shape and node sizes (labels do not matter)
+    digest = hashlib.sha256()
+    digest.update("\x1e".join(ids).encode("utf-8"))
+    digest.update(np.asarray(parents, dtype=np.int64).tobytes())
+    digest.update(np.packbits(np.asarray(central, dtype=bool)).tobytes())
+    return (
+        ids,
+        np.asarray(parents, dtype=np.int64),
+        np.asarray(depths, dtype=np.int64),
+        np.asarray(central, dtype=bool),
+        digest.hexdigest(),
+    )
+
+
+# ============================================
+# Layout
+# ============================================
+
+def compute_layout(spec: PlannerSpec) -> TreeLayout:
+    """
+    Tidy-tree layout, depth along x and siblings along y.
+
+    Every subtree gets its own horizontal band (tall enough for the node
+    and for its children's bands stacked with NODE_SPACING between them);
+    a node sits centred in its band, so parents are centred on their
+    children and subtrees never overlap. Bands are packed from y = 0 down,
+    which keeps layouts stable: growing one subtree only shifts the bands
+    below it and re-centres its ancestors.
+
+    Both passes run level by level over contiguous NumPy slices (bottom-up
+    band sizes, then top-down offsets), so the whole layout is O(n).
+    """
+    return _compute(*_flatten(spec))
+
+
+def _compute(
+    ids: List[str],
+    parents: np.ndarray,
+    depths: np.ndarray,
+    central: np.ndarray,
+    topology_hash: str
+) -> TreeLayout:
+    n = len(ids)
+    if n == 0:
+        return TreeLayout(topology_hash, {}, 0.0, 0.0)
+
+    widths = np.where(central, CENTRAL_NODE_WIDTH, NODE_WIDTH)
+    heights = np.where(central, CENTRAL_NODE_HEIGHT, NODE_HEIGHT).astype(np.float64)
+    # Level boundaries in BFS order: level d is [starts[d], starts[d + 1])
+    starts = np.searchsorted(depths, np.arange(int(depths[-1]) + 2))
+    levels = len(starts) - 1
+
+    # Bottom-up: height of each node's children block, then of its band
+    block = np.zeros(n)
+    band = heights.copy()
+    for level in range(levels - 1, -1, -1):
+        lo, hi = starts[level], starts[level + 1]
+        # Drop the spacing counted after each node's last child
+        block[lo:hi] = np.maximum(block[lo:hi] - NODE_SPACING, 0)
+        band[lo:hi] = np.maximum(heights[lo:hi], block[lo:hi])
+        if level > 0:
+            parent_lo = starts[level - 1]
+            block[parent_lo:lo] += np.bincount(
+                parents[lo:hi] - parent_lo, weights=band[lo:hi] + NODE_SPACING, minlength=lo - parent_lo
+            )
+
+    # Top-down: each sibling group is stacked inside the centred children block of its parent
+    band_top = np.zeros(n)
+    for level in range(1, levels):
+        lo, hi = starts[level], starts[level + 1]
+        level_parents = parents[lo:hi]
+        step = band[lo:hi] + NODE_SPACING
+        before = np.cumsum(step) - step
+        # Offset of each node's first sibling, broadcast over the group
+        group_start = np.r_[True, level_parents[1:] != level_parents[:-1]]
+        first = np.maximum.accumulate(np.where(group_start, np.arange(hi - lo), 0))
+        within = before - before[first]
+        block_top = band_top[level_parents] + (band[level_parents] - block[level_parents]) / 2
+        band_top[lo:hi] = block_top + within
+
+    y = band_top + (band - heights) / 2
+    level_widths = np.zeros(levels)
+    np.maximum.at(level_widths, depths, widths)
+    level_x = np.r_[0.0, np.cumsum(level_widths + LAYER_SPACING)[:-1]]
+    x = level_x[depths]
+
+    boxes = {
+        node_id: (float(x_i), float(y_i), int(w_i), int(h_i))
+        for node_id, x_i, y_i, w_i, h_i in zip(ids, x.tolist(), y.tolist(), widths.tolist(), heights.tolist())
+    }
+    width = float(level_x[-1] + level_widths[-1])
+    return TreeLayout(topology_hash, boxes, width, float(band[0]))
+
+
+# ============================================
+# Layout Cache
+# ============================================
+
+class LayoutCache:
+    """In-process LRU of layouts keyed by topology hash."""
+
+    def __init__(self, max_size: int = LAYOUT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, TreeLayout]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, topology_hash: str) -> Optional[TreeLayout]:
+        with self._lock:
+            layout = self._entries.get(topology_hash)
+            if layout is None:
+                return None
+            self._entries.move_to_end(topology_hash)
+            return layout
+
+    def put(self, layout: TreeLayout) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[layout.topology_hash] = layout
+            self._entries.move_to_end(layout.topology_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def layout(self, spec: PlannerSpec) -> Tuple[TreeLayout, bool]:
+        """
+        Layout for `spec`, from the cache when its tree was laid out before.
+
+        Returns:
+            (layout, whether it came from the cache)
+        """
+        flat = _flatten(spec)
+        cached = self.get(flat[-1])
+        if cached is not None:
+            self.hits += 1
+            return cached, True
+        self.misses += 1
+        layout = _compute(*flat)
+        self.put(layout)
+        return layout, False
+
+
+def changed_boxes(base: TreeLayout, layout: TreeLayout) -> Tuple[Dict[str, Box], List[str]]:
+    """
+    What a client holding `base` must apply to get `layout`.
+
+    Returns:
+        (boxes of new and moved nodes, IDs of nodes that are gone)
+    """
+    changed = {
+        node_id: box for node_id, box in layout.boxes.items()
+        if base.boxes.get(node_id) != box
+    }
+    removed = [node_id for node_id in base.boxes if node_id not in layout.boxes]
+    return changed, removed
+
+
+_layout_cache: Optional[LayoutCache] = None
+
+
+def get_layout_cache() -> LayoutCache:
+    global _layout_cache
+    if _layout_cache is None:
+        _layout_cache = LayoutCache()
+    return _layout_cache
@@ -0,0 +1,257 @@
+"""Deterministic PlannerSpec → Mermaid compiler (replaces the Builder LLM round trip)."""
+import re
+from collections import deque
+from typing import Dict, List, Optional
+
+from .graph import SpecGraph
+from .models import PlannerSpec, NodeSpec
+
+
+INDENT = "  "
+
+# Characters Mermaid mindmap reads as node-shape delimiters. They are swapped for
+# their full-width look-alikes so labels like "Machine Learning (ML)" render as-is
+# instead of being parsed as a rounded node.
+_MINDMAP_TRANSLATION = str.maketrans({
+    "(": "（",
+    ")": "）",
+    "[": "［",
+    "]": "］",
+    "{": "｛",
+    "}": "｝",
+})
+
+# Flowchart labels are quoted, so only quote-breaking characters need entity codes
+_FLOWCHART_ENTITIES = {
+    "#": "#35;",
+    '"': "#quot;",
+    "<": "#lt;",
+    ">": "#gt;",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_ID_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_]")
+
+_EDGE_ARROWS = {
+    "solid": "-->",
+    "dashed": "-.->",
+    "dotted": "-.->",
+}
+
+
+# ============================================
+# Label / ID Escaping
+# ============================================
+
+def _normalize_label(label: Optional[str]) -> str:
+    """Collapse whitespace and newlines into single spaces."""
+    return _WHITESPACE_RE.sub(" ", label or "").strip()
+
+
+def escape_mindmap_label(label: Optional[str]) -> str:
+    """Escape a label so it is read as plain text inside a mindmap."""
+    text = _normalize_label(label).translate(_MINDMAP_TRANSLATION)
+    # Leading "::" starts an icon/class directive and "%%" starts a comment
+    if text.startswith("::"):
+        text = "\u200b" + text
+    text = text.replace("%%", "% %")
+    return text or "Untitled"
+
+
+def escape_flowchart_label(label: Optional[str]) -> str:
+    """Escape a label for use inside a quoted flowchart node or edge label."""
+    text = _normalize_label(label)
+    text = "".join(_FLOWCHART_ENTITIES.get(ch, ch) for ch in text)
+    return text.replace("|", "#124;")
+
+
+def _flowchart_ids(nodes: List[NodeSpec]) -> Dict[str, str]:
+    """Map spec node IDs to unique Mermaid-safe identifiers."""
+    ids: Dict[str, str] = {}
+    used = set()
+    for index, node in enumerate(nodes):
+        if node.id in ids:
+            continue
+        base = _ID_UNSAFE_RE.sub("_", node.id) or f"node_{index}"
+        if base[0].isdigit():
+            base = f"n_{base}"
+        # "end" is a reserved keyword in flowchart syntax
+        if base.lower() == "end":
+            base = f"{base}_"
+        candidate = base
+        suffix = 1
+        while candidate in used:
+            suffix += 1
+            candidate = f"{base}_{suffix}"
+        used.add(candidate)
+        ids[node.id] = candidate
+    return ids
+
+
+# ============================================
+# Tree Extraction
+# ============================================
+
+def find_root_id(spec: PlannerSpec) -> Optional[str]:
+    """
+    Pick the root node of a spec.
+
+    Preference order: a node typed 'central', a node whose label matches the
+    central topic, the first node with no incoming edges, the first node.
+    """
+    return SpecGraph(spec).root_id
+
+
+def build_tree(spec: PlannerSpec, graph: Optional[SpecGraph] = None) -> tuple:
+    """
+    Derive a spanning tree from the spec's hierarchy (cross-links are not followed).
+
+    Edges are followed in their stated direction first, then reversed edges
+    are used to attach anything left over. Each node is placed once (BFS
+    order, first parent wins), which breaks cycles. Nodes that are not
+    connected to the root at all are attached directly to it.
+
+    Args:
+        spec: The structured mind map specification
+        graph: An already-built index of `spec`, to avoid building it twice
+
+    Returns:
+        (root_id, children, nodes_by_id) where children maps node ID to an
+        ordered list of child IDs
+    """
+    graph = graph or SpecGraph(spec)
+    nodes_by_id = graph.nodes_by_id
+    root_id = graph.root_id
+    children: Dict[str, List[str]] = {node.id: [] for node in graph.nodes}
+    if root_id is None:
+        return None, children, nodes_by_id
+
+    forward = graph.forward
+    backward = graph.backward
+
+    visited = {root_id}
+    order = [root_id]
+    queue = deque([root_id])
+    while queue:
+        current = queue.popleft()
+        for neighbour in forward[current]:
+            if neighbour not in visited:
+                visited.add(neighbour)
+                children[current].append(neighbour)
+                order.append(neighbour)
+                queue.append(neighbour)
+
+    # Second sweep follows reversed edges so nodes the model wired backwards
+    # still hang off the node they are connected to
+    queue = deque(order)
+    while queue:
+        current = queue.popleft()
+        for neighbour in forward[current] + backward[current]:
+            if neighbour not in visited:
+                visited.add(neighbour)
+                children[current].append(neighbour)
+                queue.append(neighbour)
+
+    # Orphans hang off the root, preserving their own subtrees where possible
+    for node in graph.nodes:
+        if node.id in visited:
+            continue
+        visited.add(node.id)
+        children[root_id].append(node.id)
+        queue.append(node.id)
+        while queue:
+            current = queue.popleft()
+            for neighbour in forward[current]:
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    children[current].append(neighbour)
+                    queue.append(neighbour)
+
+    return root_id, children, nodes_by_id
+
+
+# ============================================
+# Compilers
+# ============================================
+
+def compile_mindmap(spec: PlannerSpec) -> str:
+    """
+    Compile a PlannerSpec into Mermaid mindmap syntax.
+
+    Args:
+        spec: The structured mind map specification
+
+    Returns:
+        Mermaid mindmap syntax starting with "mindmap"
+    """
+    root_id, children, nodes_by_id = build_tree(spec)
+    if root_id is None:
+        return f"mindmap\n{INDENT}root(({escape_mindmap_label(spec.central_topic or spec.title)}))"
+
+    lines = ["mindmap"]
+    lines.append(f"{INDENT}root(({escape_mindmap_label(nodes_by_id[root_id].label)}))")
+
+    # Iterative DFS keeps deep maps clear of the recursion limit
+    stack = [(child, 2) for child in reversed(children[root_id])]
+    while stack:
+        node_id, depth = stack.pop()
+        lines.append(f"{INDENT * depth}{escape_mindmap_label(nodes_by_id[node_id].label)}")
+        stack.extend((child, depth + 1) for child in reversed(children[node_id]))
+
+    return "\n".join(lines)
+
+
+def compile_flowchart(spec: PlannerSpec, direction: str = "LR") -> str:
+    """
+    Compile a PlannerSpec into Mermaid flowchart syntax.
+
+    Unlike the mindmap output, every valid edge is kept (including
+    cross-links and cycles, which flowcharts render fine). Edges pointing at
+    unknown nodes and self-loops are dropped; orphan nodes are still declared.
+
+    Args:
+        spec: The structured mind map specification
+        direction: Flowchart direction ('LR', 'RL', 'TD', 'BT')
+
+    Returns:
+        Mermaid flowchart syntax starting with "flowchart"
+    """
+    graph = SpecGraph(spec)
+    ids = _flowchart_ids(graph.nodes)
+    root_id = graph.root_id
+
+    lines = [f"flowchart {direction}"]
+    for node in graph.nodes:
+        label = escape_flowchart_label(node.label) or "Untitled"
+        if node.id == root_id:
+            lines.append(f'{INDENT}{ids[node.id]}(("{label}"))')
+        else:
+            lines.append(f'{INDENT}{ids[node.id]}["{label}"]')
+
+    for edge in graph.edges:
+        arrow = _EDGE_ARROWS.get(edge.style, "-->")
+        label = escape_flowchart_label(edge.label)
+        if label:
+            lines.append(f'{INDENT}{ids[edge.source]} {arrow}|"{label}"| {ids[edge.target]}')
+        else:
+            lines.append(f"{INDENT}{ids[edge.source]} {arrow} {ids[edge.target]}")
+
+    return "\n".join(lines)
+
+
+def compile_mermaid(spec: PlannerSpec, diagram_type: str = "mindmap") -> str:
+    """
+    Compile a PlannerSpec into Mermaid syntax without an LLM call.
+
+    Args:
+        spec: The structured mind map specification
+        diagram_type: 'mindmap' or 'flowchart'
+
+    Returns:
+        Mermaid.js syntax string
+    """
+    if diagram_type == "mindmap":
+        return compile_mindmap(spec)
+    if diagram_type == "flowchart":
+        return compile_flowchart(spec)
+    raise ValueError(f"Unsupported diagram type: {diagram_type}")
@@ -0,0 +1,72 @@
+"""Chat message layout for agent calls: static, cacheable blocks first, per-request content last."""
+from typing import Any, Dict, List, Optional, Union
+
+from .config import PROMPT_CACHE_HINTS, PROMPT_CACHE_HINT_PROVIDERS
+
+
+# Sent with every completion
+EXTRA_HEADERS = {
+    "HTTP-Referer": "https://anymaps.app",
+    "X-Title": "AnyMaps"
+}
+
+Content = Union[str, List[Dict[str, Any]]]
+
+
+def wants_cache_hints(model: str) -> bool:
+    """
+    Whether `model` needs explicit cache_control breakpoints to cache a prompt prefix.
+
+    OpenRouter passes the hints through to Anthropic and Gemini, which only
+    cache marked prefixes; OpenAI, DeepSeek and others cache any long enough
+    prefix on their own, so their requests are left as plain text.
+    """
+    return PROMPT_CACHE_HINTS and model.split("/", 1)[0] in PROMPT_CACHE_HINT_PROVIDERS
+
+
+def text_block(text: str, model: str, cache: bool = False) -> Dict[str, Any]:
+    """A text content part, marked as the end of a cacheable prefix when `cache` is set and the model needs it."""
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cache and wants_cache_hints(model):
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+
+def _content(blocks: List[Dict[str, Any]]) -> Content:
+    # Without hints or images, the blocks go out as one plain string
+    if all(block["type"] == "text" and "cache_control" not in block for block in blocks):
+        return "\n\n".join(block["text"] for block in blocks)
+    return blocks
+
+
+def build_messages(
+    model: str,
+    system: str,
+    user: Union[str, List[Dict[str, Any]]],
+    cached_context: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Messages for one completion, laid out so providers can reuse the prefix.
+
+    Providers cache prompts by exact prefix, so anything that varies per
+    request must come after everything that does not: the system prompt is
+    static text only, followed by an optional per-resource block that repeats
+    across requests (e.g. the map being enhanced), then the request itself.
+
+    Args:
+        model: Model the messages are sent to (decides whether cache hints are added)
+        system: Static system prompt (no per-request fields)
+        user: Per-request user content, text or content parts (e.g. an image)
+        cached_context: Content repeated across requests for one resource; opens the user message
+            and is marked as a second cache breakpoint
+
+    Returns:
+        The `messages` list for chat.completions.create()
+    """
+    user_blocks = [text_block(user, model)] if isinstance(user, str) else list(user)
+    if cached_context is not None:
+        user_blocks.insert(0, text_block(cached_context, model, cache=True))
+    return [
+        {"role": "system", "content": _content([text_block(system, model, cache=True)])},
+        {"role": "user", "content": _content(user_blocks)},
+    ]
@@ -0,0 +1,329 @@
+"""In-process metrics: stage timings, token accounting, Prometheus text export and Server-Timing."""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Iterable[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============================================
+# Metric Types
+# ============================================
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: observe() is one bisect and a few increments
+    under a lock; cumulative bucket counts are only built on export.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        # Per label set: [count per bucket (last is +Inf)..., sum, count]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+def family(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict[str, Any], float]]) -> str:
+    """Prometheus text for a metric whose values are read at scrape time (e.g. from stats())."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_labels(tuple(labels), labels.values())} {_number(value)}")
+    return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        blocks = []
+        for metric in self.metrics:
+            lines = [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+            lines.extend(metric.samples())
+            blocks.append("\n".join(lines))
+        return "\n".join(blocks)
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "anymaps_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)
+))
+stage_errors = registry.register(Counter(
+    "anymaps_stage_errors_total", "Exceptions raised out of a pipeline stage.", ("stage", "error")
+))
+http_seconds = registry.register(Histogram(
+    "anymaps_http_request_duration_seconds", "HTTP request latency until the response completes.",
+    ("method", "route", "status")
+))
+llm_tokens = registry.register(Counter(
+    "anymaps_llm_tokens_total", "Tokens reported by the provider per model (prompt, completion, cached, cache_write).", ("model", "type")
+))
+llm_prompt_cache = registry.register(Counter(
+    "anymaps_llm_prompt_cache_calls_total", "Model calls whose prompt prefix was (hit) or was not (miss) served from the provider cache.",
+    ("model", "kind", "outcome")
+))
+llm_calls = registry.register(Counter(
+    "anymaps_llm_calls_total", "Model calls by outcome (ok, error, timeout, cancelled by a faster hedge).", ("model", "outcome")
+))
+llm_retries = registry.register(Counter(
+    "anymaps_llm_retries_total", "Extra model calls per model (hedge, failover).", ("model", "reason")
+))
+loop_lag_seconds = registry.register(Histogram(
+    "anymaps_event_loop_lag_seconds", "How late the event loop ran a periodic timer.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+
+
+# ============================================
+# Stage Timing
+# ============================================
+
+# Stage durations (ms) of the current request, reported in Server-Timing
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+
+class stage:
+    """
+    Time a pipeline stage, as a context manager or a decorator (sync or async).
+
+        with stage("parse"):
+            ...
+
+        @stage("planner")
+        async def run_planner_agent(...):
+            ...
+
+    Durations go to the stage histogram and the current request's
+    Server-Timing header; exceptions are counted per stage and re-raised.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._started: List[float] = []
+
+    def __enter__(self) -> "stage":
+        self._started.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        record_stage(self.name, time.perf_counter() - self._started.pop())
+        # Cancellation (BaseException) is not an error of the stage
+        if exc_type is not None and issubclass(exc_type, Exception):
+            stage_errors.inc(self.name, exc_type.__name__)
+
+    def __call__(self, fn: Callable) -> Callable:
+        name = self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+# ============================================
+# Token Accounting
+# ============================================
+
+def _field(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def record_usage(model: str, usage: Any, kind: str = "") -> None:
+    """
+    Count prompt/completion tokens from a completion's `usage` (ignored when absent).
+
+    Prompt tokens served from the provider's prefix cache
+    (usage.prompt_tokens_details.cached_tokens on OpenRouter) are counted as
+    'cached', and tokens written to it as 'cache_write'; each call is counted
+    as a prompt-cache hit or miss under its agent `kind`.
+    """
+    if usage is None:
+        return
+    prompt = _field(usage, "prompt_tokens") or 0
+    completion = _field(usage, "completion_tokens") or 0
+    details = _field(usage, "prompt_tokens_details")
+    cached = (_field(details, "cached_tokens") or 0) if details is not None else 0
+    written = (_field(details, "cache_write_tokens") or 0) if details is not None else 0
+    if prompt:
+        llm_tokens.inc(model, "prompt", amount=prompt)
+        llm_prompt_cache.inc(model, kind, "hit" if cached else "miss")
+    if completion:
+        llm_tokens.inc(model, "completion", amount=completion)
+    if cached:
+        llm_tokens.inc(model, "cached", amount=cached)
+    if written:
+        llm_tokens.inc(model, "cache_write", amount=written)
+
+
+# ============================================
+# Process Health
+# ============================================
+
+async def monitor_event_loop(interval: float = 0.05) -> None:
+    """Record event-loop lag forever: how much later than `interval` each sleep wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, loop.time() - started - interval))
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current RSS of this process (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# ============================================
+# ASGI Middleware
+# ============================================
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and adds a Server-Timing header listing the
+    stages that ran before the response started (plus `total`).
+
+    Implemented as plain ASGI rather than BaseHTTPMiddleware so streaming
+    responses are passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                entries = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+                entries.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            http_seconds.observe(time.perf_counter() - started, scope["method"], path, str(status))
@@ -0,0 +1,364 @@
+"""Adaptive routing of planner/enhance calls across model tiers by request complexity and live model health."""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, TypeVar
+
+from .config import (
+    PLANNER_MODEL,
+    PLANNER_FALLBACK_MODEL,
+    PLANNER_MODEL_TIERS,
+    ROUTER_MODE,
+    ROUTER_THRESHOLDS,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_LATENCY_BUDGET_SECONDS,
+    ROUTER_PROBE_RATE,
+    ROUTER_SHADOW_SAMPLE_RATE,
+    ROUTER_SHADOW_LOG_PATH,
+)
+from .executor import executor
+from .metrics import registry, Counter
+from .models import PlannerSpec, SpecPatch
+
+
+T = TypeVar("T")
+
+# Capitalized names/phrases and numbers: a cheap stand-in for named entities
+_ENTITY = re.compile(r"\b(?:[A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)*|\d[\d.,:%]*)")
+# Bullet or numbered list lines (syllabi, outlines pasted into the prompt)
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+", re.MULTILINE)
+
+# Share of the complexity score each signal can contribute (sums to 1)
+LENGTH_WEIGHT = 0.35
+ENTITY_WEIGHT = 0.25
+SIZE_WEIGHT = 0.25
+MODE_WEIGHT = 0.15
+# Value of each signal at which it contributes ~63% of its weight
+LENGTH_SCALE_WORDS = 150
+ENTITY_SCALE = 12
+SIZE_SCALE_NODES = 60
+# How demanding each enhance mode is relative to the others ('focus' rewrites a branch in depth)
+ENHANCE_MODE_DEMAND = {"focus": 1.0, "expand": 0.6, "refine": 0.4, "simplify": 0.2}
+# Default tier boundaries run evenly from the first to the last of these scores. Real
+# requests rarely score above ~0.6, and a one-line topic stays under 0.05, so the
+# first cut sends anything beyond a one-liner or a small edit to a stronger tier
+DEFAULT_FIRST_THRESHOLD = 0.1
+DEFAULT_LAST_THRESHOLD = 0.25
+
+router_decisions = registry.register(Counter(
+    "anymaps_router_decisions_total", "Routed model calls by kind, routed tier and served model.",
+    ("kind", "routed", "served")
+))
+
+
+class RouteFeatures:
+    """The cheap, local signals a request is scored on."""
+
+    __slots__ = ("kind", "words", "entities", "map_nodes", "enhance_mode", "has_image")
+
+    def __init__(
+        self,
+        kind: str,
+        words: int,
+        entities: int,
+        map_nodes: int = 0,
+        enhance_mode: Optional[str] = None,
+        has_image: bool = False
+    ):
+        self.kind = kind
+        self.words = words
+        self.entities = entities
+        self.map_nodes = map_nodes
+        self.enhance_mode = enhance_mode
+        self.has_image = has_image
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def request_features(
+    kind: str,
+    prompt: str,
+    image_description: Optional[str] = None,
+    current_spec: Optional[PlannerSpec] = None,
+    enhance_mode: Optional[str] = None,
+    target_nodes: Optional[int] = None
+) -> RouteFeatures:
+    """
+    Extract routing features from a request in a single pass over the prompt.
+
+    Args:
+        kind: Call kind ('planner', 'fanout_outline', 'fanout_branch', 'enhance', 'enhance_patch')
+        prompt: The user's prompt (plus any brief built around it)
+        image_description: Vision output folded into the prompt, if any
+        current_spec: Map being enhanced; its size counts towards the score
+        enhance_mode: 'expand', 'refine', 'focus' or 'simplify'
+        target_nodes: Requested node count for new maps
+    """
+    text = f"{prompt}\n{image_description}" if image_description else prompt
+    entities = set(_ENTITY.findall(text))
+    return RouteFeatures(
+        kind=kind,
+        words=len(text.split()),
+        entities=len(entities) + len(_LIST_ITEM.findall(text)),
+        map_nodes=len(current_spec.nodes) if current_spec is not None else (target_nodes or 0),
+        enhance_mode=enhance_mode,
+        has_image=bool(image_description),
+    )
+
+
+def complexity_score(features: RouteFeatures) -> float:
+    """
+    Score how demanding a request is, from 0 (trivial) towards 1.
+
+    Each signal saturates (1 - e^(-x/scale)), so a long prompt alone cannot
+    push a request to the top tier; it takes length, detail and map size together.
+    """
+    def saturate(value: float, scale: float) -> float:
+        return 1.0 - math.exp(-max(0.0, value) / scale)
+
+    demand = ENHANCE_MODE_DEMAND.get(features.enhance_mode, 0.5) if features.enhance_mode else 0.0
+    if features.has_image:
+        demand = max(demand, 1.0)
+    return (
+        LENGTH_WEIGHT * saturate(features.words, LENGTH_SCALE_WORDS)
+        + ENTITY_WEIGHT * saturate(features.entities, ENTITY_SCALE)
+        + SIZE_WEIGHT * saturate(features.map_nodes, SIZE_SCALE_NODES)
+        + MODE_WEIGHT * demand
+    )
+
+
+def default_thresholds(tiers: int) -> List[float]:
+    """Tier boundaries when ROUTER_THRESHOLDS is unset (one fewer than tiers)."""
+    if tiers < 2:
+        return []
+    if tiers == 2:
+        return [DEFAULT_FIRST_THRESHOLD]
+    step = (DEFAULT_LAST_THRESHOLD - DEFAULT_FIRST_THRESHOLD) / (tiers - 2)
+    return [round(DEFAULT_FIRST_THRESHOLD + i * step, 4) for i in range(tiers - 1)]
+
+
+class RouteDecision:
+    """Which tier a request was routed to, why, and which model actually serves it."""
+
+    __slots__ = ("features", "score", "tier", "model", "reason", "served_model", "fallback_model")
+
+    def __init__(
+        self,
+        features: RouteFeatures,
+        score: float,
+        tier: int,
+        model: str,
+        reason: str,
+        served_model: str,
+        fallback_model: Optional[str]
+    ):
+        self.features = features
+        self.score = score
+        self.tier = tier
+        self.model = model
+        self.reason = reason
+        self.served_model = served_model
+        self.fallback_model = fallback_model
+
+
+# ============================================
+# Router
+# ============================================
+
+class ModelRouter:
+    """
+    Choose a model tier per call from its complexity score and each tier's health.
+
+    The score picks the cheapest tier whose threshold it falls under. Requests
+    are only ever moved *up* from there: past tiers whose recent error rate
+    (EWMA, from the executor) exceeds ROUTER_MAX_ERROR_RATE, and past tiers
+    averaging slower than ROUTER_LATENCY_BUDGET_SECONDS when a stronger tier
+    is faster. A call that fails on a cheap tier fails over to the next tier up.
+    Both signals fade while a tier gets no calls, and a small share of
+    upgraded requests (ROUTER_PROBE_RATE) stays on its complexity tier as a
+    probe, so a tier that recovers is noticed.
+
+    In 'shadow' mode every request is still served by PLANNER_MODEL; a sample
+    is re-run in the background on the tier routing would have chosen and the
+    two outcomes are logged side by side, so thresholds can be tuned on real
+    traffic before switching to 'on'.
+    """
+
+    def __init__(
+        self,
+        tiers: List[str] = PLANNER_MODEL_TIERS,
+        mode: str = ROUTER_MODE,
+        thresholds: List[float] = ROUTER_THRESHOLDS,
+        shadow_sample_rate: float = ROUTER_SHADOW_SAMPLE_RATE,
+        shadow_log_path: str = ROUTER_SHADOW_LOG_PATH,
+        probe_rate: float = ROUTER_PROBE_RATE
+    ):
+        self.tiers = list(tiers)
+        self.mode = mode if len(self.tiers) > 1 else "off"
+        self.thresholds = list(thresholds) or default_thresholds(len(self.tiers))
+        self.shadow_sample_rate = shadow_sample_rate
+        self.shadow_log_path = shadow_log_path
+        self.probe_rate = probe_rate
+        self.decisions: Dict[str, int] = {}
+        self.upgrades = 0
+        self.probes = 0
+        self.shadow_runs = 0
+        self.shadow_errors = 0
+        self.shadow_faster = 0
+        self._latency_ratio_total = 0.0
+        self._size_ratio_total = 0.0
+        self._size_ratios = 0
+        self._shadows: Set["asyncio.Task"] = set()
+
+    def _healthy(self, model: str) -> bool:
+        return executor.tracker(model).error_rate() <= ROUTER_MAX_ERROR_RATE
+
+    def _latency(self, model: str) -> Optional[float]:
+        return executor.tracker(model).latency()
+
+    def choose(self, features: RouteFeatures) -> RouteDecision:
+        """Route one call (also when mode is 'off', for the stats and the shadow log)."""
+        if len(self.tiers) < 2:
+            return RouteDecision(features, 0.0, 0, PLANNER_MODEL, "fixed", PLANNER_MODEL, PLANNER_FALLBACK_MODEL)
+
+        score = complexity_score(features)
+        base = sum(1 for threshold in self.thresholds if score >= threshold)
+        tier, reason = base, "complexity"
+        # Skip failing tiers; when every tier from base up is failing, stay on the strongest
+        while tier < len(self.tiers) - 1 and not self._healthy(self.tiers[tier]):
+            tier, reason = tier + 1, "errors"
+        latency = self._latency(self.tiers[tier])
+        if ROUTER_LATENCY_BUDGET_SECONDS > 0 and latency is not None and latency > ROUTER_LATENCY_BUDGET_SECONDS:
+            for faster in range(tier + 1, len(self.tiers)):
+                other = self._latency(self.tiers[faster])
+                if self._healthy(self.tiers[faster]) and other is not None and other < latency:
+                    tier, reason = faster, "latency"
+                    break
+        if tier != base and random.random() < self.probe_rate:
+            tier, reason = base, "probe"
+
+        model = self.tiers[tier]
+        if self.mode != "on":
+            return RouteDecision(features, score, tier, model, reason, PLANNER_MODEL, PLANNER_FALLBACK_MODEL)
+        # Without a configured fallback, hedges and failovers go one tier up
+        fallback = PLANNER_FALLBACK_MODEL or (self.tiers[tier + 1] if tier + 1 < len(self.tiers) else None)
+        return RouteDecision(features, score, tier, model, reason, model, fallback)
+
+    def route(self, features: RouteFeatures, decision: Optional[RouteDecision] = None) -> RouteDecision:
+        """Route one call and count the decision; `decision` records one already made by choose()."""
+        decision = decision or self.choose(features)
+        if decision.reason in ("errors", "latency"):
+            self.upgrades += 1
+        elif decision.reason == "probe":
+            self.probes += 1
+        self.decisions[decision.model] = self.decisions.get(decision.model, 0) + 1
+        router_decisions.inc(features.kind, decision.model, decision.served_model)
+        return decision
+
+    async def run(
+        self,
+        features: RouteFeatures,
+        call: Callable[[str], Awaitable[T]],
+        decision: Optional[RouteDecision] = None
+    ) -> T:
+        """
+        Route a call and run it through the executor (hedging, failover, deadline).
+
+        Args:
+            features: The request's routing features (request_features())
+            call: As for executor.run(): performs *and validates* the completion for a model
+            decision: A choose() result the caller already keyed its cache on, to run as is
+
+        Returns:
+            The first valid result
+        """
+        decision = self.route(features, decision)
+        started = time.perf_counter()
+        result = await executor.run(decision.served_model, decision.fallback_model, call)
+        elapsed = time.perf_counter() - started
+        if (
+            self.mode == "shadow"
+            and decision.model != decision.served_model
+            and random.random() < self.shadow_sample_rate
+        ):
+            task = asyncio.ensure_future(self._shadow(decision, call, result, elapsed))
+            self._shadows.add(task)
+            task.add_done_callback(self._shadows.discard)
+        return result
+
+    # Shadow evaluation
+
+    async def _shadow(self, decision: RouteDecision, call: Callable[[str], Awaitable[Any]], served: Any, served_seconds: float) -> None:
+        """Re-run a served call on the routed tier and record how the two compare."""
+        record: Dict[str, Any] = {
+            "ts": time.time(),
+            "kind": decision.features.kind,
+            "score": round(decision.score, 4),
+            "features": decision.features.as_dict(),
+            "reason": decision.reason,
+            "served": {"model": decision.served_model, "seconds": round(served_seconds, 3), "size": _result_size(served)},
+        }
+        started = time.perf_counter()
+        try:
+            # No fallback: the point is to see how this tier does on its own
+            result = await executor.run(decision.model, None, call)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.shadow_runs += 1
+            self.shadow_errors += 1
+            record["shadow"] = {"model": decision.model, "error": f"{type(e).__name__}: {e}"[:300]}
+        else:
+            seconds = time.perf_counter() - started
+            size = _result_size(result)
+            self.shadow_runs += 1
+            self.shadow_faster += seconds < served_seconds
+            self._latency_ratio_total += seconds / served_seconds if served_seconds > 0 else 1.0
+            if size is not None and record["served"]["size"]:
+                self._size_ratio_total += size / record["served"]["size"]
+                self._size_ratios += 1
+            record["shadow"] = {"model": decision.model, "seconds": round(seconds, 3), "size": size}
+        if self.shadow_log_path:
+            await asyncio.get_running_loop().run_in_executor(None, self._append_log, record)
+
+    def _append_log(self, record: Dict[str, Any]) -> None:
+        with open(self.shadow_log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        succeeded = self.shadow_runs - self.shadow_errors
+        return {
+            "mode": self.mode,
+            "tiers": self.tiers,
+            "thresholds": self.thresholds,
+            "decisions": dict(self.decisions),
+            "upgrades": self.upgrades,
+            "probes": self.probes,
+            "shadow_runs": self.shadow_runs,
+            "shadow_errors": self.shadow_errors,
+            "shadow_faster": self.shadow_faster,
+            # Routed tier vs served model, averaged over successful shadow runs
+            "shadow_latency_ratio": round(self._latency_ratio_total / succeeded, 4) if succeeded else None,
+            "shadow_size_ratio": round(self._size_ratio_total / self._size_ratios, 4) if self._size_ratios else None,
+        }
+
+
+def _result_size(result: Any) -> Optional[int]:
+    """Nodes (specs, outlines, expansions) or operations (patches) in a call's result, for comparing tiers."""
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, PlannerSpec):
+        return len(result.nodes)
+    if isinstance(result, SpecPatch):
+        return len(result.operations)
+    if isinstance(result, dict):
+        items = result.get("nodes") or result.get("branches")
+        return len(items) if isinstance(items, list) else None
+    return None
+
+
+model_router = ModelRouter()
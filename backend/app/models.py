@@ -1,5 +1,5 @@
 """Pydantic models for request/response validation."""
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 
 
@@ -33,6 +33,29 @@ class PlannerSpec(BaseModel):
     summary: Optional[str] = Field(None, description="Brief summary of the map")
 
 
+# ============================================
+# Enhance Patch Models
+# ============================================
+
+class SpecOperation(BaseModel):
+    """A single edit applied to a PlannerSpec by the patch-based enhance protocol."""
+    op: str = Field(..., description="'add_node', 'update_node', 'remove_node', 'add_edge' or 'remove_edge'")
+    node: Optional[NodeSpec] = Field(None, description="Full node for add_node")
+    id: Optional[str] = Field(None, description="Target node ID for update_node / remove_node")
+    changes: Optional[Dict[str, Any]] = Field(None, description="Fields to overwrite for update_node")
+    source: Optional[str] = Field(None, description="Edge source for add_edge / remove_edge")
+    target: Optional[str] = Field(None, description="Edge target for add_edge / remove_edge")
+    label: Optional[str] = Field(None, description="Edge label for add_edge")
+    style: Optional[str] = Field(None, description="Edge style for add_edge")
+
+
+class SpecPatch(BaseModel):
+    """Output of the Enhance Agent in patch mode."""
+    operations: List[SpecOperation] = Field(default_factory=list, description="Edits in application order")
+    title: Optional[str] = Field(None, description="New title, if it changed")
+    summary: Optional[str] = Field(None, description="Updated summary, if it changed")
+
+
 # ============================================
 # API Request/Response Models
 # ============================================
@@ -41,6 +64,13 @@ class GeneratePlanRequest(BaseModel):
     """Request body for /generate/plan endpoint."""
     user_prompt: str = Field(..., description="User's input prompt")
     image_base64: Optional[str] = Field(None, description="Optional base64 encoded image")
+    generation_mode: Optional[str] = Field(
+        None,
+        description="'single' (one planner call) or 'fanout' (outline, then every branch expanded concurrently; for 100+ node maps). Defaults to 'single'"
+    )
+    target_nodes: Optional[int] = Field(
+        None, ge=10, le=300, description="Approximate node count in fanout mode. Defaults to FANOUT_TARGET_NODES"
+    )
 
 
 class GeneratePlanResponse(BaseModel):
@@ -53,6 +83,11 @@ class GeneratePlanResponse(BaseModel):
 class GenerateBuildRequest(BaseModel):
     """Request body for /generate/build endpoint."""
     planner_spec: PlannerSpec = Field(..., description="Planner specification to convert")
+    builder_mode: Optional[str] = Field(
+        None,
+        description="Builder mode: 'local' (in-process compiler) or 'llm' (Builder agent). Defaults to BUILDER_MODE"
+    )
+    diagram_type: str = Field("mindmap", description="Mermaid diagram type: 'mindmap' or 'flowchart'")
 
 
 class GenerateBuildResponse(BaseModel):
@@ -66,6 +101,18 @@ class GenerateFullRequest(BaseModel):
     """Request body for /generate/full endpoint (chains plan + build)."""
     user_prompt: str = Field(..., description="User's input prompt")
     image_base64: Optional[str] = Field(None, description="Optional base64 encoded image")
+    builder_mode: Optional[str] = Field(
+        None,
+        description="Builder mode: 'local' (in-process compiler) or 'llm' (Builder agent). Defaults to BUILDER_MODE"
+    )
+    diagram_type: str = Field("mindmap", description="Mermaid diagram type: 'mindmap' or 'flowchart'")
+    generation_mode: Optional[str] = Field(
+        None,
+        description="'single' (one planner call) or 'fanout' (outline, then every branch expanded concurrently; for 100+ node maps). Defaults to 'single'"
+    )
+    target_nodes: Optional[int] = Field(
+        None, ge=10, le=300, description="Approximate node count in fanout mode. Defaults to FANOUT_TARGET_NODES"
+    )
 
 
 class GenerateFullResponse(BaseModel):
@@ -76,12 +123,234 @@ class GenerateFullResponse(BaseModel):
     error: Optional[str] = None
 
 
+class BatchItem(BaseModel):
+    """One map to generate in a batch."""
+    id: Optional[str] = Field(None, description="Caller's reference, echoed back in the result")
+    user_prompt: str = Field(..., description="User's input prompt")
+    image_base64: Optional[str] = Field(None, description="Optional base64 encoded image")
+
+
+class GenerateBatchRequest(BaseModel):
+    """Request body for /generate/batch endpoint."""
+    items: List[BatchItem] = Field(..., min_length=1, max_length=500, description="Maps to generate")
+    concurrency: Optional[int] = Field(
+        None, ge=1, description="Pipelines run at once (capped by BATCH_MAX_CONCURRENCY)"
+    )
+    builder_mode: Optional[str] = Field(None, description="Builder mode: 'local' or 'llm'. Defaults to BUILDER_MODE")
+    diagram_type: str = Field("mindmap", description="Mermaid diagram type: 'mindmap' or 'flowchart'")
+
+
+class BatchItemResult(BaseModel):
+    """One NDJSON line of a /generate/batch response."""
+    type: str = "result"
+    index: int
+    id: Optional[str] = None
+    success: bool
+    planner_spec: Optional[PlannerSpec] = None
+    mermaid_syntax: Optional[str] = None
+    error: Optional[str] = None
+    duplicate_of: Optional[int] = None  # Index of the identical item whose result was reused
+
+
+class BatchSummary(BaseModel):
+    """Final NDJSON line of a /generate/batch response."""
+    type: str = "summary"
+    total: int
+    unique: int
+    succeeded: int
+    failed: int
+    elapsed_seconds: float
+
+
+# ============================================
+# Background Job Models
+# ============================================
+
+class JobResponse(BaseModel):
+    """State of a background job; `result` holds the matching endpoint's response body once it succeeds."""
+    job_id: str
+    kind: str = Field(..., description="'plan', 'full' or 'enhance'")
+    status: str = Field(..., description="'queued', 'running', 'succeeded' or 'failed'")
+    attempts: int = 0
+    max_attempts: int
+    deduplicated: bool = Field(False, description="An identical job was already queued or done and is returned instead")
+    created_at: float
+    updated_at: float
+    expires_at: Optional[float] = Field(None, description="When a finished job's result is discarded")
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+
+class JobStatsResponse(BaseModel):
+    """Job counts by status in the shared queue."""
+    queued: int = 0
+    running: int = 0
+    succeeded: int = 0
+    failed: int = 0
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
     version: str
 
 
+class CacheStatsResponse(BaseModel):
+    """Response cache counters for this worker."""
+    backend: str
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    sets: int
+    evictions: int
+    hit_rate: float
+
+
+class ModelLatencyStats(BaseModel):
+    """Rolling latency window for one upstream model."""
+    calls: int
+    errors: int
+    samples: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    ewma_latency: Optional[float] = Field(None, description="Exponentially weighted latency of recent successful calls (null once stale)")
+    ewma_error_rate: float = Field(0.0, description="Exponentially weighted share of recent calls that failed, faded by time since the last call")
+
+
+class ExecutorStatsResponse(BaseModel):
+    """Per-model latency percentiles and hedging counters for this worker."""
+    models: Dict[str, ModelLatencyStats]
+    hedges: int
+    hedge_wins: int
+    failovers: int
+    timeouts: int
+
+
+class RouterStatsResponse(BaseModel):
+    """Planner model routing decisions and shadow-evaluation results for this worker."""
+    mode: str = Field(..., description="'off', 'shadow' or 'on'")
+    tiers: List[str] = Field(..., description="Planner models from cheapest to strongest")
+    thresholds: List[float]
+    decisions: Dict[str, int] = Field(..., description="Calls routed to each tier (served by it only in 'on' mode)")
+    upgrades: int = Field(..., description="Calls moved to a stronger tier for errors or latency")
+    probes: int = Field(0, description="Calls kept on their complexity tier despite errors or latency, to re-check it")
+    shadow_runs: int
+    shadow_errors: int
+    shadow_faster: int = Field(..., description="Shadow runs that finished faster than the served call")
+    shadow_latency_ratio: Optional[float] = Field(None, description="Mean routed/served latency of successful shadow runs")
+    shadow_size_ratio: Optional[float] = Field(None, description="Mean routed/served result size (nodes or operations)")
+
+
+class ModelLaneStats(BaseModel):
+    """Admission-control state for one upstream model."""
+    limit: int
+    active: int
+    queued: int
+    admitted: int
+    rejected: int
+    avg_wait: float
+    max_wait: float
+    service_ewma: Optional[float] = None
+
+
+class SchedulerStatsResponse(BaseModel):
+    """Queue depth and wait times per model, plus rate-limit rejections."""
+    models: Dict[str, ModelLaneStats]
+    rate_limited: int
+
+
+class SemanticCacheStatsResponse(BaseModel):
+    """Semantic planner cache counters for this worker."""
+    enabled: bool
+    size: int = 0
+    capacity: int = 0
+    threshold: float = 0.0
+    lookups: int = 0
+    hits: int = 0
+    hit_rate: float = 0.0
+    avg_lookup_ms: float = 0.0
+    memory_bytes: int = 0
+
+
+class ParseStatsResponse(BaseModel):
+    """JSON extraction/repair outcomes for model responses in this worker."""
+    parses: int
+    clean: int
+    repaired: int
+    truncated: int
+    failed: int
+    recovery_rate: float
+    avg_parse_ms: float
+    max_parse_ms: float
+
+
+# ============================================
+# Spec Validation Models
+# ============================================
+
+class GraphIssue(BaseModel):
+    """A structural problem found in a spec's graph."""
+    kind: str = Field(
+        ...,
+        description="'duplicate_id', 'dangling_edge', 'self_loop', 'duplicate_edge', 'cycle', 'orphan' or 'hierarchy_jump'"
+    )
+    node_id: Optional[str] = None
+    source: Optional[str] = None
+    target: Optional[str] = None
+    message: str
+
+
+class ValidateSpecRequest(BaseModel):
+    """Request body for /spec/validate endpoint."""
+    planner_spec: PlannerSpec = Field(..., description="Specification to check")
+    fix: bool = Field(False, description="Also return a repaired copy of the spec")
+
+
+class ValidateSpecResponse(BaseModel):
+    """Structural issues in a spec and, if requested, the repaired spec."""
+    valid: bool
+    issues: List[GraphIssue] = []
+    fixes: List[str] = []
+    planner_spec: Optional[PlannerSpec] = None  # Repaired spec (fix=true only)
+
+
+# ============================================
+# Layout Models
+# ============================================
+
+class NodePosition(BaseModel):
+    """Top-left corner and size of a laid-out node."""
+    x: float
+    y: float
+    width: int
+    height: int
+
+
+class LayoutRequest(BaseModel):
+    """Request body for /layout endpoint."""
+    planner_spec: PlannerSpec = Field(..., description="Specification to lay out")
+    base_hash: Optional[str] = Field(
+        None,
+        description="topology_hash of a layout the client already has; only new and moved nodes are returned"
+    )
+
+
+class LayoutResponse(BaseModel):
+    """Node positions for a spec (direction RIGHT, same node sizes as the frontend)."""
+    success: bool
+    topology_hash: Optional[str] = None
+    positions: Dict[str, NodePosition] = {}
+    removed: List[str] = []  # Nodes in the base layout that are gone (incremental only)
+    incremental: bool = False  # positions holds only nodes that differ from base_hash's layout
+    cached: bool = False
+    width: float = 0.0
+    height: float = 0.0
+    error: Optional[str] = None
+
+
 # ============================================
 # Enhance Map Models
 # ============================================
@@ -94,6 +363,35 @@ class EnhanceMapRequest(BaseModel):
         "expand",
         description="Enhancement mode: 'expand' (add nodes), 'refine' (improve labels), 'focus' (dive deeper into a topic)"
     )
+    enhance_protocol: Optional[str] = Field(
+        None,
+        description="'patch' (model returns edit operations) or 'full' (model returns the whole spec). Defaults to ENHANCE_PROTOCOL"
+    )
+
+
+class NodeChange(BaseModel):
+    """Field-level change to a node that exists in both specs."""
+    id: str
+    changes: Dict[str, Any] = Field(..., description="New values of the fields that changed")
+    previous: Dict[str, Any] = Field(..., description="Old values of the same fields")
+
+
+class EdgeRef(BaseModel):
+    """An edge identified by its endpoints."""
+    source: str
+    target: str
+
+
+class SpecDelta(BaseModel):
+    """Structural difference between two specs, for patching a rendered map in place."""
+    added_nodes: List[NodeSpec] = []
+    removed_nodes: List[str] = []
+    modified_nodes: List[NodeChange] = []
+    added_edges: List[EdgeSpec] = []
+    removed_edges: List[EdgeRef] = []
+    modified_edges: List[EdgeSpec] = Field(default_factory=list, description="Edges whose label or style changed (new values)")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Changed top-level fields (title, central_topic, summary)")
+    unchanged_nodes: int = 0
 
 
 class EnhanceMapResponse(BaseModel):
@@ -101,4 +399,72 @@ class EnhanceMapResponse(BaseModel):
     success: bool
     planner_spec: Optional[PlannerSpec] = None
     changes_summary: Optional[str] = None  # e.g., "Added 3 nodes, modified 1"
+    operations: Optional[List[SpecOperation]] = None  # Applied edits still in effect after the auto-fix (patch protocol only)
+    delta: Optional[SpecDelta] = None  # What changed relative to current_spec
+    error: Optional[str] = None
+
+
+# ============================================
+# Map Storage Models
+# ============================================
+
+class MapSummary(BaseModel):
+    """A saved map without its content, as listed in the archives gallery."""
+    id: str
+    user_id: str
+    title: str
+    is_public: bool = False
+    created_at: float
+    updated_at: float
+    head_version: int = Field(..., description="Number of the latest version (1-based)")
+    spec_hash: str = Field(..., description="Content address of the latest spec")
+    node_count: int = 0
+
+
+class MapVersionInfo(BaseModel):
+    """How one version of a map is stored."""
+    version: int
+    spec_hash: str = Field(..., description="SHA-256 of the spec's canonical JSON")
+    storage: str = Field(..., description="'checkpoint' (full spec) or 'delta' (changes from the previous version)")
+    stored_bytes: int = Field(..., description="Compressed bytes this version added (0 when the spec was already stored)")
+    summary: Optional[str] = None
+    created_at: float
+
+
+class CreateMapRequest(BaseModel):
+    """Request to save a new map with its first version (owned by the signed-in caller)."""
+    title: str
+    planner_spec: PlannerSpec
+    mermaid_syntax: Optional[str] = None
+    is_public: bool = False
+
+
+class SaveMapVersionRequest(BaseModel):
+    """Request to save the current state of a map as a new version."""
+    planner_spec: PlannerSpec
+    mermaid_syntax: Optional[str] = None
+    summary: Optional[str] = Field(None, description="What changed, e.g. an enhance changes_summary")
+    title: Optional[str] = Field(None, description="New map title, if it changed")
+
+
+class MapResponse(BaseModel):
+    """A map with the content of one of its versions."""
+    success: bool
+    map: Optional[MapSummary] = None
+    version: Optional[MapVersionInfo] = None
+    planner_spec: Optional[PlannerSpec] = None
+    mermaid_syntax: Optional[str] = None
+    deduplicated: bool = Field(False, description="The saved spec equals the latest version, so no version was added")
     error: Optional[str] = None
+
+
+class MapListResponse(BaseModel):
+    """One page of maps (a user's own, or public ones), most recently updated first."""
+    maps: List[MapSummary]
+    next_cursor: Optional[str] = None
+
+
+class MapVersionListResponse(BaseModel):
+    """One page of a map's versions, newest first."""
+    versions: List[MapVersionInfo]
+    next_cursor: Optional[str] = None
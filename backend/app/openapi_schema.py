@@ -0,0 +1,77 @@
+"""
+Pre-generated OpenAPI schema, so /openapi.json and /docs do not rebuild it on cold starts.
+
+FastAPI builds the schema from every route and model on first request
+(~200 ms here). The schema is written once with
+
+    python -m app.openapi_schema
+
+and stored with a fingerprint of the backend source; at runtime it is served
+while the fingerprint still matches and regenerated in-process otherwise.
+"""
+import glob
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI
+
+from .config import OPENAPI_SCHEMA_PATH
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def source_fingerprint() -> str:
+    """Hash of every backend module the schema could depend on (routes, models, app setup)."""
+    digest = hashlib.sha256()
+    paths = sorted(glob.glob(os.path.join(BACKEND_DIR, "app", "*.py")))
+    paths.append(os.path.join(BACKEND_DIR, "main.py"))
+    for path in paths:
+        digest.update(os.path.relpath(path, BACKEND_DIR).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_schema(path: str = OPENAPI_SCHEMA_PATH) -> Optional[Dict[str, Any]]:
+    """The stored schema, or None when it is missing, unreadable or stale."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get("fingerprint") != source_fingerprint():
+        return None
+    return stored.get("schema")
+
+
+def write_schema(app: FastAPI, path: str = OPENAPI_SCHEMA_PATH) -> Dict[str, Any]:
+    schema = app.openapi()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": source_fingerprint(), "schema": schema}, f, separators=(",", ":"))
+    return schema
+
+
+def use_stored_schema(app: FastAPI, path: str = OPENAPI_SCHEMA_PATH) -> None:
+    """Make `app.openapi()` return the stored schema when it is current."""
+    generate = app.openapi
+
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is None:
+            app.openapi_schema = load_schema(path) or generate()
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+def main() -> None:
+    from main import app
+
+    write_schema(app)
+    print(f"Wrote {OPENAPI_SCHEMA_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Validation and application of enhance patches (edit operations on a PlannerSpec)."""
+from typing import Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from .models import PlannerSpec, NodeSpec, EdgeSpec, SpecOperation, SpecPatch
+
+
+# Node fields the model may overwrite with update_node (the ID is immutable)
+UPDATABLE_NODE_FIELDS = ("label", "description", "type", "icon")
+
+
+def apply_patch(spec: PlannerSpec, patch: SpecPatch) -> Tuple[PlannerSpec, List[SpecOperation], List[str]]:
+    """
+    Apply a patch to a spec, skipping operations that do not validate.
+
+    Rules:
+        - add_node must use a new ID; update_node/remove_node must target an existing one
+        - remove_node also removes every edge touching the node (reported as remove_edge ops)
+        - add_edge needs both endpoints present, no self-loop and no duplicate (source, target)
+        - remove_edge must match an existing (source, target) pair
+
+    Args:
+        spec: The current mind map specification (not mutated)
+        patch: Operations returned by the Enhance Agent
+
+    Returns:
+        (new_spec, applied_operations, rejection_reasons)
+    """
+    nodes: Dict[str, NodeSpec] = {}
+    for node in spec.nodes:
+        nodes.setdefault(node.id, node.model_copy())
+    edges: Dict[Tuple[str, str], EdgeSpec] = {}
+    for edge in spec.edges:
+        edges.setdefault((edge.source, edge.target), edge.model_copy())
+
+    applied: List[SpecOperation] = []
+    rejected: List[str] = []
+
+    for index, operation in enumerate(patch.operations):
+        op = operation.op
+        where = f"operation {index} ({op})"
+
+        if op == "add_node":
+            node = operation.node
+            if node is None:
+                rejected.append(f"{where}: missing node")
+            elif node.id in nodes:
+                rejected.append(f"{where}: node '{node.id}' already exists")
+            else:
+                nodes[node.id] = node
+                applied.append(operation)
+
+        elif op == "update_node":
+            node = nodes.get(operation.id or "")
+            changes = {
+                key: value for key, value in (operation.changes or {}).items()
+                if key in UPDATABLE_NODE_FIELDS
+            }
+            if node is None:
+                rejected.append(f"{where}: unknown node '{operation.id}'")
+            elif not changes:
+                rejected.append(f"{where}: no updatable fields")
+            else:
+                try:
+                    nodes[node.id] = NodeSpec(**{**node.model_dump(), **changes})
+                except ValidationError as e:
+                    rejected.append(f"{where}: {e.errors()[0]['msg']}")
+                    continue
+                applied.append(SpecOperation(op=op, id=node.id, changes=changes))
+
+        elif op == "remove_node":
+            node_id = operation.id or ""
+            if node_id not in nodes:
+                rejected.append(f"{where}: unknown node '{node_id}'")
+                continue
+            del nodes[node_id]
+            applied.append(operation)
+            for key in [key for key in edges if node_id in key]:
+                del edges[key]
+                applied.append(SpecOperation(op="remove_edge", source=key[0], target=key[1]))
+
+        elif op == "add_edge":
+            key = (operation.source or "", operation.target or "")
+            if key[0] not in nodes or key[1] not in nodes:
+                rejected.append(f"{where}: edge {key[0]} -> {key[1]} references an unknown node")
+            elif key[0] == key[1]:
+                rejected.append(f"{where}: self-loop on '{key[0]}'")
+            elif key in edges:
+                rejected.append(f"{where}: edge {key[0]} -> {key[1]} already exists")
+            else:
+                edges[key] = EdgeSpec(
+                    source=key[0],
+                    target=key[1],
+                    label=operation.label,
+                    style=operation.style or "solid",
+                )
+                applied.append(operation)
+
+        elif op == "remove_edge":
+            key = (operation.source or "", operation.target or "")
+            if key not in edges:
+                rejected.append(f"{where}: edge {key[0]} -> {key[1]} does not exist")
+            else:
+                del edges[key]
+                applied.append(operation)
+
+        else:
+            rejected.append(f"{where}: unknown operation")
+
+    new_spec = PlannerSpec(
+        title=patch.title or spec.title,
+        central_topic=spec.central_topic,
+        nodes=list(nodes.values()),
+        edges=list(edges.values()),
+        summary=patch.summary if patch.summary is not None else spec.summary,
+    )
+    return new_spec, applied, rejected
+
+
+def surviving_operations(operations: List[SpecOperation], spec: PlannerSpec) -> List[SpecOperation]:
+    """
+    Keep the applied operations whose effect is still present in `spec`.
+
+    The patched spec goes through the structural auto-fix afterwards, which can
+    drop or re-parent edges (and drop nodes); operations it undid are left out
+    so the reported list describes the spec actually returned.
+    """
+    node_ids = {node.id for node in spec.nodes}
+    edge_keys = {(edge.source, edge.target) for edge in spec.edges}
+    kept: List[SpecOperation] = []
+    for operation in operations:
+        if operation.op == "add_node":
+            survived = operation.node is not None and operation.node.id in node_ids
+        elif operation.op == "update_node":
+            survived = operation.id in node_ids
+        elif operation.op == "remove_node":
+            survived = operation.id not in node_ids
+        elif operation.op == "add_edge":
+            survived = (operation.source, operation.target) in edge_keys
+        elif operation.op == "remove_edge":
+            survived = (operation.source, operation.target) not in edge_keys
+        else:
+            survived = False
+        if survived:
+            kept.append(operation)
+    return kept
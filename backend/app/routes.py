@@ -1,21 +1,100 @@
 """API route definitions."""
-from fastapi import APIRouter, HTTPException
+import asyncio
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from .models import (
+    PlannerSpec,
     GeneratePlanRequest,
     GeneratePlanResponse,
     GenerateBuildRequest,
     GenerateBuildResponse,
     GenerateFullRequest,
     GenerateFullResponse,
+    GenerateBatchRequest,
     EnhanceMapRequest,
     EnhanceMapResponse,
+    ValidateSpecRequest,
+    ValidateSpecResponse,
+    LayoutRequest,
+    LayoutResponse,
     HealthResponse,
+    CacheStatsResponse,
+    SemanticCacheStatsResponse,
+    ParseStatsResponse,
+    ExecutorStatsResponse,
+    RouterStatsResponse,
+    SchedulerStatsResponse,
+    JobResponse,
+    JobStatsResponse,
+    CreateMapRequest,
+    SaveMapVersionRequest,
+    MapResponse,
+    MapSummary,
+    MapListResponse,
+    MapVersionListResponse,
+)
+from .agents import (
+    plan_map,
+    stream_planner_agent,
+    build_mermaid,
+    analyze_image,
+    run_full_pipeline,
+    run_enhance_pipeline,
+)
+from .streaming import format_sse, format_sse_json, SSE_HEADERS
+from .serialization import ModelRoute, json_body, body_schema
+from .cache import get_cache
+from .semantic_cache import get_semantic_index
+from .executor import executor
+from .auth import current_user, optional_user
+from .model_router import model_router
+from .json_extract import parse_stats
+from .scheduler import (
+    scheduler,
+    begin_request,
+    OverloadedError,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_DEFAULT,
+    PRIORITY_BATCH,
 )
-from .agents import run_planner_agent, run_builder_agent, analyze_image, run_enhance_agent, calculate_changes
+from .batch import run_batch
+from .graph import SpecGraph, repair_spec
+from .layout import get_layout_cache, changed_boxes
+from .metrics import registry, family, stage, resident_memory_bytes
+from .jobs import get_job_store, existing_job_store, job_response, job_response_json, TERMINAL_STATUSES
+from .storage import get_map_store, MapNotFoundError, InvalidCursorError
+from .thumbnails import get_thumbnail, schedule_thumbnails, MEDIA_TYPES
+from .config import JOBS_ENABLED, JOB_POLL_INTERVAL_SECONDS, REQUEST_DEADLINE_SECONDS, MAP_PAGE_SIZE
+
+
+# Endpoints return models that are already valid; ModelRoute sends them without
+# a second validation pass, and json_body() parses large spec bodies in one pass
+router = APIRouter(route_class=ModelRoute)
+
 
+def _client_id(request: Request) -> str:
+    """Identify the caller for rate limiting (first X-Forwarded-For hop behind Vercel)."""
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
 
-router = APIRouter()
+
+def admit(priority: int = PRIORITY_DEFAULT):
+    """Route dependency applying the client rate limit and setting the request's queue priority."""
+    async def dependency(request: Request):
+        begin_request(_client_id(request), priority)
+    return dependency
+
+
+def _use_cache(cache_bypass: Optional[str]) -> bool:
+    """Interpret the X-Cache-Bypass request header."""
+    return (cache_bypass or "").strip().lower() not in ("1", "true", "yes")
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -24,8 +103,119 @@ async def health_check():
     return HealthResponse(status="healthy", version="1.0.0")
 
 
-@router.post("/generate/plan", response_model=GeneratePlanResponse)
-async def generate_plan(request: GeneratePlanRequest):
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats():
+    """Response cache hit/miss counters for this worker."""
+    stats = await asyncio.get_running_loop().run_in_executor(None, get_cache().stats)
+    return CacheStatsResponse(**stats)
+
+
+@router.get("/cache/semantic/stats", response_model=SemanticCacheStatsResponse)
+async def semantic_cache_stats():
+    """Semantic planner cache hit rate and lookup latency for this worker."""
+    index = get_semantic_index()
+    if index is None:
+        return SemanticCacheStatsResponse(enabled=False)
+    return SemanticCacheStatsResponse(**index.stats())
+
+
+@router.get("/models/stats", response_model=ExecutorStatsResponse)
+async def model_stats():
+    """Per-model latency percentiles, hedges and failovers for this worker."""
+    return ExecutorStatsResponse(**executor.stats())
+
+
+@router.get("/router/stats", response_model=RouterStatsResponse)
+async def router_stats():
+    """Planner tier routing decisions and shadow comparisons for this worker."""
+    return RouterStatsResponse(**model_router.stats())
+
+
+@router.get("/parser/stats", response_model=ParseStatsResponse)
+async def parser_stats():
+    """How often model JSON needed repair, how often repair succeeded, and parse time."""
+    return ParseStatsResponse(**parse_stats.stats())
+
+
+@router.get("/scheduler/stats", response_model=SchedulerStatsResponse)
+async def scheduler_stats():
+    """Per-model concurrency, queue depth and wait times for this worker."""
+    return SchedulerStatsResponse(**scheduler.stats())
+
+
+def _job_counts() -> Optional[Dict[str, int]]:
+    """Job counts by status, or None when no job queue exists (e.g. serverless) or it cannot be read."""
+    try:
+        store = existing_job_store()
+        return store.stats() if store is not None else None
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _runtime_metrics() -> str:
+    """
+    Cache, queue, model and parser counters that already live in stats(), in
+    Prometheus format. Blocking (SQLite counts); run it off the event loop.
+    """
+    blocks = []
+    
+    caches = [("response", get_cache().stats())]
+    index = get_semantic_index()
+    if index is not None:
+        caches.append(("semantic", index.stats()))
+    layout_cache = get_layout_cache()
+    caches.append(("layout", {"hits": layout_cache.hits, "misses": layout_cache.misses}))
+    blocks.append(family("anymaps_cache_hits_total", "counter", "Cache hits.",
+                         (({"cache": name}, stats.get("hits")) for name, stats in caches)))
+    blocks.append(family("anymaps_cache_misses_total", "counter", "Cache misses.",
+                         (({"cache": name}, stats.get("misses", stats.get("lookups", 0) - stats.get("hits", 0)))
+                          for name, stats in caches)))
+    blocks.append(family("anymaps_cache_entries", "gauge", "Entries held per cache.",
+                         (({"cache": name}, stats.get("size")) for name, stats in caches)))
+    
+    lanes = scheduler.stats()["models"]
+    for key, kind, help_text in (
+        ("active", "gauge", "Model calls in flight."),
+        ("queued", "gauge", "Model calls waiting for a slot."),
+        ("admitted", "counter", "Model calls admitted to a slot."),
+        ("rejected", "counter", "Model calls shed by the scheduler."),
+    ):
+        name = f"anymaps_queue_{key}" + ("_total" if kind == "counter" else "")
+        blocks.append(family(name, kind, help_text, (({"model": model}, lane[key]) for model, lane in lanes.items())))
+    blocks.append(family("anymaps_rate_limited_total", "counter", "Requests rejected by the per-client rate limit.",
+                         [({}, scheduler.stats()["rate_limited"])]))
+    
+    models = executor.stats()["models"]
+    blocks.append(family("anymaps_llm_latency_seconds", "gauge", "Rolling model call latency percentiles.",
+                         (({"model": model, "quantile": q}, stats[f"p{q}"])
+                          for model, stats in models.items() for q in ("50", "95", "99"))))
+    
+    parser = parse_stats.stats()
+    blocks.append(family("anymaps_json_parses_total", "counter", "Model JSON parses by outcome.",
+                         (({"outcome": outcome}, parser[outcome]) for outcome in ("clean", "repaired", "failed"))))
+    
+    jobs = _job_counts()
+    if jobs is not None:
+        blocks.append(family("anymaps_jobs", "gauge", "Background jobs by status.",
+                             (({"status": status}, count) for status, count in jobs.items())))
+    blocks.append(family("process_resident_memory_bytes", "gauge", "Resident memory size in bytes.",
+                         [({}, resident_memory_bytes())]))
+    return "\n".join(blocks)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text-format metrics for this worker (stage timings, tokens, caches, queues)."""
+    runtime = await asyncio.get_running_loop().run_in_executor(None, _runtime_metrics)
+    body = registry.render() + "\n" + runtime + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.post("/generate/plan", response_model=GeneratePlanResponse, dependencies=[Depends(admit())])
+async def generate_plan(
+    request: GeneratePlanRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
     """
     Generate a mind map plan from user prompt.
     
@@ -36,12 +226,18 @@ async def generate_plan(request: GeneratePlanRequest):
         # Process image if provided
         image_description = None
         if request.image_base64:
-            image_description = await analyze_image(request.image_base64)
+            image_description = await analyze_image(
+                request.image_base64,
+                use_cache=_use_cache(x_cache_bypass)
+            )
         
         # Run the planner agent
-        planner_spec = await run_planner_agent(
+        planner_spec = await plan_map(
             user_prompt=request.user_prompt,
-            image_description=image_description
+            image_description=image_description,
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes,
+            use_cache=_use_cache(x_cache_bypass)
         )
         
         return GeneratePlanResponse(
@@ -49,6 +245,9 @@ async def generate_plan(request: GeneratePlanRequest):
             planner_spec=planner_spec
         )
     
+    except OverloadedError:
+        raise
+    
     except Exception as e:
         return GeneratePlanResponse(
             success=False,
@@ -56,21 +255,34 @@ async def generate_plan(request: GeneratePlanRequest):
         )
 
 
-@router.post("/generate/build", response_model=GenerateBuildResponse)
-async def generate_build(request: GenerateBuildRequest):
+@router.post(
+    "/generate/build",
+    response_model=GenerateBuildResponse,
+    dependencies=[Depends(admit())],
+    openapi_extra=body_schema(GenerateBuildRequest)
+)
+async def generate_build(request: GenerateBuildRequest = Depends(json_body(GenerateBuildRequest))):
     """
     Convert a PlannerSpec into Mermaid syntax.
     
     Takes a structured specification and returns Mermaid.js code.
+    Compiled locally by default; set builder_mode='llm' to use the Builder agent.
     """
     try:
-        mermaid_syntax = await run_builder_agent(request.planner_spec)
+        mermaid_syntax = await build_mermaid(
+            request.planner_spec,
+            builder_mode=request.builder_mode,
+            diagram_type=request.diagram_type
+        )
         
         return GenerateBuildResponse(
             success=True,
             mermaid_syntax=mermaid_syntax
         )
     
+    except OverloadedError:
+        raise
+    
     except Exception as e:
         return GenerateBuildResponse(
             success=False,
@@ -78,34 +290,36 @@ async def generate_build(request: GenerateBuildRequest):
         )
 
 
-@router.post("/generate/full", response_model=GenerateFullResponse)
-async def generate_full(request: GenerateFullRequest):
+@router.post("/generate/full", response_model=GenerateFullResponse, dependencies=[Depends(admit())])
+async def generate_full(
+    request: GenerateFullRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
     """
     Full pipeline: Generate plan and build in one request.
     
     Chains the Planner and Builder agents for simpler UX.
     """
     try:
-        # Process image if provided
-        image_description = None
-        if request.image_base64:
-            image_description = await analyze_image(request.image_base64)
-        
-        # Step 1: Generate plan
-        planner_spec = await run_planner_agent(
+        planner_spec, mermaid_syntax = await run_full_pipeline(
             user_prompt=request.user_prompt,
-            image_description=image_description
+            image_base64=request.image_base64,
+            builder_mode=request.builder_mode,
+            diagram_type=request.diagram_type,
+            use_cache=_use_cache(x_cache_bypass),
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes
         )
         
-        # Step 2: Build Mermaid syntax
-        mermaid_syntax = await run_builder_agent(planner_spec)
-        
         return GenerateFullResponse(
             success=True,
             planner_spec=planner_spec,
             mermaid_syntax=mermaid_syntax
         )
     
+    except OverloadedError:
+        raise
+    
     except Exception as e:
         return GenerateFullResponse(
             success=False,
@@ -113,8 +327,221 @@ async def generate_full(request: GenerateFullRequest):
         )
 
 
-@router.post("/generate/enhance", response_model=EnhanceMapResponse)
-async def enhance_map(request: EnhanceMapRequest):
+async def _replay_plan(planner_spec: PlannerSpec) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield a finished spec in stream_planner_agent's event order."""
+    for node in planner_spec.nodes:
+        yield "node", node
+    for edge in planner_spec.edges:
+        yield "edge", edge
+    yield "plan", planner_spec
+
+
+async def _stream_pipeline(
+    user_prompt: str,
+    image_base64: Optional[str],
+    build: bool,
+    builder_mode: Optional[str] = None,
+    diagram_type: str = "mindmap",
+    use_cache: bool = True,
+    generation_mode: Optional[str] = None,
+    target_nodes: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Run vision → plan (→ build) and yield Server-Sent Events as work completes.
+    
+    Events: 'vision_done', 'node', 'edge', 'plan_done', 'build_done', then
+    'done' on success or 'error' on failure. In fanout mode the nodes and
+    edges are sent once the merged map is ready.
+    """
+    try:
+        image_description = None
+        if image_base64:
+            image_description = await analyze_image(image_base64, use_cache=use_cache)
+            yield format_sse("vision_done", {"image_description": image_description})
+        
+        if generation_mode == "fanout":
+            planner_items = _replay_plan(await plan_map(
+                user_prompt=user_prompt,
+                image_description=image_description,
+                generation_mode=generation_mode,
+                target_nodes=target_nodes,
+                use_cache=use_cache
+            ))
+        else:
+            planner_items = stream_planner_agent(
+                user_prompt=user_prompt,
+                image_description=image_description,
+                use_cache=use_cache
+            )
+        
+        planner_spec = None
+        async for kind, item in planner_items:
+            if kind == "plan":
+                planner_spec = item
+                yield format_sse("plan_done", {"planner_spec": item})
+            else:
+                yield format_sse(kind, item)
+        
+        if build:
+            mermaid_syntax = await build_mermaid(
+                planner_spec,
+                builder_mode=builder_mode,
+                diagram_type=diagram_type
+            )
+            yield format_sse("build_done", {"mermaid_syntax": mermaid_syntax})
+        
+        yield format_sse("done", {"success": True})
+    
+    except OverloadedError as e:
+        yield format_sse("error", {
+            "success": False,
+            "error": str(e),
+            "status": e.status_code,
+            "retry_after": e.retry_after,
+        })
+    
+    except Exception as e:
+        yield format_sse("error", {"success": False, "error": str(e)})
+
+
+@router.post("/generate/plan/stream", dependencies=[Depends(admit())])
+async def generate_plan_stream(
+    request: GeneratePlanRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """
+    Streaming variant of /generate/plan.
+    
+    Emits each node and edge as a Server-Sent Event as soon as the planner
+    has produced it, followed by the validated PlannerSpec.
+    """
+    return StreamingResponse(
+        _stream_pipeline(
+            request.user_prompt,
+            request.image_base64,
+            build=False,
+            use_cache=_use_cache(x_cache_bypass),
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes,
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.post("/generate/full/stream", dependencies=[Depends(admit())])
+async def generate_full_stream(
+    request: GenerateFullRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """
+    Streaming variant of /generate/full.
+    
+    Same events as /generate/plan/stream plus 'build_done' with the Mermaid syntax.
+    """
+    return StreamingResponse(
+        _stream_pipeline(
+            request.user_prompt,
+            request.image_base64,
+            build=True,
+            builder_mode=request.builder_mode,
+            diagram_type=request.diagram_type,
+            use_cache=_use_cache(x_cache_bypass),
+            generation_mode=request.generation_mode,
+            target_nodes=request.target_nodes,
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.post("/generate/batch", dependencies=[Depends(admit(PRIORITY_BATCH))])
+async def generate_batch(
+    request: GenerateBatchRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """
+    Generate many maps in one request.
+    
+    Runs the full pipeline for each item with bounded concurrency and streams
+    one NDJSON line per item as it completes, followed by a summary line.
+    Duplicate prompts are generated once; per-item errors don't fail the batch.
+    """
+    return StreamingResponse(
+        run_batch(request, use_cache=_use_cache(x_cache_bypass)),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/spec/validate", response_model=ValidateSpecResponse, openapi_extra=body_schema(ValidateSpecRequest))
+async def validate_spec(request: ValidateSpecRequest = Depends(json_body(ValidateSpecRequest))):
+    """
+    Check a PlannerSpec for structural problems.
+    
+    Reports duplicate IDs, dangling edges, self-loops, repeated edges, cycles,
+    nodes unreachable from the central node and hierarchy jumps. With fix=true
+    the repaired spec and the list of fixes applied are returned as well.
+    """
+    issues = SpecGraph(request.planner_spec).issues()
+    if not request.fix:
+        return ValidateSpecResponse(valid=not issues, issues=issues)
+    
+    fixed_spec, fixes = repair_spec(request.planner_spec)
+    return ValidateSpecResponse(valid=not issues, issues=issues, fixes=fixes, planner_spec=fixed_spec)
+
+
+@router.post("/layout", response_model=LayoutResponse, openapi_extra=body_schema(LayoutRequest))
+async def layout_spec(request: LayoutRequest = Depends(json_body(LayoutRequest))):
+    """
+    Lay out a PlannerSpec server-side (tidy tree, direction RIGHT).
+    
+    Layouts are cached by topology hash, so relabelling nodes or re-sending
+    the same map is free. Pass the topology_hash of a layout already on the
+    client as base_hash to receive only the nodes that are new or moved.
+    """
+    try:
+        cache = get_layout_cache()
+        loop = asyncio.get_running_loop()
+        with stage("layout"):
+            layout, cached = await loop.run_in_executor(None, cache.layout, request.planner_spec)
+        
+        boxes, removed = layout.boxes, []
+        base = cache.get(request.base_hash) if request.base_hash else None
+        if base is not None:
+            boxes, removed = changed_boxes(base, layout)
+        
+        return LayoutResponse(
+            success=True,
+            topology_hash=layout.topology_hash,
+            positions={
+                node_id: {"x": x, "y": y, "width": width, "height": height}
+                for node_id, (x, y, width, height) in boxes.items()
+            },
+            removed=removed,
+            incremental=base is not None,
+            cached=cached,
+            width=layout.width,
+            height=layout.height
+        )
+    
+    except Exception as e:
+        return LayoutResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+@router.post(
+    "/generate/enhance",
+    response_model=EnhanceMapResponse,
+    dependencies=[Depends(admit(PRIORITY_INTERACTIVE))],
+    openapi_extra=body_schema(EnhanceMapRequest)
+)
+async def enhance_map(
+    request: EnhanceMapRequest = Depends(json_body(EnhanceMapRequest)),
+    x_cache_bypass: Optional[str] = Header(None)
+):
     """
     Enhance an existing mind map with additional content.
     
@@ -122,24 +549,333 @@ async def enhance_map(request: EnhanceMapRequest):
     Returns the updated spec with a summary of changes.
     """
     try:
-        # Run the enhance agent
-        enhanced_spec = await run_enhance_agent(
+        enhanced_spec, changes_summary, operations, delta = await run_enhance_pipeline(
             current_spec=request.current_spec,
             enhance_prompt=request.enhance_prompt,
-            enhance_mode=request.enhance_mode
+            enhance_mode=request.enhance_mode,
+            enhance_protocol=request.enhance_protocol,
+            use_cache=_use_cache(x_cache_bypass)
         )
         
-        # Calculate what changed
-        changes_summary = calculate_changes(request.current_spec, enhanced_spec)
-        
         return EnhanceMapResponse(
             success=True,
             planner_spec=enhanced_spec,
-            changes_summary=changes_summary
+            changes_summary=changes_summary,
+            operations=operations,
+            delta=delta
         )
     
+    except OverloadedError:
+        raise
+    
     except Exception as e:
         return EnhanceMapResponse(
             success=False,
             error=str(e)
         )
+
+
+# ============================================
+# Background Jobs
+# ============================================
+
+async def _in_jobs(fn, *args):
+    """Run a blocking job-store call off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, fn, *args)
+
+
+async def _submit_job(kind: str, request, x_cache_bypass: Optional[str]) -> JobResponse:
+    if not JOBS_ENABLED:
+        # Nothing would ever claim the job, and polls may land on another instance
+        raise HTTPException(
+            status_code=503,
+            detail="Background jobs are not available on this deployment: run python -m app.worker "
+                   "against a shared JOBS_DB_PATH, or call the /generate endpoints directly"
+        )
+    job, deduplicated = await _in_jobs(get_job_store().submit, kind, request, _use_cache(x_cache_bypass))
+    return job_response(job, deduplicated=deduplicated)
+
+
+@router.post(
+    "/jobs/plan",
+    response_model=JobResponse,
+    status_code=202,
+    dependencies=[Depends(admit(PRIORITY_BATCH))]
+)
+async def submit_plan_job(
+    request: GeneratePlanRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """Queue a /generate/plan request; poll /jobs/{job_id} for its result."""
+    return await _submit_job("plan", request, x_cache_bypass)
+
+
+@router.post(
+    "/jobs/full",
+    response_model=JobResponse,
+    status_code=202,
+    dependencies=[Depends(admit(PRIORITY_BATCH))]
+)
+async def submit_full_job(
+    request: GenerateFullRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """Queue a /generate/full request; poll /jobs/{job_id} for its result."""
+    return await _submit_job("full", request, x_cache_bypass)
+
+
+@router.post(
+    "/jobs/enhance",
+    response_model=JobResponse,
+    status_code=202,
+    dependencies=[Depends(admit(PRIORITY_BATCH))],
+    openapi_extra=body_schema(EnhanceMapRequest)
+)
+async def submit_enhance_job(
+    request: EnhanceMapRequest = Depends(json_body(EnhanceMapRequest)),
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """Queue a /generate/enhance request; poll /jobs/{job_id} for its result."""
+    return await _submit_job("enhance", request, x_cache_bypass)
+
+
+@router.get("/jobs/stats", response_model=JobStatsResponse)
+async def job_stats():
+    """Job counts by status in the shared queue."""
+    return JobStatsResponse(**await _in_jobs(get_job_store().stats))
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Current state of a job.
+    
+    Once `status` is 'succeeded', `result` holds the same body the synchronous
+    endpoint would have returned. Finished jobs expire after JOB_RESULT_TTL_SECONDS.
+    """
+    job = await _in_jobs(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return Response(job_response_json(job), media_type="application/json")
+
+
+async def _stream_job(job_id: str) -> AsyncIterator[str]:
+    """
+    Yield a 'status' event whenever the job changes, then 'done' with the
+    finished job. The stream closes with 'timeout' before the platform's
+    function limit; clients reconnect to keep following the job.
+    """
+    store = get_job_store()
+    deadline = time.monotonic() + REQUEST_DEADLINE_SECONDS
+    last_seen = None
+    while True:
+        job = await _in_jobs(store.get, job_id)
+        if job is None:
+            yield format_sse("error", {"success": False, "error": "Job not found or expired"})
+            return
+        if job["status"] in TERMINAL_STATUSES:
+            yield format_sse_json("done", job_response_json(job))
+            return
+        state = (job["status"], job["attempts"])
+        if state != last_seen:
+            last_seen = state
+            yield format_sse("status", job_response(job, include_result=False))
+        if time.monotonic() >= deadline:
+            yield format_sse("timeout", {"job_id": job_id})
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Follow a job over Server-Sent Events until it finishes."""
+    if await _in_jobs(get_job_store().get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return StreamingResponse(_stream_job(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ============================================
+# Map Storage
+# ============================================
+
+async def _in_store(fn, *args):
+    """Run a blocking map-store call off the event loop, mapping store errors to HTTP errors."""
+    loop = asyncio.get_running_loop()
+    try:
+        with stage("storage"):
+            return await loop.run_in_executor(None, fn, *args)
+    except MapNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _authorize(store, map_id: str, user_id: Optional[str], write: bool = False) -> MapSummary:
+    """
+    The map if the caller may read it (owner, or anyone when it is public) or,
+    with `write`, change it (owner only). Other users' private maps are
+    reported as missing, so their IDs cannot be probed.
+    """
+    summary = await _in_store(store.get_map, map_id)
+    if user_id is not None and summary.user_id == user_id:
+        return summary
+    if summary.is_public:
+        if not write:
+            return summary
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Sign in required", headers={"WWW-Authenticate": "Bearer"})
+        raise HTTPException(status_code=403, detail="Only the map's owner can change it")
+    raise HTTPException(status_code=404, detail=f"Map {map_id} not found")
+
+
+@router.post("/maps", response_model=MapResponse, openapi_extra=body_schema(CreateMapRequest))
+async def create_map(
+    request: CreateMapRequest = Depends(json_body(CreateMapRequest)),
+    user_id: str = Depends(current_user)
+):
+    """Save a new map owned by the signed-in caller; its spec becomes version 1."""
+    store = get_map_store()
+    summary, version = await _in_store(
+        store.create_map,
+        user_id,
+        request.title,
+        request.planner_spec,
+        request.mermaid_syntax,
+        request.is_public
+    )
+    schedule_thumbnails(store, version.spec_hash, request.planner_spec)
+    return MapResponse(success=True, map=summary, version=version)
+
+
+@router.get("/maps", response_model=MapListResponse)
+async def list_maps(cursor: Optional[str] = None, limit: int = MAP_PAGE_SIZE, user_id: str = Depends(current_user)):
+    """
+    The signed-in caller's maps, most recently updated first, one page at a time.
+    
+    Pass the returned next_cursor to get the following page; it is absent on the last one.
+    """
+    store = get_map_store()
+    maps, next_cursor = await _in_store(store.list_maps, user_id, cursor, limit)
+    return MapListResponse(maps=maps, next_cursor=next_cursor)
+
+
+@router.get("/maps/public", response_model=MapListResponse)
+async def list_public_maps(cursor: Optional[str] = None, limit: int = MAP_PAGE_SIZE):
+    """
+    Public maps of every owner, most recently updated first, for the archives gallery.
+    
+    Their thumbnails need no access token, so they can be shown with plain image URLs.
+    """
+    store = get_map_store()
+    maps, next_cursor = await _in_store(store.list_maps, None, cursor, limit)
+    return MapListResponse(maps=maps, next_cursor=next_cursor)
+
+
+@router.get("/maps/{map_id}", response_model=MapResponse)
+async def get_map(map_id: str, version: Optional[int] = None, user_id: Optional[str] = Depends(optional_user)):
+    """Load a map at `version` (default: the latest), rebuilt from its nearest checkpoint."""
+    store = get_map_store()
+    await _authorize(store, map_id, user_id)
+    summary, info, spec, mermaid_syntax = await _in_store(store.load_version, map_id, version)
+    return MapResponse(
+        success=True,
+        map=summary,
+        version=info,
+        planner_spec=spec,
+        mermaid_syntax=mermaid_syntax
+    )
+
+
+@router.post("/maps/{map_id}/versions", response_model=MapResponse, openapi_extra=body_schema(SaveMapVersionRequest))
+async def save_map_version(
+    map_id: str,
+    request: SaveMapVersionRequest = Depends(json_body(SaveMapVersionRequest)),
+    user_id: str = Depends(current_user)
+):
+    """
+    Save the current state of a map as its next version.
+    
+    Stored as a delta against the previous version where that is smaller, and
+    not stored at all (deduplicated=true) when nothing changed.
+    """
+    store = get_map_store()
+    await _authorize(store, map_id, user_id, write=True)
+    summary, version, deduplicated = await _in_store(
+        store.save_version,
+        map_id,
+        request.planner_spec,
+        request.mermaid_syntax,
+        request.summary,
+        request.title
+    )
+    if not deduplicated:
+        schedule_thumbnails(store, version.spec_hash, request.planner_spec)
+    return MapResponse(success=True, map=summary, version=version, deduplicated=deduplicated)
+
+
+@router.get("/maps/{map_id}/versions", response_model=MapVersionListResponse)
+async def list_map_versions(
+    map_id: str,
+    cursor: Optional[str] = None,
+    limit: int = MAP_PAGE_SIZE,
+    user_id: Optional[str] = Depends(optional_user)
+):
+    """A map's version history, newest first, one page at a time (without content)."""
+    store = get_map_store()
+    await _authorize(store, map_id, user_id)
+    versions, next_cursor = await _in_store(store.list_versions, map_id, cursor, limit)
+    return MapVersionListResponse(versions=versions, next_cursor=next_cursor)
+
+
+@router.get(
+    "/maps/{map_id}/thumbnail",
+    response_class=Response,
+    responses={200: {"content": {media_type: {} for media_type in MEDIA_TYPES.values()}}}
+)
+async def get_map_thumbnail(
+    map_id: str,
+    request: Request,
+    format: str = "svg",
+    version: Optional[int] = None,
+    user_id: Optional[str] = Depends(optional_user)
+):
+    """
+    Preview image of a map at `version` (default: the latest) for the gallery.
+    
+    Thumbnails are rendered when a version is saved and shared by every map
+    with the same content. With an explicit version the image never changes
+    and may be cached indefinitely; the latest one is revalidated by ETag.
+    Private maps need the owner's access token, so plain <img> tags can
+    only show public ones.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(MEDIA_TYPES)}")
+    store = get_map_store()
+    summary = await _authorize(store, map_id, user_id)
+    spec_hash = await _in_store(store.spec_hash, map_id, version)
+    headers = {
+        "ETag": f'"{spec_hash[:32]}.{format}"',
+        # Shared caches may only keep previews of public maps
+        "Cache-Control": ("public, " if summary.is_public else "private, ") + (
+            "max-age=31536000, immutable" if version is not None else "max-age=60"
+        ),
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    body = await _in_store(store.get_thumbnail, spec_hash, format)
+    if body is None:
+        _, _, spec, _ = await _in_store(store.load_version, map_id, version)
+        body = await get_thumbnail(store, spec_hash, spec, format)
+    return Response(body, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+@router.delete("/maps/{map_id}")
+async def delete_map(map_id: str, user_id: str = Depends(current_user)):
+    """Delete a map with all its versions (owner only)."""
+    store = get_map_store()
+    await _authorize(store, map_id, user_id, write=True)
+    if not await _in_store(store.delete_map, map_id):
+        raise HTTPException(status_code=404, detail=f"Map {map_id} not found")
+    return {"success": True}
@@ -0,0 +1,244 @@
+"""Admission control for LLM calls: per-model concurrency, priorities and client rate limits."""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .config import (
+    PLANNER_MODEL,
+    BUILDER_MODEL,
+    VISION_MODEL,
+    PLANNER_CONCURRENCY,
+    BUILDER_CONCURRENCY,
+    VISION_CONCURRENCY,
+    DEFAULT_MODEL_CONCURRENCY,
+    SCHEDULER_MAX_QUEUE,
+    REQUEST_DEADLINE_SECONDS,
+    CLIENT_RATE_PER_MINUTE,
+    CLIENT_BURST,
+)
+
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BATCH = 2
+
+# Request-scoped admission context, set by the route dependency
+current_priority: ContextVar[int] = ContextVar("current_priority", default=PRIORITY_DEFAULT)
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+# Assumed service time until a lane has measured one
+DEFAULT_SERVICE_SECONDS = 10.0
+SERVICE_EWMA_ALPHA = 0.2
+
+
+class OverloadedError(Exception):
+    """Request rejected by admission control; surfaced as HTTP 429/503 with Retry-After."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# ============================================
+# Per-model Lanes
+# ============================================
+
+class ModelLane:
+    """Concurrency limit plus a bounded priority queue for one upstream model."""
+
+    def __init__(self, model: str, limit: int, max_queue: int):
+        self.model = model
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.service_ewma: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def estimated_wait(self, ahead: int) -> float:
+        """Rough wait for a request with `ahead` queued requests in front of it."""
+        service = self.service_ewma or DEFAULT_SERVICE_SECONDS
+        return (ahead + 1) * service / self.limit
+
+    async def acquire(self, priority: int, deadline: Optional[float]) -> float:
+        """
+        Wait for a slot.
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            OverloadedError: queue is full or the wait would overrun the deadline
+        """
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+
+        queued = self.queued()
+        ahead = sum(1 for p, _, future in self._waiters if p <= priority and not future.done())
+        estimate = self.estimated_wait(ahead)
+        if queued >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(f"{self.model} queue is full", 503, estimate)
+        now = time.monotonic()
+        if deadline is not None and now + estimate > deadline:
+            self.rejected += 1
+            raise OverloadedError(f"{self.model} queue wait would exceed the request deadline", 503, estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - now)
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we gave up; hand it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise OverloadedError(f"{self.model} queue wait exceeded the request deadline", 503, estimate)
+            raise
+
+        waited = time.monotonic() - now
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the highest-priority waiter."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def record_service(self, seconds: float) -> None:
+        if self.service_ewma is None:
+            self.service_ewma = seconds
+        else:
+            self.service_ewma += SERVICE_EWMA_ALPHA * (seconds - self.service_ewma)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait": round(self.max_wait, 4),
+            "service_ewma": round(self.service_ewma, 4) if self.service_ewma is not None else None,
+        }
+
+
+# ============================================
+# Per-client Rate Limiting
+# ============================================
+
+class ClientRateLimiter:
+    """Token bucket per client, with the least recently seen clients forgotten."""
+
+    def __init__(self, rate_per_minute: float, burst: float, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.rejected = 0
+
+    def check(self, client_id: str, cost: float = 1.0) -> None:
+        """Spend `cost` tokens or raise a 429 OverloadedError."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < cost:
+            self._buckets[client_id] = (tokens, now)
+            self.rejected += 1
+            raise OverloadedError("Rate limit exceeded", 429, (cost - tokens) / self.rate)
+        self._buckets[client_id] = (tokens - cost, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+
+# ============================================
+# Scheduler
+# ============================================
+
+def _model_limits() -> Dict[str, int]:
+    """Concurrency per model; roles sharing a model get the largest of their limits."""
+    limits: Dict[str, int] = {}
+    for model, limit in (
+        (PLANNER_MODEL, PLANNER_CONCURRENCY),
+        (BUILDER_MODEL, BUILDER_CONCURRENCY),
+        (VISION_MODEL, VISION_CONCURRENCY),
+    ):
+        limits[model] = max(limits.get(model, 0), limit)
+    return limits
+
+
+class Scheduler:
+    """Owns the per-model lanes and the client rate limiter."""
+
+    def __init__(self):
+        self._limits = _model_limits()
+        self.lanes: Dict[str, ModelLane] = {}
+        self.rate_limiter = ClientRateLimiter(CLIENT_RATE_PER_MINUTE, CLIENT_BURST)
+
+    def lane(self, model: str) -> ModelLane:
+        lane = self.lanes.get(model)
+        if lane is None:
+            limit = self._limits.get(model, DEFAULT_MODEL_CONCURRENCY)
+            lane = self.lanes[model] = ModelLane(model, limit, SCHEDULER_MAX_QUEUE)
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[None]:
+        """Hold one of `model`'s concurrency slots, using the request's priority and deadline."""
+        lane = self.lane(model)
+        await lane.acquire(current_priority.get(), current_deadline.get())
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            lane.record_service(time.monotonic() - start)
+            lane.release()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "models": {model: lane.stats() for model, lane in self.lanes.items()},
+            "rate_limited": self.rate_limiter.rejected,
+        }
+
+
+scheduler = Scheduler()
+
+
+def begin_request(client_id: str, priority: int = PRIORITY_DEFAULT, cost: float = 1.0) -> None:
+    """
+    Admit a request: enforce the client's rate limit and set its priority/deadline
+    for every model call made while handling it.
+    """
+    scheduler.rate_limiter.check(client_id, cost)
+    current_priority.set(priority)
+    current_deadline.set(time.monotonic() + REQUEST_DEADLINE_SECONDS)
@@ -0,0 +1,299 @@
+"""Approximate planner cache keyed on locally embedded prompts."""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_CAPACITY,
+    SEMANTIC_CACHE_DIM,
+    SEMANTIC_CACHE_PATH,
+)
+
+
+# Request boilerplate that carries no topic information
+_STOPWORDS = frozenset({
+    "a", "an", "the", "of", "on", "about", "for", "to", "in", "into", "and", "with",
+    "me", "my", "please", "can", "you", "i", "want", "need", "would", "like",
+    "create", "make", "generate", "build", "draw", "give", "show", "design",
+    "mind", "map", "mindmap", "maps", "mindmaps", "diagram", "chart", "overview",
+})
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Words keeping trailing symbols, so "c++" and "c#" stay apart from "c"
+_SYMBOL_TOKEN_RE = re.compile(r"[a-z0-9]+[+#]*")
+_ROMAN_RE = re.compile(r"m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})")
+
+NGRAM_SIZES = (3, 4)
+
+
+def topic_tokens(prompt: str) -> List[str]:
+    """Lower-case word tokens with request boilerplate removed."""
+    tokens = _TOKEN_RE.findall(prompt.casefold())
+    content = [token for token in tokens if token not in _STOPWORDS]
+    # A prompt made only of boilerplate still needs a stable embedding
+    return content or tokens
+
+
+def key_tokens(prompt: str) -> FrozenSet[str]:
+    """
+    Tokens two prompts must share exactly before one may answer the other.
+
+    Numbers, roman numerals and symbol-suffixed words ("World War 1" vs "2",
+    "World War I" vs "II", "C++" vs "C") change the topic while barely moving
+    the embedding. A lone "i" only counts after a topic word ("war i"), not
+    as the pronoun ("can i", "I want").
+    """
+    keys = set()
+    previous = ""
+    for token in _SYMBOL_TOKEN_RE.findall(prompt.casefold()):
+        if token.endswith(("+", "#")) or any(ch.isdigit() for ch in token):
+            keys.add(token)
+        elif _ROMAN_RE.fullmatch(token) and (token != "i" or (previous and previous not in _STOPWORDS)):
+            keys.add(token)
+        previous = token
+    return frozenset(keys)
+
+
+def embed_prompt(prompt: str, dim: int = SEMANTIC_CACHE_DIM) -> np.ndarray:
+    """
+    Embed a prompt as an L2-normalized hashed character n-gram vector.
+
+    Whole words and padded 3/4-grams are hashed (crc32) into `dim` signed
+    buckets, so no model or network call is needed and the result is
+    deterministic across processes.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in topic_tokens(prompt):
+        features = [f"w:{token}"]
+        padded = f" {token} "
+        for size in NGRAM_SIZES:
+            features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % dim] += sign
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class SemanticIndex:
+    """
+    Bounded brute-force cosine index over prompt embeddings.
+
+    Vectors live in one preallocated float32 matrix, so a lookup is a single
+    matrix-vector product. Once full, the least recently hit slot is reused.
+    Entries are partitioned by namespace (model + prompt version) so a change
+    of planner never serves stale specs, and a match must also have the same
+    key_tokens() as the query.
+    """
+
+    def __init__(
+        self,
+        capacity: int = SEMANTIC_CACHE_CAPACITY,
+        dim: int = SEMANTIC_CACHE_DIM,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        path: str = SEMANTIC_CACHE_PATH,
+        save_every: int = 25,
+    ):
+        self.capacity = capacity
+        self.dim = dim
+        self.threshold = threshold
+        self.path = path
+        self.save_every = save_every
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._namespaces: List[Optional[str]] = [None] * capacity
+        self._values: List[Optional[str]] = [None] * capacity
+        self._prompts: List[Optional[str]] = [None] * capacity
+        self._keys: List[FrozenSet[str]] = [frozenset()] * capacity
+        self._count = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_seconds = 0.0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _scores(self, query: np.ndarray, namespace: str) -> np.ndarray:
+        scores = self._vectors[:self._count] @ query
+        mask = np.fromiter(
+            (ns != namespace for ns in self._namespaces[:self._count]),
+            dtype=bool,
+            count=self._count,
+        )
+        scores[mask] = -1.0
+        return scores
+
+    def _best(self, scores: np.ndarray, keys: FrozenSet[str]) -> Optional[int]:
+        """Most similar slot above the threshold whose key tokens equal `keys`."""
+        candidates = np.flatnonzero(scores >= self.threshold)
+        for slot in candidates[np.argsort(-scores[candidates], kind="stable")]:
+            if self._keys[slot] == keys:
+                return int(slot)
+        return None
+
+    def lookup(self, prompt: str, namespace: str) -> Optional[Tuple[str, float]]:
+        """
+        Find the stored value for the most similar prompt.
+
+        Returns:
+            (value, similarity) if the best match clears the threshold, else None
+        """
+        start = time.perf_counter()
+        query = embed_prompt(prompt, self.dim)
+        keys = key_tokens(prompt)
+        with self._lock:
+            self.lookups += 1
+            result = None
+            if self._count:
+                scores = self._scores(query, namespace)
+                best = self._best(scores, keys)
+                if best is not None:
+                    self._last_used[best] = time.time()
+                    self.hits += 1
+                    result = (self._values[best], float(scores[best]))
+            self.lookup_seconds += time.perf_counter() - start
+            return result
+
+    def lookup_batch(self, prompts: List[str], namespace: str) -> List[Optional[Tuple[str, float]]]:
+        """Look up many prompts with one matrix-matrix product."""
+        if not prompts:
+            return []
+        start = time.perf_counter()
+        queries = np.stack([embed_prompt(prompt, self.dim) for prompt in prompts])
+        with self._lock:
+            self.lookups += len(prompts)
+            results: List[Optional[Tuple[str, float]]] = [None] * len(prompts)
+            if self._count:
+                scores = self._vectors[:self._count] @ queries.T
+                mask = np.array([ns != namespace for ns in self._namespaces[:self._count]], dtype=bool)
+                scores[mask, :] = -1.0
+                now = time.time()
+                for i, prompt in enumerate(prompts):
+                    slot = self._best(scores[:, i], key_tokens(prompt))
+                    if slot is not None:
+                        self._last_used[slot] = now
+                        self.hits += 1
+                        results[i] = (self._values[slot], float(scores[slot, i]))
+            self.lookup_seconds += time.perf_counter() - start
+            return results
+
+    def add(self, prompt: str, namespace: str, value: str) -> None:
+        """Store a value, replacing a near-identical prompt or the least recently used slot."""
+        if self._add(prompt, namespace, value):
+            self.save(self.path)
+
+    async def aadd(self, prompt: str, namespace: str, value: str) -> None:
+        """add() for async callers; the periodic save to disk runs off the event loop."""
+        if self._add(prompt, namespace, value):
+            await asyncio.get_running_loop().run_in_executor(None, self.save, self.path)
+
+    def _add(self, prompt: str, namespace: str, value: str) -> bool:
+        """Update the in-memory index; True when the caller should save it now."""
+        vector = embed_prompt(prompt, self.dim)
+        keys = key_tokens(prompt)
+        with self._lock:
+            slot = None
+            if self._count:
+                slot = self._best(self._scores(vector, namespace), keys)
+            if slot is None:
+                if self._count < self.capacity:
+                    slot = self._count
+                    self._count += 1
+                else:
+                    slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._last_used[slot] = time.time()
+            self._namespaces[slot] = namespace
+            self._values[slot] = value
+            self._prompts[slot] = prompt
+            self._keys[slot] = keys
+            self._unsaved += 1
+            if not self.path or self._unsaved < self.save_every:
+                return False
+            # Claimed by this caller, so concurrent adds don't queue duplicate saves
+            self._unsaved = 0
+            return True
+
+    def save(self, path: str) -> None:
+        """Persist the index as a .npz file (vectors plus JSON metadata)."""
+        with self._lock:
+            count = self._count
+            meta = {
+                "dim": self.dim,
+                "namespaces": self._namespaces[:count],
+                "values": self._values[:count],
+                "prompts": self._prompts[:count],
+            }
+            vectors = self._vectors[:count].copy()
+            last_used = self._last_used[:count].copy()
+            self._unsaved = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        # Saves may overlap when run in executor threads; they share tmp_path
+        with self._save_lock:
+            np.savez(tmp_path, vectors=vectors, last_used=last_used, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """Load entries saved by save(); mismatched dimensions are ignored."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("dim") != self.dim:
+                return
+            vectors = data["vectors"]
+            last_used = data["last_used"]
+        count = min(len(vectors), self.capacity)
+        # Keep the most recently used entries when the capacity shrank
+        keep = np.argsort(last_used)[::-1][:count]
+        with self._lock:
+            self._vectors[:count] = vectors[keep]
+            self._last_used[:count] = last_used[keep]
+            self._namespaces[:count] = [meta["namespaces"][i] for i in keep]
+            self._values[:count] = [meta["values"][i] for i in keep]
+            self._prompts[:count] = [meta["prompts"][i] for i in keep]
+            self._keys[:count] = [key_tokens(prompt or "") for prompt in self._prompts[:count]]
+            self._count = count
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "size": self._count,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "avg_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 4) if self.lookups else 0.0,
+            "memory_bytes": int(self._vectors.nbytes + self._last_used.nbytes),
+        }
+
+
+_index: Optional[SemanticIndex] = None
+
+
+def get_semantic_index() -> Optional[SemanticIndex]:
+    """Return the process-wide semantic index, or None when disabled."""
+    global _index
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    if _index is None:
+        _index = SemanticIndex()
+    return _index
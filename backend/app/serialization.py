@@ -0,0 +1,107 @@
+"""
+Single-pass JSON for API bodies: pydantic-core parses requests straight into
+models and serializes response models without validating them again.
+"""
+import functools
+import inspect
+from typing import Any, Callable, Dict, Type, TypeVar
+
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_json
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+# ============================================
+# Responses
+# ============================================
+
+class ModelResponse(Response):
+    """JSON response rendered by pydantic-core from a model (or any value it can serialize)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+class ModelRoute(APIRoute):
+    """
+    Route whose endpoint's model result is sent as-is.
+
+    FastAPI validates a returned model against `response_model` and then
+    serializes it (older releases dump it to dicts first). The models here are
+    built from already-validated parts, so the endpoint's return value is
+    wrapped in a ModelResponse instead; `response_model` still documents the
+    body in the OpenAPI schema. Anything else (dicts, Response objects) takes
+    FastAPI's normal path.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        # include_router() rebuilds routes from their endpoint; wrap it only once
+        if inspect.iscoroutinefunction(endpoint) and not getattr(endpoint, "sends_model", False):
+            call, status_code = endpoint, kwargs.get("status_code") or 200
+
+            @functools.wraps(call)
+            async def send_model(*args, **values):
+                result = await call(*args, **values)
+                if isinstance(result, BaseModel):
+                    return ModelResponse(result, status_code=status_code)
+                return result
+
+            send_model.sends_model = True
+            endpoint = send_model
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ============================================
+# Requests
+# ============================================
+
+def _inline_refs(schema: Any, definitions: Dict[str, Any]) -> Any:
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if ref is not None:
+            return _inline_refs(definitions[ref.rsplit("/", 1)[-1]], definitions)
+        return {key: _inline_refs(value, definitions) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [_inline_refs(item, definitions) for item in schema]
+    return schema
+
+
+def body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """`openapi_extra` documenting a json_body() parameter as the request body."""
+    schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline_refs(schema, schema.get("$defs", {}))}},
+        }
+    }
+
+
+def json_body(model: Type[M]) -> Callable[[Request], Any]:
+    """
+    Route dependency parsing the raw request body into `model` in one pass.
+
+    FastAPI decodes a body parameter with json.loads and then validates the
+    resulting dicts; model_validate_json does both in pydantic-core without
+    building the intermediate objects. Errors become the usual 422 response.
+
+        @router.post("/layout", openapi_extra=body_schema(LayoutRequest))
+        async def layout_spec(request: LayoutRequest = Depends(json_body(LayoutRequest))):
+    """
+    async def parse(request: Request) -> M:
+        body = await request.body()
+        try:
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            raise RequestValidationError(errors, body=body)
+
+    parse.__name__ = f"parse_{model.__name__}"
+    return parse
@@ -0,0 +1,79 @@
+"""Single-flight coalescing of concurrent identical coroutine calls."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Flight:
+    """One in-flight upstream call and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight coroutine between concurrent callers with the same key.
+
+    The first caller starts the work as a task; later callers with the same key
+    await that task and receive its result or exception. A caller being
+    cancelled only detaches it — the upstream task is cancelled once the last
+    waiter has gone away. Nothing is remembered after the task finishes, so
+    this is purely about concurrency, not caching.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running."""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() once per key across concurrent callers.
+
+        Args:
+            key: Identity of the call; callers with equal keys share one run
+            factory: Zero-argument callable returning the awaitable to run
+
+        Returns:
+            The shared result (or raises the shared exception)
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, key=key, flight=flight: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # shield() keeps one waiter's cancellation from cancelling the shared task
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Avoid "exception was never retrieved" warnings when every waiter left
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight(),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,292 @@
+"""Compact, token-budgeted encoding of a PlannerSpec for enhance prompts."""
+import json
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .config import SPEC_ID_ALIASES, ENHANCE_SPEC_TOKEN_BUDGET
+from .mermaid import build_tree
+from .models import PlannerSpec, NodeSpec, EdgeSpec, SpecOperation, SpecPatch
+from .semantic_cache import topic_tokens
+
+
+# Rough BPE proxy: short letter runs, digit groups and punctuation runs each cost ~1 token
+_ESTIMATE_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]+|\S")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the prompt tokens `text` costs, without a tokenizer."""
+    return len(_ESTIMATE_RE.findall(text))
+
+
+def _compact(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _node_dict(node: NodeSpec, aliases: Optional["IdAliases"]) -> Dict[str, Any]:
+    data = node.model_dump(exclude_none=True, exclude_defaults=True)
+    data["id"] = aliases.alias(node.id) if aliases else node.id
+    return data
+
+
+def _edge_dict(edge: EdgeSpec, aliases: Optional["IdAliases"]) -> Dict[str, Any]:
+    data = edge.model_dump(exclude_none=True, exclude_defaults=True)
+    if aliases:
+        data["source"] = aliases.alias(edge.source)
+        data["target"] = aliases.alias(edge.target)
+    return data
+
+
+# ============================================
+# ID Aliases
+# ============================================
+
+class IdAliases:
+    """
+    Short stand-ins ("n1", "n2", ...) for node IDs shown to the model.
+
+    IDs in the model's answer are mapped back with resolve(). A new ID the
+    model invents that happens to equal a real (hidden) ID is renamed, since
+    the model could not have meant the hidden node.
+    """
+
+    def __init__(self, ids: Iterable[str]):
+        self.forward: Dict[str, str] = {}
+        self.backward: Dict[str, str] = {}
+        for node_id in ids:
+            if node_id not in self.forward:
+                alias = f"n{len(self.forward) + 1}"
+                self.forward[node_id] = alias
+                self.backward[alias] = node_id
+        self._renamed: Dict[str, str] = {}
+
+    def alias(self, node_id: str) -> str:
+        return self.forward.get(node_id, node_id)
+
+    def resolve(self, node_id: Optional[str]) -> Optional[str]:
+        if node_id is None:
+            return None
+        if node_id in self.backward:
+            return self.backward[node_id]
+        if node_id in self.forward:
+            renamed = self._renamed.get(node_id)
+            if renamed is None:
+                suffix = 2
+                while f"{node_id}_{suffix}" in self.forward:
+                    suffix += 1
+                renamed = self._renamed[node_id] = f"{node_id}_{suffix}"
+            return renamed
+        return node_id
+
+    def decode_spec(self, spec: PlannerSpec) -> PlannerSpec:
+        """Map aliased IDs in a spec back to the real ones."""
+        return spec.model_copy(update={
+            "nodes": [node.model_copy(update={"id": self.resolve(node.id)}) for node in spec.nodes],
+            "edges": [
+                edge.model_copy(update={"source": self.resolve(edge.source), "target": self.resolve(edge.target)})
+                for edge in spec.edges
+            ],
+        })
+
+    def decode_patch(self, patch: SpecPatch) -> SpecPatch:
+        """Map aliased IDs in patch operations back to the real ones."""
+        operations: List[SpecOperation] = []
+        for operation in patch.operations:
+            update: Dict[str, Any] = {
+                "id": self.resolve(operation.id),
+                "source": self.resolve(operation.source),
+                "target": self.resolve(operation.target),
+            }
+            if operation.node is not None:
+                update["node"] = operation.node.model_copy(update={"id": self.resolve(operation.node.id)})
+            operations.append(operation.model_copy(update=update))
+        return patch.model_copy(update={"operations": operations})
+
+
+# ============================================
+# Prompt Encoding
+# ============================================
+
+class EncodedSpec:
+    """A spec rendered for a prompt, plus what is needed to read the answer back."""
+
+    def __init__(
+        self,
+        text: str,
+        aliases: Optional[IdAliases],
+        shown_ids: Optional[Set[str]] = None,
+        notes: str = ""
+    ):
+        self.text = text
+        self.aliases = aliases
+        # None when the whole map is shown
+        self.shown_ids = shown_ids
+        self.notes = notes
+        self.tokens = estimate_tokens(text)
+
+    @property
+    def partial(self) -> bool:
+        return self.shown_ids is not None
+
+    def decode_spec(self, original: PlannerSpec, enhanced: PlannerSpec) -> PlannerSpec:
+        """
+        Turn a full-protocol answer back into a complete spec.
+
+        With a partial view, nodes and edges the model never saw are carried
+        over from the original; everything inside the view comes from the answer.
+        """
+        if self.aliases:
+            enhanced = self.aliases.decode_spec(enhanced)
+        if self.shown_ids is None:
+            return enhanced
+
+        answered = {node.id: node for node in enhanced.nodes}
+        nodes: List[NodeSpec] = []
+        for node in original.nodes:
+            if node.id not in self.shown_ids:
+                nodes.append(node)
+            elif node.id in answered:
+                nodes.append(answered.pop(node.id))
+        nodes.extend(answered.values())
+
+        node_ids = {node.id for node in nodes}
+        edges: List[EdgeSpec] = []
+        seen = set()
+        kept = (
+            edge for edge in original.edges
+            if not (edge.source in self.shown_ids and edge.target in self.shown_ids)
+        )
+        for edge in list(kept) + list(enhanced.edges):
+            key = (edge.source, edge.target)
+            if key in seen or edge.source not in node_ids or edge.target not in node_ids:
+                continue
+            seen.add(key)
+            edges.append(edge)
+        return enhanced.model_copy(update={"nodes": nodes, "edges": edges})
+
+    def decode_patch(self, patch: SpecPatch) -> SpecPatch:
+        return self.aliases.decode_patch(patch) if self.aliases else patch
+
+
+_DEFAULTS_NOTE = 'Fields left out take their defaults (node "type": "default", edge "style": "solid").'
+
+
+def encode_spec(spec: PlannerSpec, aliases: bool = SPEC_ID_ALIASES) -> EncodedSpec:
+    """Minified spec with nulls and default values omitted and, optionally, short node IDs."""
+    id_aliases = IdAliases(node.id for node in spec.nodes) if aliases else None
+    data: Dict[str, Any] = {"title": spec.title, "central_topic": spec.central_topic}
+    data["nodes"] = [_node_dict(node, id_aliases) for node in spec.nodes]
+    data["edges"] = [_edge_dict(edge, id_aliases) for edge in spec.edges]
+    if spec.summary:
+        data["summary"] = spec.summary
+    return EncodedSpec(_compact(data), id_aliases, notes=_DEFAULTS_NOTE)
+
+
+def find_focus_node(spec: PlannerSpec, prompt: str, exclude: Optional[str] = None) -> Optional[str]:
+    """The node whose label (and, less strongly, description) best matches the prompt."""
+    wanted = set(topic_tokens(prompt))
+    best_id, best_score = None, 0.0
+    for node in spec.nodes:
+        if node.id == exclude:
+            continue
+        label = set(topic_tokens(node.label))
+        description = set(topic_tokens(node.description or ""))
+        score = 2 * len(wanted & label) + len(wanted & description)
+        if score > best_score:
+            best_id, best_score = node.id, score
+    return best_id
+
+
+def encode_focus_view(
+    spec: PlannerSpec,
+    prompt: str,
+    budget: int,
+    aliases: bool = SPEC_ID_ALIASES
+) -> Optional[EncodedSpec]:
+    """
+    Encode only the branch a 'focus' request is about.
+
+    Shows the path from the root to the best-matching node and as much of
+    that node's subtree as fits in `budget` tokens (breadth first). Every
+    other branch hanging off the path is reduced to its top node's ID, label
+    and size under "other_branches".
+
+    Returns:
+        The encoded view, or None if no node matches the prompt
+    """
+    root_id, children, nodes_by_id = build_tree(spec)
+    focus_id = find_focus_node(spec, prompt, exclude=root_id)
+    if root_id is None or focus_id is None:
+        return None
+
+    parents = {child: parent for parent, kids in children.items() for child in kids}
+    path = [focus_id]
+    while path[-1] != root_id:
+        path.append(parents[path[-1]])
+    path.reverse()
+
+    id_aliases = IdAliases(node.id for node in spec.nodes) if aliases else None
+
+    def subtree_size(node_id: str) -> int:
+        size, stack = 0, [node_id]
+        while stack:
+            size += 1
+            stack.extend(children[stack.pop()])
+        return size
+
+    on_path = set(path)
+    others = [
+        {"id": id_aliases.alias(child) if id_aliases else child, "label": nodes_by_id[child].label,
+         "nodes": subtree_size(child)}
+        for node_id in path[:-1] for child in children[node_id] if child not in on_path
+    ]
+
+    shown: List[str] = list(path)
+    used = estimate_tokens(_compact(others)) + sum(
+        estimate_tokens(_compact(_node_dict(nodes_by_id[node_id], id_aliases))) for node_id in path
+    )
+    queue = deque(children[focus_id])
+    while queue:
+        node_id = queue.popleft()
+        cost = estimate_tokens(_compact(_node_dict(nodes_by_id[node_id], id_aliases))) + 8  # plus its edge
+        if used + cost > budget:
+            break
+        used += cost
+        shown.append(node_id)
+        queue.extend(children[node_id])
+
+    shown_ids = set(shown)
+    data: Dict[str, Any] = {"title": spec.title, "central_topic": spec.central_topic}
+    data["nodes"] = [_node_dict(nodes_by_id[node_id], id_aliases) for node_id in shown]
+    data["edges"] = [
+        _edge_dict(edge, id_aliases) for edge in spec.edges
+        if edge.source in shown_ids and edge.target in shown_ids
+    ]
+    if others:
+        data["other_branches"] = others
+    hidden = len(nodes_by_id) - len(shown_ids)
+    notes = (
+        f"{_DEFAULTS_NOTE} Only the branch relevant to the request is shown; {hidden} other nodes are "
+        f"hidden. \"other_branches\" lists the top node of each hidden branch and its size: you may "
+        f"connect to those IDs but do not repeat, change or remove anything that is not shown."
+    )
+    return EncodedSpec(_compact(data), id_aliases, shown_ids=shown_ids, notes=notes)
+
+
+def encode_for_enhance(
+    spec: PlannerSpec,
+    enhance_mode: str,
+    enhance_prompt: str,
+    budget: int = ENHANCE_SPEC_TOKEN_BUDGET
+) -> EncodedSpec:
+    """
+    Encode the current map for an enhance prompt.
+
+    The whole map is sent compactly unless it exceeds `budget` tokens and the
+    mode is 'focus', in which case only the relevant branch is sent. Other
+    modes need every node, so they always get the whole map.
+    """
+    encoded = encode_spec(spec)
+    if enhance_mode != "focus" or budget <= 0 or encoded.tokens <= budget:
+        return encoded
+    return encode_focus_view(spec, enhance_prompt, budget) or encoded
@@ -0,0 +1,699 @@
+"""Map persistence: content-addressed specs, delta version history and paginated listing."""
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from .config import (
+    MAP_STORE_BACKEND,
+    MAP_STORE_PATH,
+    MAP_CHECKPOINT_INTERVAL,
+    MAP_PAGE_SIZE,
+    MAP_MAX_PAGE_SIZE,
+)
+from .diff import diff_specs, apply_delta
+from .models import PlannerSpec, SpecDelta, MapSummary, MapVersionInfo
+
+
+# Deltas are only kept when they are smaller than this share of the compressed full spec
+MAX_DELTA_RATIO = 0.5
+
+# Reconstructed latest specs kept per process, so saving a version does not replay deltas
+HEAD_CACHE_SIZE = 128
+
+
+class MapNotFoundError(LookupError):
+    """The map (or version) does not exist."""
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that this store did not issue."""
+
+
+# ============================================
+# Encoding
+# ============================================
+
+def canonical_json(spec: PlannerSpec) -> bytes:
+    """Compact JSON in field declaration order; equal specs give equal bytes."""
+    return spec.model_dump_json().encode("utf-8")
+
+
+def spec_address(spec: PlannerSpec) -> str:
+    """Content address of a spec: SHA-256 of its canonical JSON."""
+    return hashlib.sha256(canonical_json(spec)).hexdigest()
+
+
+def encode_spec(spec: PlannerSpec) -> bytes:
+    return zlib.compress(canonical_json(spec), 6)
+
+
+def decode_spec(body: bytes) -> PlannerSpec:
+    return PlannerSpec.model_validate_json(zlib.decompress(body))
+
+
+def encode_delta(delta: SpecDelta) -> bytes:
+    """Forward-only delta: old values of modified fields and the unchanged count are dropped."""
+    raw = delta.model_dump_json(
+        exclude={"modified_nodes": {"__all__": {"previous"}}, "unchanged_nodes": True},
+        exclude_defaults=True,
+    )
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def decode_delta(body: bytes) -> SpecDelta:
+    data = json.loads(zlib.decompress(body))
+    for change in data.get("modified_nodes", ()):
+        change["previous"] = {}
+    return SpecDelta.model_validate(data)
+
+
+def encode_cursor(values: Tuple[Any, ...]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _cursor_value_ok(value: Any, kind: type) -> bool:
+    if isinstance(value, bool):
+        return False
+    if kind is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, kind)
+
+
+def decode_cursor(cursor: str, shape: Tuple[type, ...]) -> Tuple[Any, ...]:
+    """
+    Decode a cursor from encode_cursor(), checking it holds one value of each
+    type in `shape` (float also accepts int), so a forged or truncated cursor
+    is rejected here rather than failing inside a query.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != len(shape)
+        or not all(_cursor_value_ok(value, kind) for value, kind in zip(values, shape))
+    ):
+        raise InvalidCursorError("Invalid cursor")
+    return tuple(values)
+
+
+def _summary(row: Dict[str, Any]) -> MapSummary:
+    return MapSummary(
+        id=row["id"],
+        user_id=row["user_id"],
+        title=row["title"],
+        is_public=bool(row["is_public"]),
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+        head_version=row["head_version"],
+        spec_hash=row["head_hash"],
+        node_count=row["node_count"],
+    )
+
+
+def _version_info(row: Dict[str, Any]) -> MapVersionInfo:
+    return MapVersionInfo(
+        version=row["version"],
+        spec_hash=row["spec_hash"],
+        storage="checkpoint" if row["delta"] is None else "delta",
+        stored_bytes=row["stored_bytes"],
+        summary=row["summary"],
+        created_at=row["created_at"],
+    )
+
+
+# ============================================
+# Versioned Store
+# ============================================
+
+class MapStore(ABC):
+    """
+    Versioned map storage on top of a handful of backend primitives.
+
+    Specs are stored once per content address and shared by every version
+    (of any map) with that content. Versions are numbered from 1 per map;
+    each is either a checkpoint, which references a full spec, or a delta
+    against the version before it. A checkpoint is written at least every
+    `checkpoint_interval` versions, whenever the delta would not be much
+    smaller than the spec, and whenever replaying the delta does not give
+    back the exact spec. Loading any version therefore costs one spec read
+    plus at most `checkpoint_interval - 1` delta applications.
+    """
+
+    name = "base"
+
+    def __init__(self, checkpoint_interval: int = MAP_CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self._heads: "OrderedDict[str, Tuple[int, PlannerSpec]]" = OrderedDict()
+        self._heads_lock = threading.Lock()
+
+    # Backend primitives
+
+    @abstractmethod
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Serialize writers; everything inside commits or rolls back together."""
+
+    @abstractmethod
+    def _get_map(self, map_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def _put_map(self, row: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def _delete_map(self, map_id: str) -> bool:
+        """Remove the map, its versions and the specs nothing else references."""
+
+    @abstractmethod
+    def _has_spec(self, spec_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _put_spec(self, spec_hash: str, body: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def _get_spec(self, spec_hash: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def _add_version(self, row: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def _get_version(self, map_id: str, version: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def _version_chain(self, map_id: str, version: int) -> List[Dict[str, Any]]:
+        """Rows from the last checkpoint at or before `version` up to `version`, oldest first."""
+
+    @abstractmethod
+    def _list_maps(self, user_id: Optional[str], after: Optional[Tuple[float, str]], limit: int) -> List[Dict[str, Any]]:
+        """A user's maps (or every public map when None) ordered by (updated_at, id) descending, strictly after `after`."""
+
+    @abstractmethod
+    def _list_versions(self, map_id: str, before: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """Versions in descending order, strictly below `before`."""
+
+    @abstractmethod
+    def _get_thumbnail(self, spec_hash: str, fmt: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def _put_thumbnail(self, spec_hash: str, fmt: str, body: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    # Versioning
+
+    def _remember_head(self, map_id: str, version: int, spec: PlannerSpec) -> None:
+        with self._heads_lock:
+            self._heads[map_id] = (version, spec)
+            self._heads.move_to_end(map_id)
+            while len(self._heads) > HEAD_CACHE_SIZE:
+                self._heads.popitem(last=False)
+
+    def _reconstruct(self, map_id: str, version: int) -> PlannerSpec:
+        with self._heads_lock:
+            head = self._heads.get(map_id)
+        if head is not None and head[0] == version:
+            return head[1]
+        chain = self._version_chain(map_id, version)
+        if not chain or chain[-1]["version"] != version:
+            raise MapNotFoundError(f"Map {map_id} has no version {version}")
+        spec = decode_spec(self._get_spec(chain[0]["spec_hash"]))
+        for row in chain[1:]:
+            spec = apply_delta(spec, decode_delta(row["delta"]))
+        return spec
+
+    def _write_version(
+        self,
+        map_row: Optional[Dict[str, Any]],
+        map_id: str,
+        spec: PlannerSpec,
+        mermaid_syntax: Optional[str],
+        summary: Optional[str],
+        now: float
+    ) -> Dict[str, Any]:
+        """Store `spec` as the next version of the map; returns the version row."""
+        spec_hash = spec_address(spec)
+        version = (map_row["head_version"] if map_row else 0) + 1
+        row = {
+            "map_id": map_id,
+            "version": version,
+            "spec_hash": spec_hash,
+            "delta": None,
+            "stored_bytes": 0,
+            "mermaid_syntax": mermaid_syntax,
+            "summary": summary,
+            "created_at": now,
+        }
+        if self._has_spec(spec_hash):
+            return row
+
+        full = encode_spec(spec)
+        since_checkpoint = version - map_row["checkpoint_version"] if map_row else version
+        if map_row is not None and since_checkpoint < self.checkpoint_interval:
+            head = self._reconstruct(map_id, map_row["head_version"])
+            delta = diff_specs(head, spec)
+            body = encode_delta(delta)
+            # Only keep deltas that are worth it and replay to exactly this spec
+            if len(body) <= len(full) * MAX_DELTA_RATIO and spec_address(apply_delta(head, delta)) == spec_hash:
+                row["delta"] = body
+                row["stored_bytes"] = len(body)
+                return row
+
+        self._put_spec(spec_hash, full)
+        row["stored_bytes"] = len(full)
+        return row
+
+    # Public API
+
+    def create_map(
+        self,
+        user_id: str,
+        title: str,
+        spec: PlannerSpec,
+        mermaid_syntax: Optional[str] = None,
+        is_public: bool = False
+    ) -> Tuple[MapSummary, MapVersionInfo]:
+        """Save a new map with `spec` as version 1."""
+        map_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction():
+            version = self._write_version(None, map_id, spec, mermaid_syntax, None, now)
+            map_row = {
+                "id": map_id,
+                "user_id": user_id,
+                "title": title,
+                "is_public": int(is_public),
+                "created_at": now,
+                "updated_at": now,
+                "head_version": 1,
+                "head_hash": version["spec_hash"],
+                "checkpoint_version": 1,
+                "node_count": len(spec.nodes),
+            }
+            self._put_map(map_row)
+            self._add_version(version)
+        self._remember_head(map_id, 1, spec)
+        return _summary(map_row), _version_info(version)
+
+    def save_version(
+        self,
+        map_id: str,
+        spec: PlannerSpec,
+        mermaid_syntax: Optional[str] = None,
+        summary: Optional[str] = None,
+        title: Optional[str] = None
+    ) -> Tuple[MapSummary, MapVersionInfo, bool]:
+        """
+        Save `spec` as the map's next version.
+
+        Returns:
+            (map, version, deduplicated) where deduplicated means the spec equals
+            the latest version, which is returned instead of adding a new one
+        """
+        now = time.time()
+        with self._transaction():
+            map_row = self._get_map(map_id)
+            if map_row is None:
+                raise MapNotFoundError(f"Map {map_id} not found")
+            if title is not None:
+                map_row["title"] = title
+            map_row["updated_at"] = now
+
+            if spec_address(spec) == map_row["head_hash"]:
+                self._put_map(map_row)
+                version = self._get_version(map_id, map_row["head_version"])
+                return _summary(map_row), _version_info(version), True
+
+            version = self._write_version(map_row, map_id, spec, mermaid_syntax, summary, now)
+            map_row["head_version"] = version["version"]
+            map_row["head_hash"] = version["spec_hash"]
+            map_row["node_count"] = len(spec.nodes)
+            if version["delta"] is None:
+                map_row["checkpoint_version"] = version["version"]
+            self._add_version(version)
+            self._put_map(map_row)
+        self._remember_head(map_id, version["version"], spec)
+        return _summary(map_row), _version_info(version), False
+
+    def load_version(
+        self,
+        map_id: str,
+        version: Optional[int] = None
+    ) -> Tuple[MapSummary, MapVersionInfo, PlannerSpec, Optional[str]]:
+        """
+        Load a map at `version` (default: the latest).
+
+        Returns:
+            (map, version info, spec, mermaid syntax)
+        """
+        map_row = self._get_map(map_id)
+        if map_row is None:
+            raise MapNotFoundError(f"Map {map_id} not found")
+        number = map_row["head_version"] if version is None else version
+        row = self._get_version(map_id, number)
+        if row is None:
+            raise MapNotFoundError(f"Map {map_id} has no version {number}")
+        spec = self._reconstruct(map_id, number)
+        if number == map_row["head_version"]:
+            self._remember_head(map_id, number, spec)
+        return _summary(map_row), _version_info(row), spec, row["mermaid_syntax"]
+
+    def get_map(self, map_id: str) -> MapSummary:
+        """A map's summary (owner, visibility, head version) without loading any version."""
+        map_row = self._get_map(map_id)
+        if map_row is None:
+            raise MapNotFoundError(f"Map {map_id} not found")
+        return _summary(map_row)
+
+    def spec_hash(self, map_id: str, version: Optional[int] = None) -> str:
+        """Content address of a map's spec at `version` (default: the latest), without loading it."""
+        map_row = self._get_map(map_id)
+        if map_row is None:
+            raise MapNotFoundError(f"Map {map_id} not found")
+        if version is None or version == map_row["head_version"]:
+            return map_row["head_hash"]
+        row = self._get_version(map_id, version)
+        if row is None:
+            raise MapNotFoundError(f"Map {map_id} has no version {version}")
+        return row["spec_hash"]
+
+    def list_maps(
+        self,
+        user_id: Optional[str],
+        cursor: Optional[str] = None,
+        limit: int = MAP_PAGE_SIZE
+    ) -> Tuple[List[MapSummary], Optional[str]]:
+        """
+        One page of a user's maps, most recently updated first.
+
+        Args:
+            user_id: Owner whose maps to list; None lists public maps of every owner
+
+        Returns:
+            (maps, cursor for the next page or None on the last page)
+        """
+        limit = max(1, min(limit, MAP_MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, (float, str)) if cursor else None
+        rows = self._list_maps(user_id, after, limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor((rows[-1]["updated_at"], rows[-1]["id"]))
+        return [_summary(row) for row in rows], next_cursor
+
+    def list_versions(
+        self,
+        map_id: str,
+        cursor: Optional[str] = None,
+        limit: int = MAP_PAGE_SIZE
+    ) -> Tuple[List[MapVersionInfo], Optional[str]]:
+        """One page of a map's versions, newest first (content is loaded with load_version)."""
+        if self._get_map(map_id) is None:
+            raise MapNotFoundError(f"Map {map_id} not found")
+        limit = max(1, min(limit, MAP_MAX_PAGE_SIZE))
+        before = decode_cursor(cursor, (int,))[0] if cursor else None
+        rows = self._list_versions(map_id, before, limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor((rows[-1]["version"],))
+        return [_version_info(row) for row in rows], next_cursor
+
+    def get_thumbnail(self, spec_hash: str, fmt: str) -> Optional[bytes]:
+        """A rendered preview of the spec at `spec_hash`, or None when it has not been rendered."""
+        return self._get_thumbnail(spec_hash, fmt)
+
+    def put_thumbnail(self, spec_hash: str, fmt: str, body: bytes) -> None:
+        """
+        Keep a rendered preview; it is removed once no version of any map has
+        that spec. A render finishing after the last such version was deleted
+        is dropped rather than stored.
+        """
+        self._put_thumbnail(spec_hash, fmt, body)
+
+    def delete_map(self, map_id: str) -> bool:
+        with self._transaction():
+            deleted = self._delete_map(map_id)
+        with self._heads_lock:
+            self._heads.pop(map_id, None)
+        return deleted
+
+
+# ============================================
+# SQLite Backend
+# ============================================
+
+class SQLiteMapStore(MapStore):
+    """
+    Local stand-in for the hosted database: four tables in one SQLite file.
+
+        maps          one row per map, with its head version and hash
+        map_versions  (map_id, version) → spec hash plus a delta or NULL for checkpoints
+        specs         compressed canonical spec JSON by content address
+        thumbnails    rendered previews by (spec hash, format)
+
+    Listing uses keyset pagination over covering indexes, so every page
+    costs the same regardless of how deep into the gallery it is.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = MAP_STORE_PATH, checkpoint_interval: int = MAP_CHECKPOINT_INTERVAL):
+        super().__init__(checkpoint_interval)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS maps ("
+            "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, title TEXT NOT NULL, "
+            "is_public INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "head_version INTEGER NOT NULL, head_hash TEXT NOT NULL, "
+            "checkpoint_version INTEGER NOT NULL, node_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS map_versions ("
+            "map_id TEXT NOT NULL, version INTEGER NOT NULL, spec_hash TEXT NOT NULL, "
+            "delta BLOB, stored_bytes INTEGER NOT NULL, mermaid_syntax TEXT, summary TEXT, "
+            "created_at REAL NOT NULL, PRIMARY KEY (map_id, version)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS specs ("
+            "hash TEXT PRIMARY KEY, body BLOB NOT NULL, created_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            "spec_hash TEXT NOT NULL, format TEXT NOT NULL, body BLOB NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (spec_hash, format)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_maps_user ON maps(user_id, updated_at DESC, id DESC)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_maps_public ON maps(updated_at DESC, id DESC) WHERE is_public = 1"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_versions_checkpoint ON map_versions(map_id, version) WHERE delta IS NULL"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_versions_spec ON map_versions(spec_hash) WHERE delta IS NULL"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_versions_any_spec ON map_versions(spec_hash)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _get_map(self, map_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM maps WHERE id = ?", (map_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def _put_map(self, row: Dict[str, Any]) -> None:
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO maps ({columns}) VALUES ({placeholders})", tuple(row.values()))
+
+    def _delete_map(self, map_id: str) -> bool:
+        with self._lock:
+            hashes = [
+                row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT spec_hash FROM map_versions WHERE map_id = ? AND delta IS NULL", (map_id,)
+                )
+            ]
+            rendered = [
+                row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT spec_hash FROM map_versions WHERE map_id = ?", (map_id,)
+                )
+            ]
+            self._conn.execute("DELETE FROM map_versions WHERE map_id = ?", (map_id,))
+            deleted = self._conn.execute("DELETE FROM maps WHERE id = ?", (map_id,)).rowcount > 0
+            self._conn.executemany(
+                "DELETE FROM specs WHERE hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM map_versions WHERE spec_hash = specs.hash AND delta IS NULL)",
+                [(spec_hash,) for spec_hash in hashes],
+            )
+            self._conn.executemany(
+                "DELETE FROM thumbnails WHERE spec_hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM map_versions WHERE spec_hash = thumbnails.spec_hash)",
+                [(spec_hash,) for spec_hash in rendered],
+            )
+        return deleted
+
+    def _has_spec(self, spec_hash: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM specs WHERE hash = ?", (spec_hash,)).fetchone() is not None
+
+    def _put_spec(self, spec_hash: str, body: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO specs (hash, body, created_at) VALUES (?, ?, ?)",
+                (spec_hash, body, time.time()),
+            )
+
+    def _get_spec(self, spec_hash: str) -> bytes:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM specs WHERE hash = ?", (spec_hash,)).fetchone()
+        if row is None:
+            raise MapNotFoundError(f"Spec {spec_hash} is missing from the store")
+        return row[0]
+
+    def _add_version(self, row: Dict[str, Any]) -> None:
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock:
+            self._conn.execute(f"INSERT INTO map_versions ({columns}) VALUES ({placeholders})", tuple(row.values()))
+
+    def _get_version(self, map_id: str, version: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM map_versions WHERE map_id = ? AND version = ?", (map_id, version)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _version_chain(self, map_id: str, version: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, spec_hash, delta FROM map_versions "
+                "WHERE map_id = ? AND version <= ? AND version >= ("
+                "SELECT MAX(version) FROM map_versions WHERE map_id = ? AND version <= ? AND delta IS NULL"
+                ") ORDER BY version",
+                (map_id, version, map_id, version),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _list_maps(self, user_id: Optional[str], after: Optional[Tuple[float, str]], limit: int) -> List[Dict[str, Any]]:
+        where, params = ("user_id = ?", [user_id]) if user_id is not None else ("is_public = 1", [])
+        if after is not None:
+            where += " AND (updated_at, id) < (?, ?)"
+            params += [after[0], after[1]]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM maps WHERE {where} ORDER BY updated_at DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _list_versions(self, map_id: str, before: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT map_id, version, spec_hash, delta IS NOT NULL AS is_delta, stored_bytes, summary, created_at "
+                "FROM map_versions WHERE map_id = ? AND version < ? ORDER BY version DESC LIMIT ?",
+                (map_id, before if before is not None else 2**62, limit),
+            ).fetchall()
+        # Listing never needs the delta itself, only whether there is one
+        return [{**dict(row), "delta": b"" if row["is_delta"] else None} for row in rows]
+
+    def _get_thumbnail(self, spec_hash: str, fmt: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM thumbnails WHERE spec_hash = ? AND format = ?", (spec_hash, fmt)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _put_thumbnail(self, spec_hash: str, fmt: str, body: bytes) -> None:
+        with self._lock:
+            # Checked in the same statement, so it cannot interleave with delete_map()'s cleanup
+            self._conn.execute(
+                "INSERT OR REPLACE INTO thumbnails (spec_hash, format, body, created_at) "
+                "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM map_versions WHERE spec_hash = ?)",
+                (spec_hash, fmt, body, time.time(), spec_hash),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            maps, versions = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM maps), (SELECT COUNT(*) FROM map_versions)"
+            ).fetchone()
+            checkpoints, delta_bytes = self._conn.execute(
+                "SELECT SUM(delta IS NULL), COALESCE(SUM(LENGTH(delta)), 0) FROM map_versions"
+            ).fetchone()
+            specs, spec_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM specs"
+            ).fetchone()
+            thumbnails, thumbnail_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM thumbnails"
+            ).fetchone()
+        return {
+            "backend": self.name,
+            "maps": maps,
+            "versions": versions,
+            "checkpoints": checkpoints or 0,
+            "specs": specs,
+            "spec_bytes": spec_bytes,
+            "delta_bytes": delta_bytes,
+            "thumbnails": thumbnails,
+            "thumbnail_bytes": thumbnail_bytes,
+        }
+
+
+# MAP_STORE_BACKEND values and the stores they select
+MAP_STORE_BACKENDS: Dict[str, Type[MapStore]] = {
+    SQLiteMapStore.name: SQLiteMapStore,
+}
+
+_store: Optional[MapStore] = None
+
+
+def get_map_store() -> MapStore:
+    """Return this process's map store for MAP_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        backend = MAP_STORE_BACKENDS.get(MAP_STORE_BACKEND)
+        if backend is None:
+            raise ValueError(
+                f"MAP_STORE_BACKEND must be one of {', '.join(sorted(MAP_STORE_BACKENDS))} (got '{MAP_STORE_BACKEND}')"
+            )
+        _store = backend()
+    return _store
@@ -0,0 +1,127 @@
+"""Incremental parsing of streamed planner output and Server-Sent Events helpers."""
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+
+# Top-level PlannerSpec arrays whose elements are emitted as soon as they close
+STREAMED_ARRAYS = {"nodes": "node", "edges": "edge"}
+
+
+class SpecStreamParser:
+    """
+    Scan a PlannerSpec JSON document as it arrives and surface each complete
+    node/edge object without waiting for the rest of the completion.
+
+    Text before the first '{' (prose, markdown fences) is skipped. The parser
+    only tracks nesting and string state, so each character is inspected once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string: Optional[Tuple[int, int]] = None
+        self._pending_key: Optional[str] = None
+        self._array_kind: Optional[str] = None
+        self._element_start = -1
+        self.started = False
+        self.finished = False
+
+    def feed(self, chunk: str) -> Iterator[Tuple[str, dict]]:
+        """
+        Add a chunk of model output.
+
+        Yields:
+            (kind, payload) tuples where kind is 'node' or 'edge' and payload
+            is the decoded JSON object
+        """
+        self.buffer += chunk
+        buffer = self.buffer
+        stack = self._stack
+
+        for i in range(self._pos, len(buffer)):
+            if self.finished:
+                break
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = (self._string_start, i + 1)
+                continue
+
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                    stack.append("{")
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == ":":
+                # A key of the top-level object
+                if len(stack) == 1 and self._last_string is not None:
+                    start, end = self._last_string
+                    try:
+                        self._pending_key = json.loads(buffer[start:end])
+                    except json.JSONDecodeError:
+                        self._pending_key = None
+            elif c == "{":
+                if len(stack) == 2 and stack[1] == "[" and self._array_kind:
+                    self._element_start = i
+                stack.append("{")
+            elif c == "[":
+                if len(stack) == 1:
+                    self._array_kind = STREAMED_ARRAYS.get(self._pending_key)
+                stack.append("[")
+            elif c in "}]":
+                if stack:
+                    stack.pop()
+                if c == "}" and len(stack) == 2 and self._element_start != -1:
+                    element = buffer[self._element_start:i + 1]
+                    self._element_start = -1
+                    try:
+                        payload = json.loads(element)
+                    except json.JSONDecodeError:
+                        payload = None
+                    if isinstance(payload, dict):
+                        yield self._array_kind, payload
+                elif c == "]" and len(stack) == 1:
+                    self._array_kind = None
+                elif not stack:
+                    self.finished = True
+
+        self._pos = len(buffer)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one Server-Sent Event with a JSON payload.
+
+    `data` may hold pydantic models anywhere inside it; they are serialized
+    by pydantic-core directly rather than dumped to dicts first.
+    """
+    return format_sse_json(event, to_json(data).decode("utf-8"))
+
+
+def format_sse_json(event: str, payload: str) -> str:
+    """Format one Server-Sent Event whose payload is already encoded JSON."""
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Stop reverse proxies (nginx, Vercel edge) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
@@ -0,0 +1,244 @@
+"""Gallery thumbnails: compact SVG/PNG previews of a PlannerSpec rendered without a browser."""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Tuple
+from xml.sax.saxutils import escape
+
+from .config import THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, THUMBNAIL_FORMATS, THUMBNAIL_WORKERS
+from .layout import compute_layout
+from .metrics import stage
+from .models import PlannerSpec
+from .singleflight import SingleFlight
+from .storage import MapStore
+
+
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+# Palette of frontend/tailwind.config.js
+BACKGROUND = "#2D241E"  # espresso
+EDGE_COLOR = "#9E7E3C"  # gold-dark
+NODE_FILLS = {"central": "#C5A059", "primary": "#3E3228"}  # gold, espresso-light
+NODE_FILL = "#DBCBB6"  # parchment
+LABEL_COLORS = {"central": "#2D241E", "primary": "#DBCBB6"}
+LABEL_COLOR = "#2D241E"
+
+PADDING = 12
+# Label size in layout units (nodes are 120 high); labels smaller than this on screen are left out
+LABEL_SIZE = 26
+MIN_LABEL_PX = 6.0
+# Average glyph width as a share of the font size, for truncating labels to their box
+GLYPH_WIDTH = 0.55
+# PNGs are drawn at this multiple of their size and downsampled, which anti-aliases them
+PNG_SUPERSAMPLE = 2
+
+# (x, y, width, height, fill, label, label colour) of a node, in thumbnail pixels
+NodeShape = Tuple[float, float, float, float, str, str, str]
+# (x1, y1, x2, y2) from parent to child, in thumbnail pixels
+EdgeShape = Tuple[float, float, float, float]
+
+
+# ============================================
+# Rendering
+# ============================================
+
+def _fit_label(label: str, width: float, font_size: float) -> str:
+    fits = int(width / (font_size * GLYPH_WIDTH))
+    if len(label) <= fits:
+        return label
+    return label[:max(0, fits - 1)].rstrip() + "…" if fits > 1 else ""
+
+
+def thumbnail_shape(
+    spec: PlannerSpec,
+    width: int,
+    height: int
+) -> Tuple[List[NodeShape], List[EdgeShape], float, float]:
+    """
+    Lay the spec out (same tidy tree as /layout) and scale it to fit the thumbnail, centred.
+
+    Returns:
+        (nodes, edges, corner radius, label font size or 0 when labels would be unreadable)
+    """
+    layout = compute_layout(spec)
+    if not layout.boxes:
+        return [], [], 0.0, 0.0
+    scale = min((width - 2 * PADDING) / layout.width, (height - 2 * PADDING) / layout.height)
+    left = (width - layout.width * scale) / 2
+    top = (height - layout.height * scale) / 2
+    font_size = LABEL_SIZE * scale if LABEL_SIZE * scale >= MIN_LABEL_PX else 0.0
+
+    nodes_by_id = {node.id: node for node in spec.nodes}
+    boxes = {}
+    nodes = []
+    for node_id, (x, y, w, h) in layout.boxes.items():
+        box = (left + x * scale, top + y * scale, w * scale, h * scale)
+        boxes[node_id] = box
+        node_type = nodes_by_id[node_id].type
+        label = _fit_label(nodes_by_id[node_id].label, box[2] * 0.9, font_size) if font_size else ""
+        nodes.append((*box, NODE_FILLS.get(node_type, NODE_FILL), label, LABEL_COLORS.get(node_type, LABEL_COLOR)))
+
+    edges = []
+    for edge in spec.edges:
+        source, target = boxes.get(edge.source), boxes.get(edge.target)
+        if source is None or target is None:
+            continue
+        # Right-hand middle of the parent to left-hand middle of the child, as drawn by React Flow
+        edges.append((source[0] + source[2], source[1] + source[3] / 2, target[0], target[1] + target[3] / 2))
+    return nodes, edges, 8 * scale, font_size
+
+
+def _num(value: float) -> str:
+    """Shortest one-decimal form of a coordinate ("12" rather than "12.0")."""
+    text = f"{value:.1f}"
+    return text[:-2] if text.endswith(".0") else text
+
+
+def render_svg(spec: PlannerSpec, width: int = THUMBNAIL_WIDTH, height: int = THUMBNAIL_HEIGHT) -> bytes:
+    """A self-contained SVG preview (no scripts, embedded fonts or external references)."""
+    nodes, edges, radius, font_size = thumbnail_shape(spec, width, height)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<rect width="100%" height="100%" fill="{BACKGROUND}"/>',
+    ]
+    if edges:
+        # One path for all edges: horizontal-tangent curves like React Flow's bezier edges
+        path = "".join(
+            f"M{_num(x1)} {_num(y1)}C{_num((x1 + x2) / 2)} {_num(y1)} {_num((x1 + x2) / 2)} {_num(y2)} {_num(x2)} {_num(y2)}"
+            for x1, y1, x2, y2 in edges
+        )
+        parts.append(f'<path d="{path}" fill="none" stroke="{EDGE_COLOR}" stroke-width="{_num(max(1.0, radius / 4))}"/>')
+    # Nodes grouped by fill; once corners are too small to see, each fill is a single path
+    for fill in dict.fromkeys(node[4] for node in nodes):
+        boxes = [(x, y, w, h) for x, y, w, h, node_fill, _, _ in nodes if node_fill == fill]
+        if radius >= 0.5:
+            parts.append(f'<g fill="{fill}">')
+            parts.extend(
+                f'<rect x="{_num(x)}" y="{_num(y)}" width="{_num(w)}" height="{_num(h)}" rx="{_num(radius)}"/>'
+                for x, y, w, h in boxes
+            )
+            parts.append("</g>")
+        else:
+            path = "".join(f"M{_num(x)} {_num(y)}h{_num(w)}v{_num(h)}h-{_num(w)}z" for x, y, w, h in boxes)
+            parts.append(f'<path d="{path}" fill="{fill}"/>')
+    if font_size:
+        parts.append(f'<g font-family="Georgia,serif" font-size="{_num(font_size)}" text-anchor="middle">')
+        for x, y, w, h, _, label, color in nodes:
+            if label:
+                parts.append(
+                    f'<text x="{_num(x + w / 2)}" y="{_num(y + h / 2 + font_size / 3)}" fill="{color}">{escape(label)}</text>'
+                )
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "".join(parts).encode("utf-8")
+
+
+def _bezier(x1: float, y1: float, x2: float, y2: float, steps: int) -> List[Tuple[float, float]]:
+    mid = (x1 + x2) / 2
+    points = []
+    for i in range(steps + 1):
+        t = i / steps
+        u = 1 - t
+        points.append((
+            u ** 3 * x1 + 3 * u * u * t * mid + 3 * u * t * t * mid + t ** 3 * x2,
+            u ** 3 * y1 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t ** 3 * y2,
+        ))
+    return points
+
+
+def render_png(spec: PlannerSpec, width: int = THUMBNAIL_WIDTH, height: int = THUMBNAIL_HEIGHT) -> bytes:
+    """The same preview as render_svg(), rasterized with Pillow."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    factor = PNG_SUPERSAMPLE
+    nodes, edges, radius, font_size = thumbnail_shape(spec, width * factor, height * factor)
+    image = Image.new("RGB", (width * factor, height * factor), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    line_width = max(factor, round(radius / 4))
+    for x1, y1, x2, y2 in edges:
+        draw.line(_bezier(x1, y1, x2, y2, 8), fill=EDGE_COLOR, width=line_width)
+    for x, y, w, h, fill, _, _ in nodes:
+        draw.rounded_rectangle((x, y, x + w, y + h), radius=radius, fill=fill)
+    if font_size:
+        font = ImageFont.load_default(size=font_size)
+        for x, y, w, h, _, label, color in nodes:
+            if label:
+                draw.text((x + w / 2, y + h / 2), label, fill=color, font=font, anchor="mm")
+
+    buffer = io.BytesIO()
+    image.resize((width, height), Image.LANCZOS).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_thumbnail(spec_json: str, fmt: str, width: int = THUMBNAIL_WIDTH, height: int = THUMBNAIL_HEIGHT) -> bytes:
+    """Render from the spec's JSON; the entry point run in the render processes."""
+    spec = PlannerSpec.model_validate_json(spec_json)
+    if fmt == "png":
+        return render_png(spec, width, height)
+    return render_svg(spec, width, height)
+
+
+# ============================================
+# Render Pool
+# ============================================
+
+# Layout and rasterizing are pure CPU work that holds the GIL, so they run in
+# separate processes (spawned, like the job workers) instead of threads
+_pool: Optional[ProcessPoolExecutor] = None
+_flights = SingleFlight()
+# Renders started on save; referenced here so they are not garbage-collected mid-flight
+_scheduled: Set["asyncio.Task"] = set()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """The render processes, or None to render on the default thread pool (THUMBNAIL_WORKERS=0)."""
+    global _pool
+    if _pool is None and THUMBNAIL_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _render_and_store(store: MapStore, spec_hash: str, spec: PlannerSpec, fmt: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    with stage("thumbnail"):
+        body = await loop.run_in_executor(_get_pool(), render_thumbnail, spec.model_dump_json(), fmt)
+    await loop.run_in_executor(None, store.put_thumbnail, spec_hash, fmt, body)
+    return body
+
+
+async def get_thumbnail(store: MapStore, spec_hash: str, spec: PlannerSpec, fmt: str) -> bytes:
+    """
+    The preview of `spec` in `fmt`, rendered once per content address.
+
+    Concurrent requests for the same spec share one render, and the result is
+    kept in the map store, so every map and version with that content reuses it.
+    """
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(None, store.get_thumbnail, spec_hash, fmt)
+    if cached is not None:
+        return cached
+    return await _flights.do((spec_hash, fmt), lambda: _render_and_store(store, spec_hash, spec, fmt))
+
+
+def schedule_thumbnails(store: MapStore, spec_hash: str, spec: PlannerSpec) -> None:
+    """Start rendering THUMBNAIL_FORMATS for a just-saved spec without waiting for it."""
+    async def render(fmt: str) -> None:
+        try:
+            await get_thumbnail(store, spec_hash, spec, fmt)
+        except Exception:
+            # Counted under the 'thumbnail' stage; the preview is rendered on first request instead
+            pass
+
+    for fmt in THUMBNAIL_FORMATS:
+        task = asyncio.create_task(render(fmt))
+        _scheduled.add(task)
+        task.add_done_callback(_scheduled.discard)
+
+
+def shutdown_pool() -> None:
+    """Stop the render processes (app shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,184 @@
+"""
+Background job worker pool.
+
+Run next to the API (from the backend directory):
+
+    python -m app.worker --workers 2
+
+Each worker process claims jobs from the shared SQLite queue and runs up to
+JOB_WORKER_CONCURRENCY of them at once through the normal agent pipeline.
+The supervisor restarts worker processes that exit unexpectedly.
+
+The queue is a SQLite file, so the worker needs a host with a persistent disk
+that the API also sees at JOBS_DB_PATH. Serverless deployments (Vercel, Lambda)
+have neither, and the API answers job submissions there with 503 unless
+JOBS_DB_PATH or JOBS_ENABLED is set.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, List
+
+from pydantic import ValidationError
+
+from .config import (
+    JOB_WORKERS,
+    JOB_WORKER_CONCURRENCY,
+    JOB_TIMEOUT_SECONDS,
+    JOB_LEASE_SECONDS,
+    JOB_POLL_INTERVAL_SECONDS,
+    validate_config,
+)
+from .jobs import JobStore, execute_job
+from .scheduler import current_deadline, current_priority, PRIORITY_BATCH
+
+
+PURGE_INTERVAL_SECONDS = 60.0
+RESTART_DELAY_SECONDS = 1.0
+
+
+# ============================================
+# Worker Process
+# ============================================
+
+async def _in_store(fn, *args):
+    """Run a blocking job-store call off the event loop (claim holds a write lock)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, fn, *args)
+
+
+async def _heartbeat(store: JobStore, job_id: str, worker: str, run: asyncio.Future) -> bool:
+    """Renew the lease until cancelled; on losing it, cancel `run` and return True."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if not await _in_store(store.renew, job_id, worker):
+            run.cancel()
+            return True
+
+
+async def _process(store: JobStore, job: Dict[str, Any], worker: str) -> None:
+    """Run one claimed job and record its outcome."""
+    # Job runs in its own task, so this only affects its model calls
+    current_priority.set(PRIORITY_BATCH)
+    current_deadline.set(time.monotonic() + JOB_TIMEOUT_SECONDS)
+    run = asyncio.ensure_future(asyncio.wait_for(
+        execute_job(job["kind"], job["payload"], use_cache=bool(job["use_cache"])),
+        JOB_TIMEOUT_SECONDS
+    ))
+    heartbeat = asyncio.ensure_future(_heartbeat(store, job["id"], worker, run))
+    try:
+        result = await run
+    except asyncio.CancelledError:
+        if heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None:
+            # Lease lost: whichever worker reclaimed the job now owns its outcome
+            print(f"   - Job {job['id']} lease lost; abandoned")
+            return
+        # Shutting down: let another worker pick it up straight away
+        await _in_store(store.release, job["id"], worker)
+        raise
+    except asyncio.TimeoutError:
+        await _in_store(store.fail, job["id"], worker, f"Job exceeded {JOB_TIMEOUT_SECONDS:g}s timeout")
+    except ValidationError as e:
+        # The stored payload itself is bad; retrying can't help
+        await _in_store(store.fail, job["id"], worker, str(e), False)
+    except Exception as e:
+        await _in_store(store.fail, job["id"], worker, str(e) or type(e).__name__)
+    else:
+        await _in_store(store.complete, job["id"], worker, result)
+    finally:
+        heartbeat.cancel()
+
+
+async def _slot_loop(store: JobStore, worker: str, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        job = await _in_store(store.claim, worker)
+        if job is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await asyncio.ensure_future(_process(store, job, worker))
+
+
+async def _purge_loop(store: JobStore, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        await _in_store(store.purge_expired)
+        try:
+            await asyncio.wait_for(stopping.wait(), PURGE_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def serve(concurrency: int = JOB_WORKER_CONCURRENCY) -> None:
+    """Claim and run jobs until SIGTERM/SIGINT."""
+    store = JobStore()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    tasks = [asyncio.ensure_future(_slot_loop(store, worker, stopping)) for _ in range(max(1, concurrency))]
+    tasks.append(asyncio.ensure_future(_purge_loop(store, stopping)))
+    await stopping.wait()
+    # In-flight jobs are released back to the queue rather than waited on
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _worker_main(concurrency: int) -> None:
+    asyncio.run(serve(concurrency))
+
+
+# ============================================
+# Supervisor
+# ============================================
+
+def run_pool(workers: int = JOB_WORKERS, concurrency: int = JOB_WORKER_CONCURRENCY) -> None:
+    """Start `workers` worker processes and keep them running until interrupted."""
+    context = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = []
+    stopping = False
+
+    def start() -> multiprocessing.Process:
+        process = context.Process(target=_worker_main, args=(concurrency,), daemon=False)
+        process.start()
+        return process
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = [start() for _ in range(max(1, workers))]
+    print(f"✅ Job worker pool started: {len(processes)} processes × {concurrency} jobs")
+    try:
+        while not stopping:
+            time.sleep(RESTART_DELAY_SECONDS)
+            for i, process in enumerate(processes):
+                if not process.is_alive() and not stopping:
+                    print(f"   - Worker {process.pid} exited ({process.exitcode}); restarting")
+                    processes[i] = start()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=JOB_LEASE_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the AnyMaps background job workers")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="Jobs per process")
+    args = parser.parse_args()
+    validate_config()
+    run_pool(args.workers, args.concurrency)
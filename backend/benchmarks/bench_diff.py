@@ -0,0 +1,65 @@
+"""
+Benchmark the structural spec diff on large maps.
+
+Run from backend/:
+    python -m benchmarks.bench_diff [--nodes 10000] [--changes 0.05] [--repeat 5]
+"""
+import argparse
+import random
+
+from app.diff import diff_specs, summarize_delta
+from app.models import PlannerSpec, NodeSpec, EdgeSpec
+from benchmarks.bench_graph import timed
+
+
+def make_tree(node_count: int, rng: random.Random) -> PlannerSpec:
+    nodes = [NodeSpec(id="root", label="Root", type="central")]
+    edges = []
+    for i in range(1, node_count):
+        parent = nodes[rng.randrange(len(nodes))].id
+        nodes.append(NodeSpec(id=f"n{i}", label=f"Node {i}", description=f"About node {i}"))
+        edges.append(EdgeSpec(source=parent, target=f"n{i}"))
+    return PlannerSpec(title="Benchmark", central_topic="Root", nodes=nodes, edges=edges)
+
+
+def mutate(spec: PlannerSpec, share: float, rng: random.Random) -> PlannerSpec:
+    """Relabel, re-describe, remove, add and rewire roughly `share` of the map each."""
+    count = max(1, int(len(spec.nodes) * share))
+    nodes = list(spec.nodes)
+    edges = list(spec.edges)
+    for index in rng.sample(range(1, len(nodes)), count):
+        nodes[index] = nodes[index].model_copy(update={"label": nodes[index].label + " (edited)"})
+    for index in rng.sample(range(1, len(nodes)), count):
+        nodes[index] = nodes[index].model_copy(update={"description": None})
+    removed = {nodes[index].id for index in rng.sample(range(1, len(nodes)), count)}
+    nodes = [node for node in nodes if node.id not in removed]
+    edges = [edge for edge in edges if edge.source not in removed and edge.target not in removed]
+    for i in range(count):
+        parent = nodes[rng.randrange(len(nodes))].id
+        nodes.append(NodeSpec(id=f"added{i}", label=f"Added {i}"))
+        edges.append(EdgeSpec(source=parent, target=f"added{i}"))
+    for index in rng.sample(range(len(edges)), count):
+        edges[index] = edges[index].model_copy(update={"source": "root"})
+    return spec.model_copy(update={"nodes": nodes, "edges": edges, "title": "Benchmark (edited)"})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--changes", type=float, default=0.05, help="Share of the map touched by each kind of edit")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'nodes':>8} {'identical':>10} {'changed':>10}  summary")
+    for node_count in args.nodes:
+        original = make_tree(node_count, rng)
+        updated = mutate(original, args.changes, rng)
+        identical_ms = timed(lambda: diff_specs(original, original), args.repeat)
+        changed_ms = timed(lambda: diff_specs(original, updated), args.repeat)
+        summary = summarize_delta(diff_specs(original, updated))
+        print(f"{node_count:>8} {identical_ms:>8.1f}ms {changed_ms:>8.1f}ms  {summary}")
+
+
+if __name__ == "__main__":
+    main()
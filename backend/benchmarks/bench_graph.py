@@ -0,0 +1,112 @@
+"""
+Benchmark spec graph indexing, validation and repair on large maps.
+
+Run from backend/:
+    python -m benchmarks.bench_graph [--nodes 10000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from app.graph import SpecGraph, repair_spec
+from app.mermaid import build_tree, compile_mindmap, compile_flowchart
+from app.models import PlannerSpec, NodeSpec, EdgeSpec
+
+
+def make_spec(node_count: int, seed: int = 7) -> PlannerSpec:
+    """
+    A random tree of `node_count` nodes with ~1% of each defect mixed in:
+    duplicate IDs, dangling edges, back edges (cycles), reversed edges,
+    detached subtrees and hierarchy-jumping shortcuts, plus dashed
+    cross-links between random nodes (not defects; repair must keep them).
+    """
+    rng = random.Random(seed)
+    nodes = [NodeSpec(id="root", label="Root", type="central")]
+    edges: List[EdgeSpec] = []
+    parents = {}
+    for i in range(1, node_count):
+        node_id = f"n{i}"
+        parent = nodes[rng.randrange(len(nodes))].id
+        parents[node_id] = parent
+        nodes.append(NodeSpec(id=node_id, label=f"Node {i}"))
+        edges.append(EdgeSpec(source=parent, target=node_id))
+
+    defects = max(1, node_count // 100)
+    for _ in range(defects):
+        nodes.append(NodeSpec(id=f"n{rng.randrange(1, node_count)}", label="Duplicate"))
+        edges.append(EdgeSpec(source=f"n{rng.randrange(1, node_count)}", target=f"missing{rng.randrange(10**6)}"))
+        # Back edge from a node to its grandparent
+        child = f"n{rng.randrange(1, node_count)}"
+        grandparent = parents.get(parents.get(child, ""), None)
+        if grandparent:
+            edges.append(EdgeSpec(source=child, target=grandparent))
+            # ...and the matching shortcut, which skips the parent
+            edges.append(EdgeSpec(source=grandparent, target=child))
+        edges.append(EdgeSpec(
+            source=f"n{rng.randrange(1, node_count)}", target=f"n{rng.randrange(1, node_count)}",
+            label="relates to", style="dashed"
+        ))
+        # Reverse one tree edge, detach another
+        index = rng.randrange(len(edges))
+        edges[index] = EdgeSpec(source=edges[index].target, target=edges[index].source)
+        del edges[rng.randrange(len(edges))]
+    return PlannerSpec(title="Benchmark", central_topic="Root", nodes=nodes, edges=edges)
+
+
+def check_cross_links() -> None:
+    """A dashed link from deeper in the tree must not cost its target the solid parent edge."""
+    spec = PlannerSpec(title="Cross-link", central_topic="C", nodes=[
+        NodeSpec(id="c", label="C", type="central"),
+        NodeSpec(id="A", label="A"), NodeSpec(id="B", label="B"), NodeSpec(id="a1", label="A1"),
+    ], edges=[
+        EdgeSpec(source="c", target="A"),
+        EdgeSpec(source="c", target="B"),
+        EdgeSpec(source="A", target="a1"),
+        EdgeSpec(source="a1", target="B", label="influences", style="dashed"),
+    ])
+    assert not SpecGraph(spec).issues()
+    fixed, fixes = repair_spec(spec)
+    assert not fixes and fixed.edges == spec.edges, fixes
+    _, children, _ = build_tree(fixed)
+    assert "B" in children["c"] and "B" not in children["a1"], children
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-`repeat` wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    check_cross_links()
+    print(f"{'nodes':>8} {'edges':>8} {'index':>9} {'issues':>9} {'repair':>9} {'tree':>9} {'mindmap':>9} {'flowchart':>9}")
+    for node_count in args.nodes:
+        spec = make_spec(node_count)
+        graph = SpecGraph(spec)
+        row = [
+            timed(lambda: SpecGraph(spec), args.repeat),
+            timed(lambda: SpecGraph(spec).issues(), args.repeat),
+            timed(lambda: repair_spec(spec), args.repeat),
+            timed(lambda: build_tree(spec, graph), args.repeat),
+            timed(lambda: compile_mindmap(spec), args.repeat),
+            timed(lambda: compile_flowchart(spec), args.repeat),
+        ]
+        print(f"{len(spec.nodes):>8} {len(spec.edges):>8} " + " ".join(f"{ms:>7.1f}ms" for ms in row))
+
+        fixed, fixes = repair_spec(spec)
+        remaining = SpecGraph(fixed).issues()
+        print(f"{'':>8} {len(graph.issues())} issues; repair: {'; '.join(fixes)}; {len(remaining)} left after repair")
+
+
+if __name__ == "__main__":
+    main()
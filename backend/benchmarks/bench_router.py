@@ -0,0 +1,132 @@
+"""
+Simulate planner model routing on a mixed request workload.
+
+Three tiers stand in for a cheap, a mid-range and a strong model, each with
+its own latency (fixed plus per generated node) and price. Every request is
+labelled with the weakest tier that handles it well ("difficulty", set by
+how the request was generated, independently of the router's score). The
+same workload is run with every call on the strongest tier (routing off) and
+through ModelRouter (routing on); a request served below its difficulty
+counts as a quality regression. Latencies are scaled down by --time-scale.
+
+Run from backend/:
+    python -m benchmarks.bench_router [--requests 300] [--time-scale 0.01]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.executor import executor
+from app.model_router import ModelRouter, RouteFeatures, request_features
+from app.models import PlannerSpec
+from benchmarks.bench_diff import make_tree
+
+
+# (name, seconds per call, seconds per generated node, $ per 1k output tokens)
+TIERS = [
+    ("cheap", 1.2, 0.02, 0.25),
+    ("mid", 2.0, 0.04, 1.0),
+    ("strong", 3.5, 0.07, 5.0),
+]
+TOKENS_PER_NODE = 40
+
+TOPICS = ["cats", "photosynthesis", "the French Revolution", "jazz", "volcanoes", "chess openings"]
+NAMES = ["Greek History", "Roman Law", "Byzantine Art", "Ottoman Trade", "Venetian Banking", "Hanseatic League"]
+
+
+def make_workload(count: int, rng: random.Random) -> List[Tuple[RouteFeatures, int, int]]:
+    """(features, difficulty tier, nodes generated) for a plausible request mix."""
+    workload = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.45:
+            prompt = f"mind map about {rng.choice(TOPICS)}"
+            workload.append((request_features("planner", prompt), 0, 12))
+        elif roll < 0.7:
+            prompt = (
+                f"Explain {rng.choice(TOPICS)} for a high-school class, covering causes, "
+                f"key figures such as {rng.choice(NAMES)} and {rng.choice(NAMES)}, and lasting effects. "
+                + "Include examples and common misconceptions. " * rng.randint(1, 4)
+            )
+            workload.append((request_features("planner", prompt), 1, 25))
+        elif roll < 0.85:
+            weeks = rng.randint(12, 30)
+            prompt = "Course syllabus:\n" + "\n".join(
+                f"- Week {i}: {rng.choice(NAMES)} and {rng.choice(NAMES)}, readings {i}.1-{i}.4" for i in range(weeks)
+            )
+            workload.append((request_features("planner", prompt), 2, 60))
+        else:
+            spec = make_tree(rng.choice([10, 40, 150]), rng)
+            mode = rng.choice(["expand", "refine", "focus", "simplify"])
+            difficulty = 2 if len(spec.nodes) >= 150 or (mode == "focus" and len(spec.nodes) >= 40) else 1 if mode != "simplify" else 0
+            features = request_features("enhance_patch", "add detail on the second branch", current_spec=spec, enhance_mode=mode)
+            workload.append((features, difficulty, 8))
+    return workload
+
+
+async def run(workload: List[Tuple[RouteFeatures, int, int]], router: Optional[ModelRouter], time_scale: float) -> Dict[str, float]:
+    tiers = {name: (base, per_node, price) for name, base, per_node, price in TIERS}
+    names = [name for name, _, _, _ in TIERS]
+    latencies, cost, regressions, served = [], 0.0, 0, {name: 0 for name in names}
+
+    async def one(features: RouteFeatures, difficulty: int, nodes: int) -> None:
+        nonlocal cost, regressions
+        used = []
+
+        async def call(model: str) -> PlannerSpec:
+            base, per_node, _ = tiers[model]
+            await asyncio.sleep((base + per_node * nodes) * random.lognormvariate(0, 0.2) * time_scale)
+            used.append(model)
+            return make_tree(nodes, random.Random(nodes))
+
+        started = time.perf_counter()
+        if router is None:
+            await executor.run(names[-1], None, call)
+        else:
+            await router.run(features, call)
+        latencies.append((time.perf_counter() - started) / time_scale)
+        model = used[0]
+        served[model] += 1
+        cost += tiers[model][2] * nodes * TOKENS_PER_NODE / 1000
+        regressions += names.index(model) < difficulty
+
+    # A few requests in flight at a time, as from a handful of users
+    for start in range(0, len(workload), 8):
+        await asyncio.gather(*(one(*item) for item in workload[start:start + 8]))
+    return {
+        "p50": statistics.median(latencies),
+        "p95": sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        "cost": cost,
+        "regressions": regressions,
+        **served,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Simulated seconds per real second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workload = make_workload(args.requests, random.Random(args.seed))
+    router = ModelRouter(tiers=[name for name, _, _, _ in TIERS], mode="on")
+    results = {
+        "routing off": asyncio.run(run(workload, None, args.time_scale)),
+        "routing on": asyncio.run(run(workload, router, args.time_scale)),
+    }
+    print(f"{'':<12} {'p50':>7} {'p95':>7} {'cost':>8} {'regressions':>12}  served by tier")
+    for name, result in results.items():
+        tiers = " ".join(f"{tier}={result[tier]}" for tier, _, _, _ in TIERS)
+        print(
+            f"{name:<12} {result['p50']:>6.2f}s {result['p95']:>6.2f}s ${result['cost']:>7.2f} "
+            f"{result['regressions']:>12}  {tiers}"
+        )
+    print(f"thresholds {router.thresholds}, upgrades {router.upgrades}, probes {router.probes}")
+
+
+if __name__ == "__main__":
+    main()
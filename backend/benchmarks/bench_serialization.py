@@ -0,0 +1,141 @@
+"""
+Benchmark CPU per request for large maps on the standard and single-pass JSON paths.
+
+"standard" is what FastAPI does with a body parameter and a returned model
+(json.loads, validate the dicts, validate the response again on older
+releases, serialize); "fast" is ModelRoute + json_body(). The same pairs are
+timed for parsing model output, SSE events and stored job results.
+Times are process CPU time, so they exclude waiting on the event loop.
+
+Run from backend/:
+    python -m benchmarks.bench_serialization [--nodes 500 2000 10000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict
+
+from fastapi import APIRouter, Depends, FastAPI
+
+from app.agents import _spec_from_dict
+from app.json_extract import extract_json, validate_clean
+from app.jobs import job_response, job_response_json
+from app.models import GeneratePlanResponse, PlannerSpec, ValidateSpecRequest, ValidateSpecResponse
+from app.serialization import ModelRoute, body_schema, json_body
+from app.streaming import format_sse
+from benchmarks.bench_diff import make_tree
+
+
+def echo_app(fast: bool) -> FastAPI:
+    """An app with one spec-in, spec-out endpoint on either path."""
+    if fast:
+        router = APIRouter(route_class=ModelRoute)
+
+        @router.post("/echo", response_model=ValidateSpecResponse, openapi_extra=body_schema(ValidateSpecRequest))
+        async def echo(request: ValidateSpecRequest = Depends(json_body(ValidateSpecRequest))):
+            return ValidateSpecResponse(valid=True, planner_spec=request.planner_spec)
+    else:
+        router = APIRouter()
+
+        @router.post("/echo", response_model=ValidateSpecResponse)
+        async def echo(request: ValidateSpecRequest):
+            return ValidateSpecResponse(valid=True, planner_spec=request.planner_spec)
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+async def post(app: FastAPI, path: str, body: bytes) -> bytes:
+    """One request through the ASGI app, without a server or client."""
+    sent = False
+    messages = []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    await app(scope, receive, send)
+    assert messages[0]["status"] == 200, messages[0]["status"]
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def cpu_ms(fn: Callable[[], object], repeat: int) -> float:
+    """Median process CPU time of `fn` in milliseconds, with collection outside the timings."""
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        started = time.process_time()
+        fn()
+        samples.append(time.process_time() - started)
+        gc.enable()
+    return statistics.median(samples) * 1000
+
+
+def compare(spec: PlannerSpec, repeat: int) -> Dict[str, tuple]:
+    body = ValidateSpecRequest(planner_spec=spec).model_dump_json().encode("utf-8")
+    loop = asyncio.new_event_loop()
+    apps = {fast: echo_app(fast) for fast in (False, True)}
+    assert json.loads(loop.run_until_complete(post(apps[False], "/echo", body))) == \
+        json.loads(loop.run_until_complete(post(apps[True], "/echo", body)))
+
+    content = spec.model_dump_json()
+    job = {
+        "id": "bench", "kind": "plan", "status": "succeeded", "attempts": 1, "max_attempts": 3,
+        "created_at": 0.0, "updated_at": 0.0, "expires_at": None, "error": None,
+        "result": GeneratePlanResponse(success=True, planner_spec=spec).model_dump_json(),
+    }
+    results = {
+        "request": (
+            cpu_ms(lambda: loop.run_until_complete(post(apps[False], "/echo", body)), repeat),
+            cpu_ms(lambda: loop.run_until_complete(post(apps[True], "/echo", body)), repeat),
+        ),
+        "parse output": (
+            cpu_ms(lambda: _spec_from_dict(extract_json(content).value), repeat),
+            cpu_ms(lambda: validate_clean(PlannerSpec, content), repeat),
+        ),
+        "sse event": (
+            cpu_ms(lambda: json.dumps({"planner_spec": spec.model_dump()}, separators=(",", ":")), repeat),
+            cpu_ms(lambda: format_sse("plan_done", {"planner_spec": spec}), repeat),
+        ),
+        "job result": (
+            cpu_ms(lambda: job_response(job).model_dump_json(), repeat),
+            cpu_ms(lambda: job_response_json(job), repeat),
+        ),
+    }
+    loop.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'path':<14} {'standard':>10} {'fast':>10} {'saved':>7}")
+    for count in args.nodes:
+        spec = make_tree(count, random.Random(count))
+        for name, (standard, fast) in compare(spec, args.repeat).items():
+            print(f"{count:>7} {name:<14} {standard:>8.2f}ms {fast:>8.2f}ms {1 - fast / standard:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
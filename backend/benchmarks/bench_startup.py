@@ -0,0 +1,155 @@
+"""
+Benchmark serverless cold starts: fresh interpreters importing the app and serving first requests.
+
+Each run is a new process started the way Vercel does (VERCEL=1, lifespan not
+run), timing `import main`, the first /api/health and the first /openapi.json.
+The slowest imports of one run (python -X importtime) are grouped by package.
+Exits non-zero when the median import + first request exceeds the budget.
+
+Run from backend/:
+    python -m benchmarks.bench_startup [--runs 5] [--budget-ms 1000] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import time (ms) of `main` plus its first request, on the reference machine
+DEFAULT_BUDGET_MS = 1000.0
+
+# Runs inside the fresh interpreter; prints one JSON line of timings (ms)
+_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def get(path):
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    begin = time.perf_counter()
+    await main.app(scope, receive, send)
+    assert messages[0]["status"] == 200, (path, messages[0]["status"])
+    return (time.perf_counter() - begin) * 1000
+
+health = asyncio.run(get("/api/health"))
+openapi = asyncio.run(get("/openapi.json"))
+print(json.dumps({"import": (imported - started) * 1000, "first_health": health, "first_openapi": openapi}))
+"""
+
+
+def _env(workdir: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "VERCEL": "1",
+        "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY") or "sk-or-startup-benchmark",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+    }
+
+
+def run_once(env: Dict[str, str], importtime: bool = False) -> Tuple[Dict[str, float], str]:
+    """One cold start; returns (timings in ms, importtime report when requested)."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{result.stdout}\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = wall
+    return timings, result.stderr
+
+
+def parse_importtime(report: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) per line of a -X importtime report."""
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def import_profile(modules: List[Tuple[str, int, int]], top: int) -> Dict[str, Any]:
+    """Self time summed per top-level package (app modules listed individually), slowest first."""
+    packages: Dict[str, int] = {}
+    for name, self_us, _ in modules:
+        key = name if name.startswith("app.") or name == "main" else name.split(".")[0]
+        packages[key] = packages.get(key, 0) + self_us
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(self_us for _, self_us, _ in modules) / 1000, 1),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in ranked},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Maximum median import + first request time")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed in the import profile")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="anymaps-startup-") as workdir:
+        env = _env(workdir)
+        # Warm the OS page cache and __pycache__ so runs measure imports, not disk
+        run_once(env)
+        runs = [run_once(env)[0] for _ in range(args.runs)]
+        _, report = run_once(env, importtime=True)
+
+    medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    cold_start = medians["import"] + medians["first_health"]
+    profile = import_profile(parse_importtime(report), args.top)
+
+    print(f"{'':<16}{'median':>10}{'min':>10}{'max':>10}")
+    for key in ("process", "import", "first_health", "first_openapi"):
+        values = [run[key] for run in runs]
+        print(f"{key:<16}{medians[key]:>8.1f}ms{min(values):>8.1f}ms{max(values):>8.1f}ms")
+    print(f"\nImport profile (self time by package, {profile['total_ms']:.0f}ms total):")
+    for name, ms in profile["packages_ms"].items():
+        print(f"  {name:<28}{ms:>8.1f}ms")
+
+    within = cold_start <= args.budget_ms
+    print(f"\nCold start (import + first request): {cold_start:.1f}ms, budget {args.budget_ms:.0f}ms"
+          f" — {'OK' if within else 'OVER BUDGET'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": sys.version.split()[0],
+                "runs": runs,
+                "median_ms": {key: round(value, 1) for key, value in medians.items()},
+                "cold_start_ms": round(cold_start, 1),
+                "budget_ms": args.budget_ms,
+                "import_profile": profile,
+            }, f, indent=2)
+
+    if not within:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
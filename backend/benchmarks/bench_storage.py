@@ -0,0 +1,90 @@
+"""
+Benchmark map version storage over a long enhance session.
+
+Each version applies an enhance-style patch (new nodes, edits, the odd
+removal) to the previous one. Reports the bytes stored against full
+snapshots, save latency, and load latency by version number.
+
+Run from backend/:
+    python -m benchmarks.bench_storage [--nodes 200] [--versions 200] [--checkpoint-interval 16]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.models import NodeSpec, SpecOperation, SpecPatch
+from app.patches import apply_patch
+from app.storage import SQLiteMapStore, encode_spec, spec_address
+from benchmarks.bench_diff import make_tree
+from benchmarks.bench_graph import timed
+
+
+def enhance_patch(spec, step: int, rng: random.Random) -> SpecPatch:
+    node_ids = [node.id for node in spec.nodes]
+    operations = []
+    for i in range(rng.randint(2, 5)):
+        node_id = f"e{step}_{i}"
+        operations.append(SpecOperation(op="add_node", node=NodeSpec(id=node_id, label=f"Idea {step}.{i}")))
+        operations.append(SpecOperation(op="add_edge", source=rng.choice(node_ids), target=node_id))
+    operations.append(SpecOperation(
+        op="update_node", id=rng.choice(node_ids[1:]), changes={"description": f"Refined in step {step}"}
+    ))
+    if step % 7 == 0:
+        operations.append(SpecOperation(op="remove_node", id=rng.choice(node_ids[1:])))
+    return SpecPatch(operations=operations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=200, help="Nodes in the first version")
+    parser.add_argument("--versions", type=int, default=200)
+    parser.add_argument("--checkpoint-interval", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    spec = make_tree(args.nodes, rng)
+    specs = [spec]
+    for step in range(1, args.versions):
+        spec, _, _ = apply_patch(spec, enhance_patch(spec, step, rng))
+        specs.append(spec)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteMapStore(os.path.join(directory, "maps.sqlite3"), args.checkpoint_interval)
+        started = time.perf_counter()
+        summary, _ = store.create_map("bench", "Benchmark", specs[0])
+        for spec in specs[1:]:
+            store.save_version(summary.id, spec)
+        save_ms = (time.perf_counter() - started) * 1000 / len(specs)
+
+        stats = store.stats()
+        snapshot_bytes = sum(len(encode_spec(spec)) for spec in specs)
+        stored_bytes = stats["spec_bytes"] + stats["delta_bytes"]
+        print(f"{len(specs)} versions, {len(specs[-1].nodes)} nodes in the last")
+        print(f"checkpoints: {stats['checkpoints']}, deltas: {stats['versions'] - stats['checkpoints']}")
+        print(f"stored: {stored_bytes / 1024:.1f} KB vs {snapshot_bytes / 1024:.1f} KB of full snapshots "
+              f"({stored_bytes / snapshot_bytes:.1%})")
+        print(f"save: {save_ms:.2f} ms per version")
+
+        cold = SQLiteMapStore(store.path, args.checkpoint_interval)
+
+        def load(number: int) -> None:
+            # Drop cached heads so every load replays from its checkpoint
+            cold._heads.clear()
+            cold.load_version(summary.id, number)
+
+        print(f"\n{'version':>8} {'load':>10}")
+        for number in sorted({1, args.checkpoint_interval, args.checkpoint_interval + 1,
+                              len(specs) // 2, len(specs) - 1, len(specs)}):
+            if not 1 <= number <= len(specs):
+                continue
+            _, _, loaded, _ = cold.load_version(summary.id, number)
+            assert spec_address(loaded) == spec_address(specs[number - 1])
+            load_ms = timed(lambda: load(number), args.repeat)
+            print(f"{number:>8} {load_ms:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
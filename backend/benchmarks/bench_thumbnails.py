@@ -0,0 +1,72 @@
+"""
+Benchmark gallery thumbnail rendering.
+
+Reports render time and size per format by map size, then the wall time to
+render a gallery page of distinct maps one at a time in the API process
+against the render process pool, and the cost of a cached thumbnail.
+
+Run from backend/:
+    python -m benchmarks.bench_thumbnails [--nodes 20 200 2000] [--maps 24] [--workers 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.storage import SQLiteMapStore, spec_address
+from app.thumbnails import render_thumbnail
+from benchmarks.bench_diff import make_tree
+from benchmarks.bench_graph import timed
+
+
+async def render_page(specs, pool) -> float:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    await asyncio.gather(*(loop.run_in_executor(pool, render_thumbnail, spec.model_dump_json(), "png") for spec in specs))
+    return (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--maps", type=int, default=24, help="Maps on a gallery page")
+    parser.add_argument("--page-nodes", type=int, default=200, help="Nodes per map on the gallery page")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'format':>7} {'render':>10} {'size':>10}")
+    for count in args.nodes:
+        spec_json = make_tree(count, random.Random(count)).model_dump_json()
+        for fmt in ("svg", "png"):
+            body = render_thumbnail(spec_json, fmt)
+            render_ms = timed(lambda: render_thumbnail(spec_json, fmt), args.repeat)
+            print(f"{count:>7} {fmt:>7} {render_ms:>8.2f}ms {len(body) / 1024:>8.1f}KB")
+
+    specs = [make_tree(args.page_nodes, random.Random(seed)) for seed in range(args.maps)]
+    serial_started = time.perf_counter()
+    for spec in specs:
+        render_thumbnail(spec.model_dump_json(), "png")
+    serial_ms = (time.perf_counter() - serial_started) * 1000
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # First round starts the processes; time the second
+        asyncio.run(render_page(specs[:args.workers], pool))
+        pool_ms = asyncio.run(render_page(specs, pool))
+    print(f"\nGallery page, {args.maps} maps × {args.page_nodes} nodes (png):")
+    print(f"  in-process: {serial_ms:8.1f}ms")
+    print(f"  pool ({args.workers}):   {pool_ms:8.1f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteMapStore(os.path.join(directory, "maps.sqlite3"))
+        spec_hash = spec_address(specs[0])
+        store.put_thumbnail(spec_hash, "png", render_thumbnail(specs[0].model_dump_json(), "png"))
+        cached_ms = timed(lambda: store.get_thumbnail(spec_hash, "png"), args.repeat * 20)
+    print(f"  cached:     {cached_ms:8.3f}ms per thumbnail")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Offline load test: the backend against a mock OpenRouter, at fixed concurrency.
+
+Starts benchmarks.mock_openrouter and the API (uvicorn) as subprocesses,
+drives /generate/plan, /generate/full and /generate/enhance with N requests
+in flight, and reports throughput, latency percentiles, event-loop lag and
+memory growth per request (both scraped from /api/metrics). Results can be
+saved as JSON and compared with an earlier run.
+
+Run from backend/:
+    python -m benchmarks.load_test --concurrency 1 8 32 --duration 20 --output results.json
+    python -m benchmarks.load_test --latency-ms 800 --malformed-rate 0.1 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.mock_openrouter import add_mock_arguments
+
+
+SCENARIOS = ("plan", "full", "enhance")
+
+# Percentage by which a p95 may grow (or throughput shrink) before --compare fails
+DEFAULT_THRESHOLD = 0.10
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ============================================
+# Processes
+# ============================================
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_servers(args: argparse.Namespace, workdir: str) -> Tuple[List[subprocess.Popen], str]:
+    """Start the mock provider and the backend; returns (processes, backend base URL)."""
+    mock_port = _free_port()
+    api_port = _free_port()
+    mock_args = [
+        sys.executable, "-m", "benchmarks.mock_openrouter", "--port", str(mock_port),
+        "--latency-ms", str(args.latency_ms), "--jitter", str(args.jitter),
+        "--tokens-per-second", str(args.tokens_per_second), "--nodes", str(args.nodes),
+        "--malformed-rate", str(args.malformed_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+    ]
+    if args.seed is not None:
+        mock_args += ["--seed", str(args.seed)]
+
+    env = {
+        **os.environ,
+        "OPENROUTER_API_KEY": "sk-or-loadtest",
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "METRICS_ENABLED": "true",
+        # Measure the pipeline, not the caches or the per-client rate limit
+        "CACHE_BACKEND": "none",
+        "SEMANTIC_CACHE_ENABLED": "false",
+        "CLIENT_RATE_PER_MINUTE": "1000000",
+        "CLIENT_BURST": "1000000",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+    }
+    log = open(os.path.join(workdir, "servers.log"), "w")
+    processes = []
+    try:
+        mock = subprocess.Popen(mock_args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(mock)
+        _wait_ready(f"http://127.0.0.1:{mock_port}/v1/stats", mock)
+
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        processes.append(api)
+        base_url = f"http://127.0.0.1:{api_port}"
+        _wait_ready(f"{base_url}/api/health", api)
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes, base_url
+
+
+def stop_servers(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ============================================
+# Metrics Scraping
+# ============================================
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$')
+
+
+def scrape(client: httpx.Client) -> Dict[str, float]:
+    """Sample name (with labels) → value from /api/metrics."""
+    text = client.get("/api/metrics").text
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE_RE.match(line)
+        if match:
+            samples[match.group(1) + (match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def histogram_quantiles(before: Dict[str, float], after: Dict[str, float], name: str) -> Dict[str, Optional[float]]:
+    """p50/p99/max-bucket estimates (upper bucket bounds) from the growth of a histogram."""
+    buckets = []
+    for key, value in after.items():
+        if key.startswith(f"{name}_bucket"):
+            bound = re.search(r'le="([^"]+)"', key).group(1)
+            buckets.append((float(bound), value - before.get(key, 0.0)))
+    buckets.sort()
+    total = buckets[-1][1] if buckets else 0
+    result: Dict[str, Optional[float]] = {"samples": total}
+    for label, q in (("p50", 0.5), ("p99", 0.99), ("max", 1.0)):
+        result[label] = next((bound for bound, count in buckets if total and count >= q * total), None)
+    count = after.get(f"{name}_count", 0) - before.get(f"{name}_count", 0)
+    result["mean"] = (after.get(f"{name}_sum", 0) - before.get(f"{name}_sum", 0)) / count if count else None
+    return result
+
+
+# ============================================
+# Driver
+# ============================================
+
+def request_for(scenario: str, spec: Optional[Dict[str, Any]], index: int) -> Tuple[str, Dict[str, Any]]:
+    # Distinct prompts so request coalescing cannot merge concurrent requests
+    prompt = f"Load test map #{index} about distributed systems"
+    if scenario == "plan":
+        return "/api/generate/plan", {"user_prompt": prompt}
+    if scenario == "full":
+        return "/api/generate/full", {"user_prompt": prompt}
+    return "/api/generate/enhance", {
+        "current_spec": spec,
+        "enhance_prompt": f"Add more detail #{index}",
+        "enhance_mode": "expand",
+    }
+
+
+async def run_scenario(
+    base_url: str,
+    scenario: str,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int],
+    spec: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Keep `concurrency` requests in flight until `duration` seconds or `max_requests` have passed."""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    issued = 0
+    deadline = time.perf_counter() + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal issued
+            while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+                issued += 1
+                path, payload = request_for(scenario, spec, issued)
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, json=payload, headers={"X-Cache-Bypass": "1"})
+                    body = response.json()
+                    if response.status_code != 200:
+                        error = f"http_{response.status_code}"
+                    elif not body.get("success"):
+                        error = "failed"
+                    else:
+                        error = None
+                except (httpx.HTTPError, ValueError) as e:
+                    error = type(e).__name__
+                if error is None:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[error] = errors.get(error, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    completed = len(latencies) + sum(errors.values())
+    return {
+        "requests": completed,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": sum(errors.values()) / completed if completed else 0.0,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": _ms(percentile(latencies, 0.50)),
+            "p95": _ms(percentile(latencies, 0.95)),
+            "p99": _ms(percentile(latencies, 0.99)),
+            "mean": _ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _ms(max(latencies)) if latencies else None,
+        },
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def run_all(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="anymaps-load-") as workdir:
+        processes, base_url = start_servers(args, workdir)
+        try:
+            with httpx.Client(base_url=base_url, timeout=120.0) as client:
+                # Warm up imports, connection pools and the enhance fixture
+                warm = client.post("/api/generate/plan", json={"user_prompt": "warm up"}).json()
+                spec = warm.get("planner_spec")
+                results: Dict[str, Any] = {}
+                for scenario in args.scenarios:
+                    results[scenario] = {}
+                    for concurrency in args.concurrency:
+                        before = scrape(client)
+                        result = asyncio.run(run_scenario(
+                            base_url, scenario, concurrency, args.duration, args.requests, spec
+                        ))
+                        after = scrape(client)
+                        result["event_loop_lag_ms"] = {
+                            key: _ms(value) if key != "samples" else value
+                            for key, value in histogram_quantiles(before, after, "anymaps_event_loop_lag_seconds").items()
+                        }
+                        rss_before = before.get("process_resident_memory_bytes")
+                        rss_after = after.get("process_resident_memory_bytes")
+                        result["memory"] = {
+                            "rss_mb": round(rss_after / 2**20, 1) if rss_after else None,
+                            "rss_growth_kb_per_request": (
+                                round((rss_after - rss_before) / 1024 / result["requests"], 2)
+                                if rss_before and rss_after and result["requests"] else None
+                            ),
+                        }
+                        results[scenario][str(concurrency)] = result
+                        print_row(scenario, concurrency, result)
+                mock_stats = httpx.get(
+                    _mock_url(processes[0]) + "/v1/stats", timeout=5.0
+                ).json()
+        finally:
+            stop_servers(processes)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration_s": args.duration,
+            "mock": {
+                "latency_ms": args.latency_ms,
+                "jitter": args.jitter,
+                "tokens_per_second": args.tokens_per_second,
+                "nodes": args.nodes,
+                "malformed_rate": args.malformed_rate,
+                "rate_limit_rate": args.rate_limit_rate,
+                **mock_stats,
+            },
+        },
+        "results": results,
+    }
+
+
+def _mock_url(process: subprocess.Popen) -> str:
+    port = process.args[process.args.index("--port") + 1]
+    return f"http://127.0.0.1:{port}"
+
+
+# ============================================
+# Reporting
+# ============================================
+
+HEADER = (
+    f"{'scenario':<9}{'conc':>5}{'reqs':>7}{'err%':>7}{'rps':>8}"
+    f"{'p50':>9}{'p95':>9}{'p99':>9}{'lag p99':>9}{'KB/req':>8}"
+)
+
+
+def _cell(value: Optional[float], width: int, digits: int = 0) -> str:
+    return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+
+def print_row(scenario: str, concurrency: int, result: Dict[str, Any]) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{scenario:<9}{concurrency:>5}{result['requests']:>7}"
+        f"{_cell(result['error_rate'] * 100, 7, 1)}{_cell(result['throughput_rps'], 8, 1)}"
+        f"{_cell(latency['p50'], 9)}{_cell(latency['p95'], 9)}{_cell(latency['p99'], 9)}"
+        f"{_cell(result['event_loop_lag_ms']['p99'], 9, 1)}"
+        f"{_cell(result['memory']['rss_growth_kb_per_request'], 8, 1)}",
+        flush=True
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print per-run deltas against a baseline results file.
+
+    Returns:
+        Descriptions of regressions: p95 up or throughput down by more than `threshold`
+    """
+    regressions = []
+    print(f"\n{'scenario':<9}{'conc':>5}{'p95 base':>10}{'p95 now':>10}{'Δ':>8}{'rps base':>10}{'rps now':>10}{'Δ':>8}")
+    for scenario, runs in current["results"].items():
+        for concurrency, result in runs.items():
+            base = baseline.get("results", {}).get(scenario, {}).get(concurrency)
+            if base is None:
+                continue
+            p95_base, p95_now = base["latency_ms"]["p95"], result["latency_ms"]["p95"]
+            rps_base, rps_now = base["throughput_rps"], result["throughput_rps"]
+            p95_delta = (p95_now - p95_base) / p95_base if p95_base and p95_now is not None else None
+            rps_delta = (rps_now - rps_base) / rps_base if rps_base else None
+            print(
+                f"{scenario:<9}{concurrency:>5}{_cell(p95_base, 10)}{_cell(p95_now, 10)}"
+                f"{_cell(p95_delta * 100 if p95_delta is not None else None, 7, 1)}%"
+                f"{_cell(rps_base, 10, 1)}{_cell(rps_now, 10, 1)}"
+                f"{_cell(rps_delta * 100 if rps_delta is not None else None, 7, 1)}%"
+            )
+            if p95_delta is not None and p95_delta > threshold:
+                regressions.append(f"{scenario} @ {concurrency}: p95 {p95_base:.0f}ms → {p95_now:.0f}ms")
+            if rps_delta is not None and rps_delta < -threshold:
+                regressions.append(f"{scenario} @ {concurrency}: throughput {rps_base:.1f} → {rps_now:.1f} rps")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per scenario and concurrency level")
+    parser.add_argument("--requests", type=int, default=None, help="Stop each run after this many requests")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Baseline results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    print(HEADER, flush=True)
+    current = run_all(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Offline stand-in for the OpenRouter chat completions API, for load tests.
+
+Answers POST /v1/chat/completions (plain and streamed) with canned output
+matching whichever AnyMaps agent is calling, identified by its system prompt.
+Latency, token rate, malformed JSON and 429s are configurable; repeated prompt
+prefixes are reported as cached tokens, like a provider prefix cache.
+
+Run from backend/:
+    python -m benchmarks.mock_openrouter --port 8900 --latency-ms 400 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.prompts import (
+    PLANNER_SYSTEM_PROMPT,
+    BUILDER_SYSTEM_PROMPT,
+    ENHANCE_SYSTEM_PROMPT,
+    ENHANCE_PATCH_SYSTEM_PROMPT,
+    VISION_SYSTEM_PROMPT,
+    FANOUT_OUTLINE_SYSTEM_PROMPT,
+    FANOUT_BRANCH_SYSTEM_PROMPT,
+)
+
+
+class MockConfig:
+    """Behaviour knobs, shared by every request."""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter: float = 0.25,
+        tokens_per_second: float = 0.0,
+        nodes: int = 20,
+        malformed_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        # Lognormal sigma applied to the base latency
+        self.jitter = jitter
+        # Completion tokens generated per second (0 = all at once after the latency)
+        self.tokens_per_second = tokens_per_second
+        self.nodes = nodes
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.malformed = 0
+        # Prompt prefixes seen so far (hashes), to report cached tokens like a provider prefix cache
+        self.prefixes: Set[int] = set()
+        self.cached_tokens = 0
+
+
+# ============================================
+# Canned Output
+# ============================================
+
+def _prefix(prompt: str) -> str:
+    """The part of a system prompt before its first format field."""
+    return prompt.split("{", 1)[0]
+
+
+_AGENTS = [
+    ("enhance_patch", _prefix(ENHANCE_PATCH_SYSTEM_PROMPT)),
+    ("enhance", _prefix(ENHANCE_SYSTEM_PROMPT)),
+    ("fanout_outline", _prefix(FANOUT_OUTLINE_SYSTEM_PROMPT)),
+    ("fanout_branch", _prefix(FANOUT_BRANCH_SYSTEM_PROMPT)),
+    ("planner", _prefix(PLANNER_SYSTEM_PROMPT)),
+    ("builder", _prefix(BUILDER_SYSTEM_PROMPT)),
+    ("vision", _prefix(VISION_SYSTEM_PROMPT)),
+]
+
+_ID_RE = re.compile(r'"id"\s*:\s*"([^"]+)"')
+
+
+def _text(content: Any) -> str:
+    """Text of a message's content, whether a string or a list of content parts."""
+    if isinstance(content, list):
+        return "\n\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content or ""
+
+
+def identify_agent(messages: List[Dict[str, Any]]) -> str:
+    system = _text(next((m.get("content") for m in messages if m.get("role") == "system"), ""))
+    for agent, prefix in _AGENTS:
+        if system.startswith(prefix):
+            return agent
+    return "planner"
+
+
+def _spec(nodes: int, topic: str = "Benchmark Topic") -> Dict[str, Any]:
+    spec_nodes = [{"id": "central", "label": topic, "type": "central", "icon": "hub"}]
+    spec_edges = []
+    primaries = max(1, min(6, nodes // 4))
+    for i in range(1, nodes):
+        node_id = f"node_{i}"
+        primary = i <= primaries
+        spec_nodes.append({
+            "id": node_id,
+            "label": f"Concept {i}",
+            "description": f"Explanation of concept {i} and how it relates to its parent",
+            "type": "primary" if primary else "secondary",
+            "icon": "lightbulb",
+        })
+        parent = "central" if primary else f"node_{(i % primaries) + 1}"
+        spec_edges.append({"source": parent, "target": node_id, "style": "solid"})
+    return {
+        "title": topic,
+        "central_topic": topic,
+        "nodes": spec_nodes,
+        "edges": spec_edges,
+        "summary": f"A {nodes}-node benchmark map.",
+    }
+
+
+def canned_content(agent: str, messages: List[Dict[str, Any]], config: MockConfig) -> str:
+    if agent == "builder":
+        lines = ["mindmap", "  root((Benchmark Topic))"]
+        lines.extend(f"    Concept {i}" for i in range(1, config.nodes))
+        return "\n".join(lines)
+    if agent == "vision":
+        return "The image shows a central topic with several labelled branches and supporting details."
+    if agent == "fanout_outline":
+        spec = _spec(7)
+        return json.dumps({
+            "title": spec["title"],
+            "central_topic": spec["central_topic"],
+            "central": spec["nodes"][0],
+            "branches": [node for node in spec["nodes"][1:] if node["type"] == "primary"],
+            "summary": spec["summary"],
+        })
+    if agent == "fanout_branch":
+        count = max(2, config.nodes // 6)
+        return json.dumps({
+            "nodes": [{"id": f"leaf_{i}", "label": f"Detail {i}", "type": "secondary"} for i in range(count)],
+            "edges": [{"source": "branch", "target": f"leaf_{i}"} for i in range(count)],
+        })
+    if agent == "enhance_patch":
+        prompt = "".join(_text(m.get("content")) for m in messages)
+        anchor = next(iter(_ID_RE.findall(prompt)), "central")
+        operations = []
+        for i in range(3):
+            operations.append({"op": "add_node", "node": {"id": f"extra_{i}", "label": f"New idea {i}", "type": "secondary"}})
+            operations.append({"op": "add_edge", "source": anchor, "target": f"extra_{i}"})
+        return json.dumps({"operations": operations, "summary": "Added three ideas."})
+    return json.dumps(_spec(config.nodes))
+
+
+def malform(content: str, rng: random.Random) -> str:
+    """Damage JSON the way models do: prose and fences, trailing commas or truncation."""
+    choice = rng.randrange(3)
+    if choice == 0:
+        return f"Here is the map:\n```json\n{content}\n```\nLet me know if you need changes."
+    if choice == 1:
+        return content.replace("}]", "},]", 1).replace('"},', '"},,', 1)
+    return content[: int(len(content) * rng.uniform(0.6, 0.95))]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def cached_prefix_tokens(messages: List[Dict[str, Any]], config: MockConfig) -> int:
+    """
+    Tokens at the start of the prompt already seen in an earlier request.
+
+    Prefixes are compared at message and content-part boundaries, roughly
+    where providers place cache breakpoints.
+    """
+    prefix, cached, boundaries = "", 0, []
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            prefix += json.dumps(part, sort_keys=True)
+            boundaries.append((hash(prefix), _tokens(prefix)))
+    for key, tokens in boundaries:
+        if key not in config.prefixes:
+            break
+        cached = tokens
+    config.prefixes.update(key for key, _ in boundaries)
+    return cached
+
+
+# ============================================
+# Server
+# ============================================
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock OpenRouter")
+
+    @app.get("/v1/stats")
+    async def stats():
+        return {
+            "requests": config.requests,
+            "rate_limited": config.rate_limited,
+            "malformed": config.malformed,
+            "cached_tokens": config.cached_tokens,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.requests += 1
+        rng = config.rng
+
+        if config.rate_limit_rate and rng.random() < config.rate_limit_rate:
+            config.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit exceeded", "code": 429}},
+                headers={"Retry-After": "1"},
+            )
+
+        messages = body.get("messages") or []
+        model = body.get("model", "mock/model")
+        agent = identify_agent(messages)
+        content = canned_content(agent, messages, config)
+        if agent not in ("builder", "vision") and config.malformed_rate and rng.random() < config.malformed_rate:
+            config.malformed += 1
+            content = malform(content, rng)
+
+        prompt_tokens = sum(_tokens(json.dumps(m.get("content"))) for m in messages)
+        completion_tokens = _tokens(content)
+        cached_tokens = min(cached_prefix_tokens(messages, config), prompt_tokens)
+        config.cached_tokens += cached_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        latency = config.latency_ms / 1000 * rng.lognormvariate(0, config.jitter) if config.latency_ms else 0.0
+        created = int(time.time())
+        completion_id = f"mock-{config.requests}"
+
+        if not body.get("stream"):
+            generation = completion_tokens / config.tokens_per_second if config.tokens_per_second else 0.0
+            await asyncio.sleep(latency + generation)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        async def events():
+            await asyncio.sleep(latency)
+            # ~4 characters per token, sent a few tokens at a time
+            step = 16
+            delay = (step / 4) / config.tokens_per_second if config.tokens_per_second else 0.0
+            for start in range(0, len(content), step):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if delay:
+                    await asyncio.sleep(delay)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Mock behaviour flags, shared with the load test CLI."""
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Base time to first token")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Lognormal sigma applied to the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--nodes", type=int, default=20, help="Nodes per generated map")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of JSON answers damaged")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        nodes=args.nodes,
+        malformed_rate=args.malformed_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
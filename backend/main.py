@@ -1,12 +1,30 @@
 """AnyMaps Backend - FastAPI Application Entry Point."""
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.config import CORS_ORIGINS, HOST, PORT, validate_config
+from app.config import CORS_ORIGINS, HOST, PORT, METRICS_ENABLED, SERVERLESS, validate_config
+from app.metrics import MetricsMiddleware, monitor_event_loop
+from app.openapi_schema import use_stored_schema
 from app.routes import router
+from app.scheduler import OverloadedError
+from app.thumbnails import shutdown_pool
+
+# Validate configuration on startup (quietly on serverless cold starts)
+validate_config(verbose=not SERVERLESS)
 
-# Validate configuration on startup
-validate_config()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the event-loop lag monitor for the lifetime of the app (when metrics are on)."""
+    monitor = asyncio.create_task(monitor_event_loop()) if METRICS_ENABLED else None
+    yield
+    if monitor is not None:
+        monitor.cancel()
+    shutdown_pool()
 
 
 # Create FastAPI application
@@ -16,6 +34,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -27,9 +46,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Stage timings, Server-Timing header and request latency histograms
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    """Reject with 429/503 and Retry-After instead of a success=False body."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"success": False, "error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # Include API routes
 app.include_router(router, prefix="/api")
 
+# Serve the pre-generated OpenAPI schema while it matches the source
+use_stored_schema(app)
+
 
 @app.get("/")
 async def root():
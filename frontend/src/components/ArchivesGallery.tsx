@@ -1,5 +1,18 @@
-// Using placeholder images - these should be replaced with local assets
-const GALLERY_ITEMS = [
+import { useEffect, useState } from 'react';
+import { supabase } from '@/lib/supabase';
+import { fetchMapThumbnail, listMaps, listPublicMaps, mapThumbnailUrl, type MapSummary } from '@/lib/api';
+
+interface GalleryItem {
+    id: string | number;
+    title: string;
+    description: string;
+    image: string;
+}
+
+const GALLERY_SIZE = 3;
+
+// Shown until saved maps load, and when there are none yet
+const GALLERY_ITEMS: GalleryItem[] = [
     {
         id: 1,
         title: 'The Silk Road Logistics',
@@ -20,7 +33,70 @@ const GALLERY_ITEMS = [
     },
 ];
 
+/**
+ * Gallery card for a saved map, using its server-rendered thumbnail
+ *
+ * Public previews are plain URLs pinned to the head version (cached by the browser
+ * indefinitely); private ones are fetched with the owner's token as object URLs.
+ */
+async function toGalleryItem(map: MapSummary, accessToken?: string): Promise<GalleryItem> {
+    const image = map.is_public || !accessToken
+        ? mapThumbnailUrl(map.id, map.head_version)
+        : await fetchMapThumbnail(map.id, accessToken, map.head_version);
+    return {
+        id: map.id,
+        title: map.title,
+        description: `${map.node_count} nodes · updated ${new Date(map.updated_at * 1000).toLocaleDateString()}`,
+        image,
+    };
+}
+
+/**
+ * The signed-in user's latest maps, or the latest public ones for visitors and new users
+ */
+async function loadGalleryItems(): Promise<GalleryItem[]> {
+    const { data: { session } } = await supabase.auth.getSession();
+    const accessToken = session?.access_token;
+    let maps: MapSummary[] = [];
+    if (accessToken) {
+        // An anonymous or expired session falls through to the public maps
+        maps = await listMaps(accessToken, GALLERY_SIZE).then((page) => page.maps, () => []);
+    }
+    if (maps.length === 0) {
+        maps = (await listPublicMaps(GALLERY_SIZE)).maps;
+    }
+    // A preview that fails to load drops its card rather than the whole gallery
+    const results = await Promise.allSettled(maps.map((map) => toGalleryItem(map, accessToken)));
+    return results.flatMap((result) => (result.status === 'fulfilled' ? [result.value] : []));
+}
+
 export function ArchivesGallery() {
+    const [items, setItems] = useState<GalleryItem[]>(GALLERY_ITEMS);
+
+    useEffect(() => {
+        let cancelled = false;
+        let objectUrls: string[] = [];
+
+        loadGalleryItems()
+            .then((loaded) => {
+                objectUrls = loaded.map((item) => item.image).filter((image) => image.startsWith('blob:'));
+                if (cancelled) {
+                    objectUrls.forEach((url) => URL.revokeObjectURL(url));
+                } else if (loaded.length > 0) {
+                    setItems(loaded);
+                }
+            })
+            .catch((error) => {
+                // Keep the placeholder cards; the gallery is decoration, not a blocker
+                console.warn('Could not load gallery maps:', error);
+            });
+
+        return () => {
+            cancelled = true;
+            objectUrls.forEach((url) => URL.revokeObjectURL(url));
+        };
+    }, []);
+
     return (
         <section className="py-24 bg-espresso text-parchment px-6 border-t border-[#4A3B32]">
             <div className="max-w-6xl mx-auto">
@@ -35,7 +111,7 @@ export function ArchivesGallery() {
                     </button>
                 </div>
                 <div className="grid md:grid-cols-3 gap-8">
-                    {GALLERY_ITEMS.map((item) => (
+                    {items.map((item) => (
                         <div key={item.id} className="space-y-4 cursor-pointer group">
                             <div
                                 className="h-64 rounded-xl overflow-hidden border border-[#4A3B32] bg-cover bg-center grayscale group-hover:grayscale-0 transition duration-500"
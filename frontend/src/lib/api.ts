@@ -189,6 +189,162 @@ export async function healthCheck(): Promise<{ status: string; version: string }
     return response.json();
 }
 
+// ============================================
+// Server-side Layout
+// ============================================
+
+export interface NodePosition {
+    x: number;
+    y: number;
+    width: number;
+    height: number;
+}
+
+export interface LayoutResponse {
+    success: boolean;
+    topology_hash?: string;
+    positions: Record<string, NodePosition>;
+    removed: string[];
+    incremental: boolean;
+    cached: boolean;
+    width: number;
+    height: number;
+    error?: string;
+}
+
+/**
+ * Lay out a spec on the server (tidy tree, direction RIGHT)
+ *
+ * @param baseHash - topology_hash of a layout already held; only new and moved nodes are returned
+ */
+export async function requestLayout(
+    spec: PlannerSpec,
+    baseHash?: string
+): Promise<LayoutResponse> {
+    const response = await fetchWithTimeout(
+        `${API_BASE_URL}/layout`,
+        {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                planner_spec: spec,
+                base_hash: baseHash,
+            }),
+        },
+        10000
+    );
+
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+    }
+
+    return response.json();
+}
+
+// ============================================
+// Saved Maps and Thumbnails
+// ============================================
+
+export interface MapSummary {
+    id: string;
+    user_id: string;
+    title: string;
+    is_public: boolean;
+    created_at: number;
+    updated_at: number;
+    head_version: number;
+    spec_hash: string;
+    node_count: number;
+}
+
+export interface MapListResponse {
+    maps: MapSummary[];
+    next_cursor?: string;
+}
+
+export type ThumbnailFormat = 'svg' | 'png';
+
+/**
+ * List public maps of every owner, most recently updated first (no sign-in needed)
+ */
+export async function listPublicMaps(limit: number = 24, cursor?: string): Promise<MapListResponse> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    const response = await fetchWithTimeout(`${API_BASE_URL}/maps/public?${params}`, {}, 10000);
+
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+    }
+
+    return response.json();
+}
+
+/**
+ * List the signed-in user's own maps, most recently updated first
+ */
+export async function listMaps(accessToken: string, limit: number = 24, cursor?: string): Promise<MapListResponse> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    const response = await fetchWithTimeout(
+        `${API_BASE_URL}/maps?${params}`,
+        { headers: { Authorization: `Bearer ${accessToken}` } },
+        10000
+    );
+
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+    }
+
+    return response.json();
+}
+
+/**
+ * URL of a public map's pre-rendered preview, for use as an <img> src or background image
+ *
+ * @param version - Pin a version; its thumbnail never changes and is cached by the browser indefinitely
+ */
+export function mapThumbnailUrl(
+    mapId: string,
+    version?: number,
+    format: ThumbnailFormat = 'svg'
+): string {
+    const params = new URLSearchParams({ format });
+    if (version !== undefined) {
+        params.set('version', String(version));
+    }
+    return `${API_BASE_URL}/maps/${encodeURIComponent(mapId)}/thumbnail?${params}`;
+}
+
+/**
+ * Fetch a map's preview with the owner's access token (needed for private maps)
+ *
+ * Returns an object URL; call URL.revokeObjectURL on it once it is no longer shown.
+ */
+export async function fetchMapThumbnail(
+    mapId: string,
+    accessToken: string,
+    version?: number,
+    format: ThumbnailFormat = 'svg'
+): Promise<string> {
+    const response = await fetchWithTimeout(
+        mapThumbnailUrl(mapId, version, format),
+        { headers: { Authorization: `Bearer ${accessToken}` } },
+        10000
+    );
+
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+    }
+
+    return URL.createObjectURL(await response.blob());
+}
+
 // ============================================
 // Enhance Map Types and Functions
 // ============================================
@@ -199,12 +355,43 @@ export interface EnhanceMapRequest {
     current_spec: PlannerSpec;
     enhance_prompt: string;
     enhance_mode: EnhanceMode;
+    enhance_protocol?: 'patch' | 'full';
+}
+
+export interface SpecOperation {
+    op: 'add_node' | 'update_node' | 'remove_node' | 'add_edge' | 'remove_edge';
+    node?: NodeSpec;
+    id?: string;
+    changes?: Partial<Omit<NodeSpec, 'id'>>;
+    source?: string;
+    target?: string;
+    label?: string;
+    style?: string;
+}
+
+export interface NodeChange {
+    id: string;
+    changes: Partial<Omit<NodeSpec, 'id'>>;
+    previous: Partial<Omit<NodeSpec, 'id'>>;
+}
+
+export interface SpecDelta {
+    added_nodes: NodeSpec[];
+    removed_nodes: string[];
+    modified_nodes: NodeChange[];
+    added_edges: EdgeSpec[];
+    removed_edges: { source: string; target: string }[];
+    modified_edges: EdgeSpec[];
+    metadata: Partial<Pick<PlannerSpec, 'title' | 'central_topic' | 'summary'>>;
+    unchanged_nodes: number;
 }
 
 export interface EnhanceMapResponse {
     success: boolean;
     planner_spec?: PlannerSpec;
     changes_summary?: string;
+    operations?: SpecOperation[];
+    delta?: SpecDelta;
     error?: string;
 }
 
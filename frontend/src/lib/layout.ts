@@ -4,7 +4,7 @@
  */
 import ELK, { type ElkNode, type ElkExtendedEdge } from 'elkjs/lib/elk.bundled.js';
 import type { Node, Edge } from '@xyflow/react';
-import type { PlannerSpec, NodeSpec } from './api';
+import { requestLayout, type PlannerSpec, type NodeSpec, type NodePosition } from './api';
 
 // Initialize ELK instance
 const elk = new ELK();
@@ -86,26 +86,34 @@ export async function calculateLayout(
     // Run ELK layout algorithm
     const layoutedGraph = await elk.layout(elkGraph);
 
-    // Convert ELK output to React Flow format
-    const nodes: Node[] = (layoutedGraph.children || []).map((elkNode) => {
-        const originalNode = topology.nodes.find((n) => n.id === elkNode.id);
-        const isCentral = originalNode?.type === 'central';
-
-        return {
-            id: elkNode.id,
-            type: 'mindMapNode',
-            position: {
-                x: elkNode.x || 0,
-                y: elkNode.y || 0,
-            },
-            data: {
-                label: originalNode?.label || elkNode.id,
-                description: originalNode?.description || '',
-                isCentral,
-                icon: originalNode?.icon,
-            },
-        };
-    });
+    const positions: Record<string, { x: number; y: number }> = {};
+    for (const elkNode of layoutedGraph.children || []) {
+        positions[elkNode.id] = { x: elkNode.x || 0, y: elkNode.y || 0 };
+    }
+    return toReactFlow(topology, positions);
+}
+
+/**
+ * Convert a topology plus node positions to React Flow nodes and edges
+ */
+function toReactFlow(
+    topology: GraphTopology,
+    positions: Record<string, { x: number; y: number }>
+): { nodes: Node[]; edges: Edge[] } {
+    const nodes: Node[] = topology.nodes.map((node) => ({
+        id: node.id,
+        type: 'mindMapNode',
+        position: {
+            x: positions[node.id]?.x || 0,
+            y: positions[node.id]?.y || 0,
+        },
+        data: {
+            label: node.label || node.id,
+            description: node.description || '',
+            isCentral: node.type === 'central',
+            icon: node.icon,
+        },
+    }));
 
     // Convert edges to React Flow format
     const edges: Edge[] = topology.edges.map((edge) => ({
@@ -123,14 +131,44 @@ export async function calculateLayout(
     return { nodes, edges };
 }
 
+// Last server layout, so follow-up requests (e.g. after an enhance) only return what moved
+let lastServerLayout: { hash: string; positions: Record<string, NodePosition> } | null = null;
+
 /**
- * Full pipeline: PlannerSpec -> GraphTopology -> ELK Layout -> React Flow
+ * Node positions from the backend layout endpoint, merged with the previous
+ * layout when the server answers incrementally
+ */
+async function serverPositions(spec: PlannerSpec): Promise<Record<string, NodePosition>> {
+    const response = await requestLayout(spec, lastServerLayout?.hash);
+    if (!response.success || !response.topology_hash) {
+        throw new Error(response.error || 'Server layout failed');
+    }
+
+    let positions = response.positions;
+    if (response.incremental && lastServerLayout) {
+        positions = { ...lastServerLayout.positions, ...response.positions };
+        for (const id of response.removed) {
+            delete positions[id];
+        }
+    }
+    lastServerLayout = { hash: response.topology_hash, positions };
+    return positions;
+}
+
+/**
+ * Full pipeline: PlannerSpec -> GraphTopology -> Layout -> React Flow
+ * Uses the backend tidy-tree layout, falling back to ELK in the browser
  */
 export async function layoutFromPlannerSpec(
     spec: PlannerSpec
 ): Promise<{ nodes: Node[]; edges: Edge[] }> {
     const topology = plannerSpecToTopology(spec);
-    return calculateLayout(topology);
+    try {
+        return toReactFlow(topology, await serverPositions(spec));
+    } catch (error) {
+        console.warn('Server layout unavailable, using ELK:', error);
+        return calculateLayout(topology);
+    }
 }
 
 /**
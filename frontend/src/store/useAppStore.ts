@@ -134,7 +134,7 @@ export const useAppStore = create<AppStore>((set, get) => ({
             set({ status: 'structuring' });
 
 
-            // Use ELK.js to calculate positions
+            // Server-side tidy-tree layout (ELK.js in the browser as a fallback)
             const { nodes, edges } = await layoutFromPlannerSpec(response.planner_spec);
 
             // ==========================================